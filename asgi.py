@@ -0,0 +1,176 @@
+"""ASGI entry point for the checkout endpoints, on SQLAlchemy asyncio.
+
+Serves the write-heavy till endpoints from an event loop:
+    POST   /api/sales/                      checkout
+    DELETE /api/sales/<id>                  refund (delete) a sale
+    POST   /api/sales/<id>/returns          return some items of a sale
+    POST   /api/customers/<id>/pay_debt     debt payment
+
+Request and response bodies are the same as the Flask views'; both call
+sales_service. Everything else stays on the WSGI app, e.g. behind a proxy
+that routes these paths here:
+    uvicorn asgi:app --workers 4
+
+Requires the optional ``uvicorn`` package and an async driver: asyncpg for
+PostgreSQL, aiosqlite for SQLite. The database URL is DATABASE_URL with the
+driver swapped (postgresql+asyncpg, sqlite+aiosqlite), or
+ASYNC_DATABASE_URL if set. Pool settings are the DB_POOL_* ones.
+
+Checkout and returns honour the Idempotency-Key header through
+idempotency.py, with the same endpoint names as the Flask views, so a retry
+is replayed whichever of the two servers it reaches.
+"""
+import json
+import os
+import re
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import create_app
+from idempotency import DEFAULT_TTL_HOURS, IDEMPOTENCY_HEADER, REPLAYED_HEADER, request_hash, reserve_key, \
+    store_response
+from models import db
+from sales_service import ServiceError, checkout_async, pay_debt_async, refund_sale_async, return_items_async
+from serializers import dumps
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+_SALE = re.compile(r'^/api/sales/(\d+)/?$')
+_RETURNS = re.compile(r'^/api/sales/(\d+)/returns/?$')
+_PAY_DEBT = re.compile(r'^/api/customers/(\d+)/pay_debt/?$')
+
+_KEY_HEADER = IDEMPOTENCY_HEADER.lower().encode('latin-1')
+_JSON_HEADERS = [(b'content-type', b'application/json')]
+_REPLAYED_HEADERS = _JSON_HEADERS + [(REPLAYED_HEADER.lower().encode('latin-1'), b'true')]
+
+
+def async_database_url(url):
+    """``url`` with its driver replaced by the asyncio one for its dialect."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver configured for {backend!r} databases')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+class CheckoutApp:
+    """Minimal ASGI application; the engine is created at lifespan start-up."""
+
+    def __init__(self):
+        self.engine = None
+        self.sessions = None
+        self.flask_app = None
+
+    def start(self):
+        # The Flask app provides the configuration and initialises the shared
+        # extensions (response cache backend, table creation in development)
+        self.flask_app = create_app()
+        with self.flask_app.app_context():
+            # the sync engine's URL, with relative SQLite paths already resolved
+            sync_url = db.engine.url
+        url = os.getenv('ASYNC_DATABASE_URL') or async_database_url(sync_url)
+        self.engine = create_async_engine(url, **self.flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        if self.engine is None:
+            self.start()
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        key = dict(scope.get('headers') or []).get(_KEY_HEADER)
+        status, payload, replayed = await self.dispatch(
+            scope['method'], scope['path'], body, key.decode('latin-1') if key else None
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': _REPLAYED_HEADERS if replayed else _JSON_HEADERS,
+        })
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispatch(self, method, path, body, idempotency_key=None):
+        """Run the matching service call; returns (status, JSON bytes, replayed)."""
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            return 400, dumps({'error': 'Invalid JSON body'}), False
+        if not isinstance(data, dict):
+            data = {}
+
+        sale = _SALE.match(path)
+        returns = _RETURNS.match(path)
+        pay_debt = _PAY_DEBT.match(path)
+        if method == 'POST' and path.rstrip('/') == '/api/sales':
+            endpoint = 'sales.create_sale'
+        elif method == 'POST' and returns:
+            endpoint = 'sales.create_return'
+        else:
+            endpoint = None
+        async with self.sessions() as session:
+            record = None
+            if idempotency_key and endpoint:
+                # Reserved in the same transaction as the service call's writes, as the
+                # Flask @idempotent decorator does
+                record, stored = await session.run_sync(
+                    reserve_key, idempotency_key, endpoint, request_hash(method, path, body),
+                    self.flask_app.config.get('IDEMPOTENCY_TTL_HOURS', DEFAULT_TTL_HOURS)
+                )
+                if stored is not None:
+                    return stored.status, stored.body, stored.replayed
+            try:
+                if method == 'POST' and path.rstrip('/') == '/api/sales':
+                    result = await checkout_async(
+                        session, data.get('items', []),
+                        customer_id=data.get('customer_id'),
+                        payment_method=data.get('payment_method', 'cash'),
+                        paid_amount=data.get('paid_amount')
+                    )
+                    status = 201
+                elif method == 'DELETE' and sale:
+                    transaction_id = int(sale.group(1))
+                    await refund_sale_async(session, transaction_id)
+                    result, status = {'status': 'deleted', 'transaction_id': transaction_id}, 200
+                elif method == 'POST' and returns:
+                    result = await return_items_async(session, int(returns.group(1)), data.get('items', []),
+                                                      note=data.get('note'))
+                    status = 201
+                elif method == 'POST' and pay_debt:
+                    new_debt = await pay_debt_async(session, int(pay_debt.group(1)), data.get('amount', 0),
+                                                    data.get('description', 'Debt Payment'))
+                    result, status = {'message': 'Payment successful', 'new_debt': float(new_debt)}, 200
+                else:
+                    return 404, dumps({'error': 'Not found'}), False
+            except ServiceError as e:
+                await session.rollback()
+                return e.status, dumps({'error': e.message}), False
+            if record is not None:
+                store_response(record, result, status)
+            await session.commit()
+        return status, dumps(result), False
+
+
+app = CheckoutApp()
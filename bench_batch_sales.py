@@ -0,0 +1,81 @@
+"""
+Benchmark: ingesting queued sales one POST /api/sales/ at a time against
+POST /api/sales/batch.
+
+Runs against a throw-away SQLite file unless DATABASE_URL is set (never
+point it at real data: it creates its own rows). Every variant ingests the
+same BENCH_SALES sales (default 1000, three lines each, a third of them on
+debt) through the Flask test client and reports sales/s.
+
+    python bench_batch_sales.py
+    BENCH_SALES=5000 python bench_batch_sales.py
+"""
+import os
+import tempfile
+import time
+import uuid
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_batch_sales.db')
+
+from app import app
+from models import db, Category, Customer, Product
+
+SALES = int(os.getenv('BENCH_SALES', 1000))
+PRODUCTS = 200
+CUSTOMERS = 20
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        category = Category(name=f'Bench Batch {uuid.uuid4().hex[:8]}')
+        db.session.add(category)
+        db.session.flush()
+        prefix = uuid.uuid4().hex[:8]
+        products = [Product(name=f'Product {i}', sku=f'BATCH-{prefix}-{i}', price=1000.0 + i,
+                            stock_quantity=10 ** 7, category_id=category.id) for i in range(PRODUCTS)]
+        customers = [Customer(name=f'Customer {i}') for i in range(CUSTOMERS)]
+        db.session.add_all(products + customers)
+        db.session.commit()
+        return [p.id for p in products], [c.id for c in customers]
+
+
+def make_sales(product_ids, customer_ids):
+    sales = []
+    for i in range(SALES):
+        sale = {
+            'client_id': uuid.uuid4().hex,
+            'items': [{'product_id': product_ids[(i * k) % len(product_ids)], 'quantity': 1} for k in (1, 3, 7)]
+        }
+        if i % 3 == 0:
+            sale.update(customer_id=customer_ids[i % len(customer_ids)], payment_method='debt', paid_amount=500)
+        sales.append(sale)
+    return sales
+
+
+def run():
+    product_ids, customer_ids = seed()
+    client = app.test_client()
+    print(f'{SALES} sales, 3 lines each')
+
+    sales = make_sales(product_ids, customer_ids)
+    start = time.perf_counter()
+    for sale in sales:
+        resp = client.post('/api/sales/', json=sale)
+        assert resp.status_code == 201, resp.json
+    loop_time = time.perf_counter() - start
+    print(f'{"loop of POST /api/sales/":<36} {loop_time:7.2f}s  {SALES / loop_time:8.1f} sales/s')
+
+    for chunk_size in (50, 200, 1000):
+        sales = make_sales(product_ids, customer_ids)
+        start = time.perf_counter()
+        resp = client.post('/api/sales/batch', json={'sales': sales, 'chunk_size': chunk_size})
+        elapsed = time.perf_counter() - start
+        assert resp.json['summary'] == {'created': SALES}, resp.json['summary']
+        label = f'batch, chunk_size={chunk_size}'
+        print(f'{label:<36} {elapsed:7.2f}s  {SALES / elapsed:8.1f} sales/s  ({loop_time / elapsed:.1f}x)')
+
+
+if __name__ == '__main__':
+    run()
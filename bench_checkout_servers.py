@@ -0,0 +1,172 @@
+"""
+Benchmark: checkout throughput of the WSGI (Flask) and ASGI (asgi.py)
+deployments.
+
+Starts each server in a subprocess on a local port, then fires
+BENCH_REQUESTS checkouts (default 2000) from BENCH_CONCURRENCY client
+threads (default 32) and reports requests per second and latency
+percentiles. Each checkout buys one unit of a random product out of 200.
+
+    - wsgi: gunicorn with BENCH_WORKERS sync workers x BENCH_THREADS
+      threads (default 2 x 8), or werkzeug's threaded server if gunicorn is
+      not installed
+    - asgi: uvicorn with BENCH_WORKERS workers
+
+Uses a throw-away SQLite file unless DATABASE_URL is set. SQLite takes one
+writer at a time, so both servers queue on the database lock there; point
+DATABASE_URL at a scratch PostgreSQL database (asyncpg installed) to see
+how the two stacks compare under real concurrency:
+    DATABASE_URL=postgresql://postgres:pw@localhost:5432/store_bench python bench_checkout_servers.py
+
+Never run it against a database that holds real data: it creates its own
+tables and rows.
+"""
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REQUESTS = int(os.getenv('BENCH_REQUESTS', 2000))
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', 32))
+WORKERS = int(os.getenv('BENCH_WORKERS', 2))
+THREADS = int(os.getenv('BENCH_THREADS', 8))
+PRODUCTS = 200
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SEED = f'''
+from app import create_app
+from models import db, Category, Product
+app = create_app({{'AUTO_CREATE_TABLES': False}})
+with app.app_context():
+    db.drop_all()
+    db.create_all()
+    category = Category(name='Bench')
+    db.session.add(category)
+    db.session.flush()
+    db.session.add_all([
+        Product(name=f'Bench {{i}}', sku=f'BENCH-{{i}}', price=1.0 + i % 10,
+                stock_quantity=1000000, category_id=category.id)
+        for i in range({PRODUCTS})
+    ])
+    db.session.commit()
+'''
+
+WERKZEUG = '''
+import sys
+from werkzeug.serving import run_simple
+from app import create_app
+run_simple('127.0.0.1', int(sys.argv[1]), create_app(), threaded=True)
+'''
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def server_command(kind, port):
+    if kind == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+                '--workers', str(WORKERS), '--log-level', 'warning', '--no-access-log']
+    if shutil.which('gunicorn'):
+        return ['gunicorn', '-b', f'127.0.0.1:{port}', '-w', str(WORKERS), '--threads', str(THREADS),
+                '--log-level', 'warning', 'app:create_app()']
+    return [sys.executable, '-c', WERKZEUG, str(port)]
+
+
+def wait_until_ready(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during start-up')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+
+def checkout(connection):
+    body = json.dumps({'items': [{'product_id': random.randint(1, PRODUCTS), 'quantity': 1}]})
+    start = time.perf_counter()
+    connection.request('POST', '/api/sales/', body, {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    response.read()
+    return response.status, time.perf_counter() - start
+
+
+def load(port):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    remaining = [REQUESTS]
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while True:
+            with lock:
+                if not remaining[0]:
+                    break
+                remaining[0] -= 1
+            try:
+                status, seconds = checkout(connection)
+            except (OSError, http.client.HTTPException):
+                status, seconds = None, 0
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            with lock:
+                if status == 201:
+                    latencies.append(seconds)
+                else:
+                    errors[0] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(CONCURRENCY)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, sorted(latencies), errors[0]
+
+
+def run(kind, env):
+    subprocess.run([sys.executable, '-c', SEED], cwd=HERE, env=env, check=True)
+    port = free_port()
+    process = subprocess.Popen(server_command(kind, port), cwd=HERE, env=env)
+    try:
+        wait_until_ready(port, process)
+        return load(port)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    env = dict(os.environ, APP_ENV='production', CACHE_ENABLED='false')
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_checkout.db'))
+    wsgi = 'gunicorn' if shutil.which('gunicorn') else 'werkzeug'
+
+    print(f'{REQUESTS} checkouts, {CONCURRENCY} concurrent clients, {WORKERS} workers')
+    print(f'{"server":<20} {"req/s":>8} {"p50":>9} {"p95":>9} {"p99":>9} {"errors":>7}')
+    for kind, label in (('wsgi', f'wsgi ({wsgi})'), ('asgi', 'asgi (uvicorn)')):
+        elapsed, latencies, errors = run(kind, env)
+        if not latencies:
+            print(f'{label:<20} no successful requests ({errors} errors)')
+            continue
+        p50, p95, p99 = (latencies[min(int(len(latencies) * q), len(latencies) - 1)] for q in (0.5, 0.95, 0.99))
+        print(f'{label:<20} {len(latencies) / elapsed:8.0f} {p50 * 1000:7.1f}ms {p95 * 1000:7.1f}ms '
+              f'{p99 * 1000:7.1f}ms {errors:7d}')
+
+
+if __name__ == '__main__':
+    main()
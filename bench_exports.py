@@ -0,0 +1,96 @@
+"""
+Benchmark: streaming export throughput and memory on a large stock ledger.
+
+Seeds BENCH_ROWS stock history rows (default 5,000,000) into a throw-away
+SQLite file unless DATABASE_URL is set, then streams
+/api/exports/stock-ledger as CSV, NDJSON and gzipped CSV, reporting rows/s,
+MB/s and how much the process's RSS grows while streaming (which should
+stay flat no matter how many rows are exported).
+
+    python bench_exports.py
+    BENCH_ROWS=500000 python bench_exports.py
+"""
+import os
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_exports.db')
+
+from app import app
+from models import db, Category, Product, StockHistory
+
+ROWS = int(os.getenv('BENCH_ROWS', 5_000_000))
+PRODUCTS = 1000
+BATCH = 50_000
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        if StockHistory.query.first():
+            print('Stock history already present, skipping seed.')
+            return
+        category = Category(name='Bench Export')
+        db.session.add(category)
+        db.session.flush()
+        db.session.execute(Product.__table__.insert(), [
+            {'name': f'Product {i}', 'sku': f'EXPORT-{i}', 'price': 1000.0, 'stock_quantity': 0,
+             'low_stock_threshold': 10, 'category_id': category.id}
+            for i in range(1, PRODUCTS + 1)
+        ])
+        db.session.commit()
+
+        print(f'Seeding {ROWS} stock history rows...')
+        t0 = time.perf_counter()
+        start = datetime.utcnow() - timedelta(days=365)
+        for offset in range(0, ROWS, BATCH):
+            db.session.execute(StockHistory.__table__.insert(), [
+                {'product_id': i % PRODUCTS + 1, 'change_amount': -1, 'change_type': 'sale',
+                 'note': 'Sold in Transaction', 'timestamp': start + timedelta(seconds=6 * i)}
+                for i in range(offset, min(offset + BATCH, ROWS))
+            ])
+            db.session.commit()
+        print(f'Seeded in {time.perf_counter() - t0:.1f}s')
+
+
+def rss_mb():
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(client, label, url):
+    rss_before = rss_mb()
+    rss_max = rss_before
+    t0 = time.perf_counter()
+    resp = client.get(url, buffered=False)
+    size = 0
+    for n, chunk in enumerate(resp.response):
+        size += len(chunk)
+        if n % 50 == 0:
+            rss_max = max(rss_max, rss_mb())
+    resp.close()
+    elapsed = time.perf_counter() - t0
+    print(f'{label:<14} {ROWS / elapsed:>10,.0f} rows/s  {size / elapsed / 1e6:7.1f} MB/s  '
+          f'{size / 1e6:8.1f} MB  RSS growth {rss_max - rss_before:+.1f} MB')
+
+
+def run():
+    seed()
+    client = app.test_client()
+    measure(client, 'csv', '/api/exports/stock-ledger')
+    measure(client, 'ndjson', '/api/exports/stock-ledger?format=ndjson')
+    measure(client, 'csv + gzip', '/api/exports/stock-ledger?gzip=1')
+
+
+if __name__ == '__main__':
+    run()
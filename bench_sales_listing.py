@@ -0,0 +1,117 @@
+"""
+Benchmark: latency of GET /api/sales with keyset pagination on a large table.
+
+Seeds BENCH_TRANSACTIONS transactions (default 1,000,000, two items each)
+into a throw-away SQLite file unless DATABASE_URL is set, then reports
+p50/p95 latency for the first page, a deep page reached by following
+cursors, and filtered listings.
+
+    python bench_sales_listing.py
+    BENCH_TRANSACTIONS=200000 python bench_sales_listing.py
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app
+from models import db, Category, Product, Customer, Transaction, TransactionItem
+
+TRANSACTIONS = int(os.getenv('BENCH_TRANSACTIONS', 1_000_000))
+PRODUCTS = 500
+CUSTOMERS = 200
+BATCH = 20_000
+RUNS = 50
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        if Transaction.query.first():
+            print('Transactions already present, skipping seed.')
+            return
+        category = Category(name='Bench')
+        db.session.add(category)
+        db.session.flush()
+        db.session.bulk_insert_mappings(Product, [
+            {'name': f'Product {i}', 'sku': f'BENCH-{i}', 'price': 1000 + i,
+             'stock_quantity': 1000, 'category_id': category.id}
+            for i in range(PRODUCTS)
+        ])
+        db.session.bulk_insert_mappings(Customer, [
+            {'name': f'Customer {i}', 'phone': f'08{i:08d}'} for i in range(CUSTOMERS)
+        ])
+        db.session.commit()
+
+        product_ids = [p for (p,) in db.session.query(Product.id)]
+        customer_ids = [c for (c,) in db.session.query(Customer.id)]
+        start = datetime.utcnow() - timedelta(days=365)
+        step = timedelta(days=365) / TRANSACTIONS
+        rng = random.Random(42)
+
+        print(f'Seeding {TRANSACTIONS} transactions...')
+        t0 = time.perf_counter()
+        next_id = 1
+        for offset in range(0, TRANSACTIONS, BATCH):
+            count = min(BATCH, TRANSACTIONS - offset)
+            transactions = []
+            items = []
+            for i in range(count):
+                tid = next_id + i
+                transactions.append({
+                    'id': tid,
+                    'date': start + step * (offset + i),
+                    'total_amount': 5000.0,
+                    'paid_amount': 5000.0,
+                    'payment_method': rng.choice(['cash', 'cash', 'debt']),
+                    'customer_id': rng.choice(customer_ids) if rng.random() < 0.5 else None,
+                })
+                for pid in rng.sample(product_ids, 2):
+                    items.append({'transaction_id': tid, 'product_id': pid, 'quantity': 1, 'price_at_sale': 2500.0})
+            db.session.execute(Transaction.__table__.insert(), transactions)
+            db.session.execute(TransactionItem.__table__.insert(), items)
+            db.session.commit()
+            next_id += count
+        print(f'Seeded in {time.perf_counter() - t0:.1f}s')
+
+
+def measure(client, label, url_fn):
+    timings = []
+    for i in range(RUNS):
+        url = url_fn(i)
+        t0 = time.perf_counter()
+        resp = client.get(url)
+        timings.append((time.perf_counter() - t0) * 1000)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f'{label:<40} p50 {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms')
+
+
+def run():
+    seed()
+    client = app.test_client()
+
+    # Follow cursors 20 pages deep to get a deep-page cursor
+    cursor = None
+    for _ in range(20):
+        resp = client.get('/api/sales/?limit=100' + (f'&cursor={cursor}' if cursor else ''))
+        cursor = resp.headers.get('X-Next-Cursor')
+
+    month_ago = (datetime.utcnow() - timedelta(days=30)).date().isoformat()
+    measure(client, 'first page (limit=50)', lambda i: '/api/sales/')
+    measure(client, 'first page (limit=500)', lambda i: '/api/sales/?limit=500')
+    measure(client, 'deep page (page 21, limit=100)', lambda i: f'/api/sales/?limit=100&cursor={cursor}')
+    measure(client, 'customer filter', lambda i: f'/api/sales/?customer_id={i % CUSTOMERS + 1}')
+    measure(client, 'payment_method=debt', lambda i: '/api/sales/?payment_method=debt')
+    measure(client, 'product filter', lambda i: f'/api/sales/?product_id={i % PRODUCTS + 1}')
+    measure(client, 'last 30 days', lambda i: f'/api/sales/?start_date={month_ago}')
+
+
+if __name__ == '__main__':
+    run()
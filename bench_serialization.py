@@ -0,0 +1,149 @@
+"""
+Benchmark: list-endpoint serialization, ORM + to_dict + jsonify against the
+column-tuple path in serializers.py.
+
+Seeds a throw-away SQLite file unless DATABASE_URL is set, then for each list
+endpoint builds the same 500-row page three ways and reports the median time:
+  - orm:    ORM objects (with the eager loads the endpoint used) -> to_dict -> jsonify
+  - tuples: column tuples -> *_dict -> stdlib json
+  - fast:   column tuples -> *_dict -> orjson (skipped if orjson is not installed)
+Every variant's output is checked to decode to the same JSON.
+
+    python bench_serialization.py
+    BENCH_REPEAT=50 python bench_serialization.py
+"""
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_serialization.db')
+
+from flask import jsonify
+from sqlalchemy.orm import joinedload, selectinload
+
+import serializers
+from app import app
+from models import db, Category, Customer, Product, StockHistory, Transaction, TransactionItem
+from serializers import (CUSTOMER_COLUMNS, PRODUCT_COLUMNS, STOCK_HISTORY_COLUMNS, TRANSACTION_COLUMNS,
+                         customer_dict, json_response, product_dict, stock_history_dict, transaction_dicts)
+
+PAGE = 500
+REPEAT = int(os.getenv('BENCH_REPEAT', 20))
+PRODUCTS = 2000
+TRANSACTIONS = 5000
+
+
+def seed():
+    db.create_all()
+    if Product.query.first():
+        print('Data already present, skipping seed.')
+        return
+    category = Category(name='Bench Serialization')
+    db.session.add(category)
+    db.session.flush()
+    db.session.execute(Product.__table__.insert(), [
+        {'name': f'Product {i:05d}', 'sku': f'SER-{i}', 'price': 1000.0 + i, 'stock_quantity': 100,
+         'low_stock_threshold': 10, 'category_id': category.id}
+        for i in range(1, PRODUCTS + 1)
+    ])
+    db.session.execute(Customer.__table__.insert(), [
+        {'name': f'Customer {i}', 'email': f'c{i}@example.com', 'phone': '0800', 'points': i, 'total_debt': 0.0}
+        for i in range(1, PAGE + 1)
+    ])
+    start = datetime.utcnow() - timedelta(days=30)
+    transactions, items, history = [], [], []
+    for tid in range(1, TRANSACTIONS + 1):
+        date = start + timedelta(minutes=5 * tid)
+        transactions.append({'id': tid, 'date': date, 'total_amount': 3000.0, 'paid_amount': 3000.0,
+                             'payment_method': 'cash', 'customer_id': None})
+        for pid in (tid % PRODUCTS + 1, (tid * 7) % PRODUCTS + 1, (tid * 13) % PRODUCTS + 1):
+            items.append({'transaction_id': tid, 'product_id': pid, 'quantity': 1, 'price_at_sale': 1000.0})
+            history.append({'product_id': 1 if tid % 2 else pid, 'change_amount': -1, 'change_type': 'sale',
+                            'note': 'Sold in Transaction', 'timestamp': date})
+    db.session.execute(Transaction.__table__.insert(), transactions)
+    db.session.execute(TransactionItem.__table__.insert(), items)
+    db.session.execute(StockHistory.__table__.insert(), history)
+    db.session.commit()
+
+
+def orm_variants():
+    """endpoint -> (ORM page builder, tuple page builder), mirroring the list endpoints."""
+    return {
+        'products': (
+            lambda: [p.to_dict() for p in Product.query.options(joinedload(Product.category))
+                     .order_by(Product.name, Product.id).limit(PAGE)],
+            lambda: [product_dict(r) for r in db.session.query(*PRODUCT_COLUMNS)
+                     .outerjoin(Category, Category.id == Product.category_id)
+                     .order_by(Product.name, Product.id).limit(PAGE)],
+        ),
+        'sales': (
+            lambda: [t.to_dict() for t in Transaction.query.options(
+                selectinload(Transaction.items).joinedload(TransactionItem.product).load_only(Product.name))
+                .order_by(Transaction.date.desc(), Transaction.id.desc()).limit(PAGE)],
+            lambda: transaction_dicts(db.session, db.session.query(*TRANSACTION_COLUMNS)
+                                      .order_by(Transaction.date.desc(), Transaction.id.desc()).limit(PAGE).all()),
+        ),
+        'stock history': (
+            lambda: [h.to_dict() for h in StockHistory.query
+                     .options(joinedload(StockHistory.product).load_only(Product.name))
+                     .filter(StockHistory.product_id == 1)
+                     .order_by(StockHistory.timestamp.desc(), StockHistory.id.desc()).limit(PAGE)],
+            lambda: [stock_history_dict(r) for r in db.session.query(*STOCK_HISTORY_COLUMNS)
+                     .outerjoin(Product, Product.id == StockHistory.product_id)
+                     .filter(StockHistory.product_id == 1)
+                     .order_by(StockHistory.timestamp.desc(), StockHistory.id.desc()).limit(PAGE)],
+        ),
+        'customers': (
+            lambda: [c.to_dict() for c in Customer.query.limit(PAGE)],
+            lambda: [customer_dict(r) for r in db.session.query(*CUSTOMER_COLUMNS).limit(PAGE)],
+        ),
+    }
+
+
+def measure(build):
+    """Median seconds to build one response; the session is reset each time so
+    ORM variants pay for hydration instead of hitting the identity map."""
+    timings = []
+    body = None
+    for _ in range(REPEAT):
+        db.session.expunge_all()
+        t0 = time.perf_counter()
+        body = build().get_data()
+        timings.append(time.perf_counter() - t0)
+        db.session.rollback()
+    return statistics.median(timings), body
+
+
+def run():
+    fast_encoder = serializers.orjson
+    with app.app_context():
+        seed()
+        print(f'{"endpoint":<15} {"orm":>10} {"tuples":>10} {"fast":>10} {"speedup":>8}')
+        with app.test_request_context():
+            for name, (orm_page, tuple_page) in orm_variants().items():
+                orm_time, orm_body = measure(lambda: jsonify(orm_page()))
+
+                serializers.orjson = None
+                tuple_time, tuple_body = measure(lambda: json_response(tuple_page()))
+                serializers.orjson = fast_encoder
+
+                fast_time, fast_body = (None, tuple_body)
+                if fast_encoder is not None:
+                    fast_time, fast_body = measure(lambda: json_response(tuple_page()))
+
+                expected = json.loads(orm_body)
+                assert json.loads(tuple_body) == expected and json.loads(fast_body) == expected, name
+                best = fast_time or tuple_time
+                fast_col = f'{fast_time * 1000:8.1f}ms' if fast_time else f'{"n/a":>10}'
+                print(f'{name:<15} {orm_time * 1000:8.1f}ms {tuple_time * 1000:8.1f}ms {fast_col} '
+                      f'{orm_time / best:7.1f}x')
+    if fast_encoder is None:
+        print('orjson is not installed; install it to enable the fast encoder.')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,69 @@
+"""
+Benchmark: cold start of one worker process, development against production
+settings of create_app().
+
+Every run is a fresh Python interpreter (like a new gunicorn worker) that
+imports the app module, calls create_app() and serves one request through
+the test client. Reports the median of BENCH_RUNS runs (default 7) per phase:
+  - import:  importing app (blueprints, models, extensions)
+  - create:  create_app() (config, extensions, create_all in development)
+  - first:   first request (opens the first pooled connection)
+
+Uses a throw-away SQLite file unless DATABASE_URL is set; the schema is
+created once up front so the production variant can serve the request.
+
+    python bench_startup.py
+    BENCH_RUNS=15 python bench_startup.py
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RUNS = int(os.getenv('BENCH_RUNS', 7))
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+WORKER = '''
+import json, time
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+app = app_module.create_app()
+t2 = time.perf_counter()
+status = app.test_client().get('/api/settings/').status_code
+t3 = time.perf_counter()
+assert status == 200, status
+print(json.dumps({'import': t1 - t0, 'create': t2 - t1, 'first': t3 - t2}))
+'''
+
+VARIANTS = {
+    'development': {'APP_ENV': 'development'},
+    'production': {'APP_ENV': 'production'},
+}
+
+
+def run_worker(env):
+    out = subprocess.run([sys.executable, '-c', WORKER], cwd=HERE, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_startup.db'))
+    # Create the schema once so production (no create_all) finds it
+    run_worker(dict(env, APP_ENV='development'))
+
+    print(f'{"variant":<13} {"import":>9} {"create":>9} {"first":>9} {"total":>9}   ({RUNS} runs, median)')
+    for name, overrides in VARIANTS.items():
+        runs = [run_worker(dict(env, **overrides)) for _ in range(RUNS)]
+        medians = {phase: statistics.median(r[phase] for r in runs) for phase in ('import', 'create', 'first')}
+        total = statistics.median(sum(r.values()) for r in runs)
+        print(f'{name:<13} {medians["import"] * 1000:7.1f}ms {medians["create"] * 1000:7.1f}ms '
+              f'{medians["first"] * 1000:7.1f}ms {total * 1000:7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark: latency of GET /api/analytics/timeseries against the 100 ms target.
+
+Seeds BENCH_TRANSACTIONS transactions (default 100,000, two items each)
+spread over the last year into a throw-away SQLite file unless
+DATABASE_URL is set, builds the daily rollup from them, then reports
+p50/p95 latency with the response cache disabled, so every request hits
+the database. Exits with status 1 if any p95 is above TARGET_MS for:
+  - totals and the payment_method breakdown over the default 30 days and
+    over the whole year (served from daily_sales_rollup);
+  - the product, category and customer breakdowns over the default 30 days
+    (summed from the items through the covering transaction_item index).
+Year-long product, category and customer breakdowns are printed for
+reference only: they sum every item row of the year (about 200,000 at the
+default volume) and daily buckets return one point per product per day.
+
+    python bench_timeseries.py
+    BENCH_TRANSACTIONS=1000000 python bench_timeseries.py
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_timeseries.db')
+os.environ['CACHE_ENABLED'] = 'false'
+
+from app import app
+from models import db, Category, Product, Customer, Transaction, TransactionItem
+from rollups import rebuild_daily_sales
+
+TRANSACTIONS = int(os.getenv('BENCH_TRANSACTIONS', 100_000))
+PRODUCTS = 500
+CATEGORIES = 20
+CUSTOMERS = 200
+BATCH = 20_000
+RUNS = 30
+TARGET_MS = 100
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        if Transaction.query.first():
+            print('Transactions already present, skipping seed.')
+            return
+        db.session.bulk_insert_mappings(Category, [{'name': f'Category {i}'} for i in range(CATEGORIES)])
+        db.session.flush()
+        category_ids = [c for (c,) in db.session.query(Category.id)]
+        db.session.bulk_insert_mappings(Product, [
+            {'name': f'Product {i}', 'sku': f'BENCH-{i}', 'price': 1000 + i,
+             'stock_quantity': 1000, 'category_id': category_ids[i % CATEGORIES]}
+            for i in range(PRODUCTS)
+        ])
+        db.session.bulk_insert_mappings(Customer, [
+            {'name': f'Customer {i}', 'phone': f'08{i:08d}'} for i in range(CUSTOMERS)
+        ])
+        db.session.commit()
+
+        product_ids = [p for (p,) in db.session.query(Product.id)]
+        customer_ids = [c for (c,) in db.session.query(Customer.id)]
+        start = datetime.utcnow() - timedelta(days=365)
+        step = timedelta(days=365) / TRANSACTIONS
+        rng = random.Random(42)
+
+        print(f'Seeding {TRANSACTIONS} transactions...')
+        t0 = time.perf_counter()
+        next_id = 1
+        for offset in range(0, TRANSACTIONS, BATCH):
+            count = min(BATCH, TRANSACTIONS - offset)
+            transactions = []
+            items = []
+            for i in range(count):
+                tid = next_id + i
+                lines = [(pid, rng.randint(1, 3)) for pid in rng.sample(product_ids, 2)]
+                transactions.append({
+                    'id': tid,
+                    'date': start + step * (offset + i),
+                    'total_amount': sum(2500.0 * qty for _, qty in lines),
+                    'paid_amount': 0.0,
+                    'payment_method': rng.choice(['cash', 'cash', 'debt']),
+                    'customer_id': rng.choice(customer_ids) if rng.random() < 0.5 else None,
+                })
+                items += [{'transaction_id': tid, 'product_id': pid, 'quantity': qty, 'price_at_sale': 2500.0}
+                          for pid, qty in lines]
+            db.session.execute(Transaction.__table__.insert(), transactions)
+            db.session.execute(TransactionItem.__table__.insert(), items)
+            db.session.commit()
+            next_id += count
+        rebuild_daily_sales()
+        db.session.commit()
+        print(f'Seeded in {time.perf_counter() - t0:.1f}s')
+
+
+def measure(client, label, url):
+    timings = []
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        resp = client.get(url)
+        timings.append((time.perf_counter() - t0) * 1000)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f'{label:<40} p50 {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms')
+    return p95
+
+
+def run():
+    seed()
+    client = app.test_client()
+    year_ago = (datetime.utcnow() - timedelta(days=365)).date().isoformat()
+    slow = []
+    for group_by in (None, 'payment_method', 'product', 'category', 'customer'):
+        for range_label, args in (('30 days', ''), ('1 year', f'&start_date={year_ago}')):
+            for granularity in ('day', 'month'):
+                url = f'/api/analytics/timeseries?granularity={granularity}{args}'
+                if group_by:
+                    url += f'&group_by={group_by}'
+                label = f'{group_by or "total"}, {range_label}, {granularity}'
+                gated = group_by in (None, 'payment_method') or not args
+                if measure(client, label + ('' if gated else ' (reference)'), url) > TARGET_MS and gated:
+                    slow.append(label)
+
+    if slow:
+        print(f'FAILED: p95 above {TARGET_MS} ms for: ' + '; '.join(slow))
+        return 1
+    print(f'SUCCESS: timeseries queries are under {TARGET_MS} ms at p95.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,205 @@
+"""Response cache for hot read endpoints with write-driven invalidation.
+
+Cached views declare the data they depend on as namespaces ('sales',
+'products', 'categories', 'settings'). Each namespace has a version number
+that is part of every cache key, so invalidating a namespace is a single
+version bump: old entries are simply never read again and age out.
+
+Writers call ``invalidate('sales')`` etc. before committing. The bump is
+deferred until the SQLAlchemy session actually commits, and discarded on
+rollback, so readers never cache data from a transaction that did not land.
+
+The default backend is an in-process TTL/LRU dict, which is per worker:
+other workers only see an invalidation once their entries expire
+(CACHE_TTL). Set CACHE_REDIS_URL to share entries and versions between
+workers through Redis (requires the optional ``redis`` package).
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db
+
+_PENDING_KEY = 'cache_invalidate'
+
+
+class MemoryBackend:
+    """Thread-safe in-process TTL + LRU store."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_version(self, namespace):
+        with self._lock:
+            return self._versions.get(namespace, 0)
+
+    def bump_version(self, namespace):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._data)
+
+
+class RedisBackend:
+    """Shared store backed by Redis; versions are Redis counters."""
+
+    def __init__(self, url, prefix='store-cache:'):
+        import redis  # optional dependency, only needed when CACHE_REDIS_URL is set
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def get_version(self, namespace):
+        raw = self.client.get(f'{self.prefix}version:{namespace}')
+        return int(raw) if raw is not None else 0
+
+    def bump_version(self, namespace):
+        self.client.incr(f'{self.prefix}version:{namespace}')
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+    def size(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + '*'))
+
+
+class Cache:
+    def __init__(self, app=None):
+        self.backend = None
+        self.default_ttl = 30
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_ENABLED', True)
+        app.config.setdefault('CACHE_TTL', 30)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('CACHE_REDIS_URL', None)
+
+        self.enabled = app.config['CACHE_ENABLED']
+        self.default_ttl = app.config['CACHE_TTL']
+        if app.config['CACHE_REDIS_URL']:
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        else:
+            self.backend = MemoryBackend(app.config['CACHE_MAX_ENTRIES'])
+        app.extensions['response_cache'] = self
+
+    def _record(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def make_key(self, namespaces, name):
+        versions = ','.join(f'{ns}={self.backend.get_version(ns)}' for ns in namespaces)
+        return f'{name}|{versions}'
+
+    def bump(self, namespaces):
+        for namespace in namespaces:
+            self.backend.bump_version(namespace)
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / total if total else 0.0,
+            'entries': self.backend.size()
+        }
+
+
+cache = Cache()
+
+
+def cached_response(*namespaces, ttl=None):
+    """Cache a view's successful response, keyed on its full path and the
+    current versions of ``namespaces``."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not cache.enabled or cache.backend is None:
+                return view(*args, **kwargs)
+
+            key = cache.make_key(namespaces, f'{request.endpoint}:{request.full_path}')
+            entry = cache.backend.get(key)
+            if entry is not None:
+                cache._record(True)
+                body, status, mimetype = entry
+                return current_app.response_class(body, status=status, mimetype=mimetype)
+
+            cache._record(False)
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                cache.backend.set(key, (response.get_data(), response.status_code, response.mimetype),
+                                  ttl or cache.default_ttl)
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate(*namespaces, session=None):
+    """Invalidate cached responses depending on ``namespaces`` once the
+    current database transaction (of ``session``, default db.session) commits."""
+    (session or db.session).info.setdefault(_PENDING_KEY, set()).update(namespaces)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending and cache.backend is not None:
+        cache.bump(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
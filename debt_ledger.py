@@ -0,0 +1,237 @@
+"""Append-only customer debt ledger with running balances.
+
+Every change to a customer's debt is a DebtRecord holding the signed amount
+and the customer's balance after it, in id order. The current balance is the
+balance of the customer's newest record, a single lookup on
+ix_debt_record_customer_id_id. Customer.total_debt is a denormalised copy of
+that balance (kept for listing and sorting) and is written only by
+post_entries, in the same database transaction as the records.
+
+The functions used at checkout take an optional ``session`` (default
+db.session), so sales_service can run them on any Session, including the
+one behind an AsyncSession.
+
+Amounts are exact two-place Decimals. Records are never deleted and their
+amounts and balances never change: removing a sale posts a reversal entry
+instead. The one update is detaching the removed sale's records
+(transaction_id set to NULL), which reverse_transactions does explicitly
+because SQLite does not enforce the foreign key's ON DELETE SET NULL by
+default. reconcile_debt.py verifies the whole ledger and every customer's
+copy in one pass each.
+"""
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from sqlalchemy import bindparam, case, func, select, update
+
+from models import db, Customer, DebtRecord
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+# Float comparisons in check_ledger tolerate rounding below half a cent
+# (SQLite stores NUMERIC values as floating point)
+TOLERANCE = 0.005
+
+
+def to_amount(value):
+    """Convert a request value (str, int, float or Decimal) to a two-place Decimal.
+
+    Raises ValueError for anything that is not a finite number.
+    """
+    try:
+        amount = Decimal(str(value))
+        if not amount.is_finite():
+            raise ValueError
+        return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError('Invalid amount')
+
+
+def current_balance(customer_id, session=None):
+    """The customer's debt according to the ledger (newest record's balance)."""
+    session = session or db.session
+    balance = session.query(DebtRecord.balance) \
+        .filter(DebtRecord.customer_id == customer_id) \
+        .order_by(DebtRecord.id.desc()) \
+        .limit(1).scalar()
+    return balance if balance is not None else ZERO
+
+
+def latest_balances(customer_ids, session=None):
+    """Current ledger balance for each of ``customer_ids`` in one query.
+
+    Customers without any record are left out (their balance is zero).
+    """
+    session = session or db.session
+    newest = select(DebtRecord.customer_id, func.max(DebtRecord.id).label('id')) \
+        .where(DebtRecord.customer_id.in_(list(customer_ids))) \
+        .group_by(DebtRecord.customer_id) \
+        .subquery()
+    rows = session.query(DebtRecord.customer_id, DebtRecord.balance) \
+        .join(newest, DebtRecord.id == newest.c.id)
+    return {customer_id: balance if balance is not None else ZERO for customer_id, balance in rows}
+
+
+def lock_customers(customer_ids, session=None):
+    """Serialise ledger postings per customer for the rest of the transaction.
+
+    SELECT ... FOR UPDATE on PostgreSQL; a no-op on SQLite, where the first
+    write already takes the database lock.
+    """
+    session = session or db.session
+    session.query(Customer.id) \
+        .filter(Customer.id.in_(sorted(customer_ids))) \
+        .order_by(Customer.id) \
+        .with_for_update() \
+        .all()
+
+
+def post_entries(entries, session=None):
+    """Append ledger entries and return the new balance after each one.
+
+    ``entries`` is a list of (customer_id, amount, type, description,
+    transaction_id) with ``amount`` a Decimal (see to_amount). Entries for
+    the same customer are applied in list order. Uses a fixed number of
+    statements however many entries are posted: lock, read balances,
+    one bulk insert and one UPDATE of Customer.total_debt. Does not commit.
+    """
+    if not entries:
+        return []
+    session = session or db.session
+    customer_ids = {entry[0] for entry in entries}
+    lock_customers(customer_ids, session)
+    balances = latest_balances(customer_ids, session)
+
+    now = datetime.utcnow()
+    rows = []
+    for customer_id, amount, type_, description, transaction_id in entries:
+        balance = balances.get(customer_id, ZERO) + amount
+        balances[customer_id] = balance
+        rows.append({
+            'customer_id': customer_id,
+            'transaction_id': transaction_id,
+            'amount': amount,
+            'balance': balance,
+            'type': type_,
+            'description': description,
+            'date': now
+        })
+    session.bulk_insert_mappings(DebtRecord, rows)
+
+    # ORM-enabled UPDATE so Customer objects already in the session see the new balance
+    session.execute(
+        update(Customer)
+        .where(Customer.id.in_(list(customer_ids)))
+        .values(total_debt=case({cid: balances[cid] for cid in customer_ids}, value=Customer.id))
+        .execution_options(synchronize_session='fetch')
+    )
+    return [row['balance'] for row in rows]
+
+
+def post_entry(customer_id, amount, type_, description, transaction_id=None, session=None):
+    """Append one ledger entry; returns the customer's new balance."""
+    return post_entries([(customer_id, amount, type_, description, transaction_id)], session)[0]
+
+
+def reverse_transactions(transaction_ids, session=None):
+    """Cancel the debt of deleted transactions.
+
+    Posts one 'reversal' entry per (customer, transaction) with debt and
+    detaches the original records from the transactions (transaction_id set
+    to NULL, what ON DELETE SET NULL would do where foreign keys are
+    enforced) so the ledger survives the delete. Does not commit.
+    """
+    session = session or db.session
+    debts = session.query(DebtRecord.customer_id, DebtRecord.transaction_id, func.sum(DebtRecord.amount)) \
+        .filter(DebtRecord.transaction_id.in_(transaction_ids)) \
+        .group_by(DebtRecord.customer_id, DebtRecord.transaction_id) \
+        .order_by(DebtRecord.transaction_id) \
+        .all()
+    if not debts:
+        return
+    entries = [
+        (customer_id, -to_amount(amount), 'reversal', f'Reversal of deleted Transaction #{transaction_id}', None)
+        for customer_id, transaction_id, amount in debts
+        if amount
+    ]
+    post_entries(entries, session)
+    session.execute(
+        update(DebtRecord.__table__)
+        .where(DebtRecord.transaction_id.in_(transaction_ids))
+        .values(transaction_id=None)
+    )
+
+
+def check_ledger():
+    """Verify the ledger and Customer.total_debt; returns a list of problems.
+
+    Two passes: one window query over every record comparing the stored
+    balance with the running sum of amounts, and one over customers
+    comparing total_debt with their newest balance.
+    """
+    running = select(
+        DebtRecord.customer_id,
+        DebtRecord.id,
+        DebtRecord.balance,
+        func.sum(DebtRecord.amount).over(partition_by=DebtRecord.customer_id, order_by=DebtRecord.id)
+        .label('expected')
+    ).subquery()
+    bad_records = db.session.query(running).filter(
+        (running.c.balance.is_(None)) | (func.abs(running.c.balance - running.c.expected) >= TOLERANCE)
+    ).order_by(running.c.customer_id, running.c.id)
+
+    problems = [
+        {'customer_id': r.customer_id, 'record_id': r.id, 'problem': 'balance',
+         'stored': float(r.balance) if r.balance is not None else None, 'expected': round(float(r.expected), 2)}
+        for r in bad_records
+    ]
+
+    newest = select(DebtRecord.customer_id, func.max(DebtRecord.id).label('id')) \
+        .group_by(DebtRecord.customer_id).subquery()
+    latest = db.session.query(Customer.id, Customer.total_debt, DebtRecord.balance) \
+        .outerjoin(newest, newest.c.customer_id == Customer.id) \
+        .outerjoin(DebtRecord, DebtRecord.id == newest.c.id)
+    ledger_balance = func.coalesce(DebtRecord.balance, 0)
+    for customer_id, total_debt, balance in latest.filter(
+            func.abs(func.coalesce(Customer.total_debt, 0) - ledger_balance) >= TOLERANCE):
+        problems.append({'customer_id': customer_id, 'record_id': None, 'problem': 'total_debt',
+                         'stored': float(total_debt) if total_debt is not None else None, 'expected': float(balance if balance is not None else ZERO)})
+    return problems
+
+
+def rebuild_balances():
+    """Recompute every record's running balance from the amounts, then copy
+    each customer's newest balance to Customer.total_debt.
+
+    Maintenance only (migration backfill or repair after a failed check);
+    streams the ledger once in (customer_id, id) order. Does not commit.
+    """
+    table = DebtRecord.__table__
+    updates = []
+    finals = {}
+    current_customer, balance = None, ZERO
+    rows = db.session.query(DebtRecord.id, DebtRecord.customer_id, DebtRecord.amount, DebtRecord.balance) \
+        .order_by(DebtRecord.customer_id, DebtRecord.id) \
+        .yield_per(1000)
+    for record_id, customer_id, amount, stored in rows:
+        if customer_id != current_customer:
+            current_customer, balance = customer_id, ZERO
+        balance += to_amount(amount)
+        finals[customer_id] = balance
+        if stored is None or stored != balance:
+            updates.append({'record_id': record_id, 'new_balance': balance})
+    if updates:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('record_id')).values(balance=bindparam('new_balance')),
+            updates
+        )
+
+    db.session.execute(update(Customer.__table__).values(total_debt=ZERO))
+    if finals:
+        db.session.execute(
+            update(Customer.__table__)
+            .where(Customer.id == bindparam('customer_id'))
+            .values(total_debt=bindparam('balance')),
+            [{'customer_id': cid, 'balance': b} for cid, b in finals.items()]
+        )
+    return len(updates)
@@ -10,7 +10,7 @@ def force_add_columns():
 
     # Try adding total_debt if missing
     try:
-        cursor.execute("ALTER TABLE customer ADD COLUMN total_debt FLOAT DEFAULT 0.0")
+        cursor.execute("ALTER TABLE customer ADD COLUMN total_debt NUMERIC(12, 2) DEFAULT 0")
         print("Success: Added total_debt")
     except sqlite3.OperationalError as e:
         print(f"Error adding total_debt: {e}")
@@ -0,0 +1,182 @@
+"""Retry-safe POSTs with the Idempotency-Key header.
+
+A client that may resend a request (e.g. a till on flaky Wi-Fi) sends a
+unique Idempotency-Key with it. The first request with a key reserves it
+by inserting an IdempotencyKey row *inside the view's own database
+transaction*; the view stores its response on that row with
+remember_response() just before committing. The reservation, the stored
+response and the view's writes therefore commit (or roll back) together:
+  - a retry after the commit finds the row with one indexed lookup and
+    gets the original response replayed, without running the view;
+  - a concurrent duplicate blocks on the unique key until the first
+    request finishes, then replays its response (or, if the first request
+    failed and rolled back, runs normally);
+  - failed requests (4xx/5xx) are not stored, so they can be retried.
+Reusing a key with a different request body is rejected with 422.
+
+reserve_key and store_response work on any Session and know nothing about
+the web framework: the @idempotent decorator uses them for Flask views, and
+asgi.py for the same endpoints on the async stack, so a retry is replayed
+whichever server it reaches.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, g, request
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, IdempotencyKey
+from serializers import dumps
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL_HOURS = 24
+
+
+class StoredResponse:
+    """A response decided by the key alone: a replay or a key error."""
+
+    def __init__(self, status, body, replayed=False):
+        self.status = status
+        self.body = body  # JSON bytes
+        self.replayed = replayed
+
+
+def _error(status, message):
+    return StoredResponse(status, dumps({'error': message}))
+
+
+def request_hash(method, path, body):
+    """Fingerprint of a request: method, path and body (JSON canonicalised)."""
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        data = None
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':')).encode() if data is not None else body
+    digest = hashlib.sha256(f'{method} {path}\n'.encode())
+    digest.update(payload or b'')
+    return digest.hexdigest()
+
+
+def _replay(record, fingerprint):
+    if record.request_hash != fingerprint:
+        return _error(422, f'{IDEMPOTENCY_HEADER} was already used for a different request')
+    if record.status_code is None:
+        return _error(409, 'A request with this Idempotency-Key is still being processed')
+    return StoredResponse(record.status_code, record.response_body.encode('utf-8'), replayed=True)
+
+
+def _reserved_elsewhere(session, key, fingerprint):
+    """Another request claimed the key first: replay its stored response."""
+    session.rollback()
+    existing = session.query(IdempotencyKey).filter_by(key=key).first()
+    if existing is None:
+        return _error(409, 'A request with this Idempotency-Key is still being processed')
+    return _replay(existing, fingerprint)
+
+
+def reserve_key(session, key, endpoint, fingerprint, ttl_hours=DEFAULT_TTL_HOURS):
+    """Reserve ``key`` for this request in ``session``'s transaction.
+
+    Returns (record, None) when the request should run: pass the record to
+    store_response() before committing. Returns (None, StoredResponse) when
+    it must not run: a replay of the first request's response, or an error
+    (bad key, key reused with another body, first request still running).
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        return None, _error(400, f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters')
+    now = datetime.utcnow()
+    expires_at = now + timedelta(hours=ttl_hours)
+    record = session.query(IdempotencyKey).filter_by(key=key).first()
+    if record is not None and record.expires_at > now:
+        return None, _replay(record, fingerprint)
+
+    if record is not None:
+        # Expired but not purged yet: re-claim the row with a guarded UPDATE, so that
+        # of two concurrent retries only the first matches and the second replays
+        claimed = session.execute(
+            update(IdempotencyKey.__table__)
+            .where(IdempotencyKey.id == record.id, IdempotencyKey.expires_at <= now)
+            .values(endpoint=endpoint, request_hash=fingerprint, status_code=None,
+                    response_body=None, created_at=now, expires_at=expires_at)
+        ).rowcount
+        if not claimed:
+            return None, _reserved_elsewhere(session, key, fingerprint)
+        session.refresh(record)
+    else:
+        record = IdempotencyKey(key=key, endpoint=endpoint, request_hash=fingerprint,
+                                created_at=now, expires_at=expires_at)
+        session.add(record)
+        try:
+            # Blocks while a concurrent duplicate holds the key, then fails once it commits
+            session.flush()
+        except IntegrityError:
+            return None, _reserved_elsewhere(session, key, fingerprint)
+    return record, None
+
+
+def store_response(record, body, status):
+    """Store the success response on a reserved key; call just before commit."""
+    record.status_code = status
+    record.response_body = dumps(body).decode('utf-8')
+
+
+def _flask_response(stored):
+    response = current_app.response_class(stored.body, status=stored.status, mimetype='application/json')
+    if stored.replayed:
+        response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Honour the Idempotency-Key header on a view that commits once.
+
+    The view must call remember_response() with its success body before
+    committing; requests without the header are passed straight through.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        record, stored = reserve_key(
+            db.session, key, request.endpoint, request_hash(request.method, request.path, request.get_data()),
+            current_app.config.get('IDEMPOTENCY_TTL_HOURS', DEFAULT_TTL_HOURS)
+        )
+        if stored is not None:
+            return _flask_response(stored)
+
+        g.idempotency_record = record
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.pop('idempotency_record', None)
+    return wrapper
+
+
+def remember_response(body, status):
+    """Store the response of an idempotent request; call just before commit.
+
+    A no-op for requests sent without an Idempotency-Key.
+    """
+    record = g.get('idempotency_record')
+    if record is not None:
+        store_response(record, body, status)
+
+
+def purge_expired(batch_size=1000):
+    """Delete expired keys in batches, committing after each; returns the count."""
+    deleted = 0
+    while True:
+        ids = [row.id for row in db.session.query(IdempotencyKey.id)
+               .filter(IdempotencyKey.expires_at <= datetime.utcnow())
+               .limit(batch_size)]
+        if not ids:
+            return deleted
+        IdempotencyKey.query.filter(IdempotencyKey.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
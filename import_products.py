@@ -0,0 +1,50 @@
+"""
+Import products from a CSV or NDJSON file.
+
+Usage:
+    python import_products.py catalogue.csv
+    python import_products.py catalogue.ndjson --batch-size 2000 --create-categories
+
+CSV files need a header row with: name, sku, price, stock_quantity and
+either category_id or category (name). low_stock_threshold is optional.
+Rows that fail validation are reported and skipped; the rest are imported.
+"""
+import argparse
+import json
+import os
+import sys
+
+from app import app
+from product_import import DEFAULT_BATCH_SIZE, FORMATS, import_products
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream-import products from CSV or NDJSON.')
+    parser.add_argument('path', help='CSV or NDJSON file')
+    parser.add_argument('--format', choices=FORMATS, help='defaults to the file extension')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--create-categories', action='store_true', help='create unknown category names')
+    args = parser.parse_args()
+
+    fmt = args.format
+    if not fmt:
+        ext = os.path.splitext(args.path)[1].lower()
+        fmt = 'csv' if ext == '.csv' else 'ndjson' if ext in ('.ndjson', '.jsonl') else None
+    if not fmt:
+        print('Cannot infer format from the file extension; pass --format csv|ndjson')
+        return 1
+
+    with app.app_context(), open(args.path, 'rb') as f:
+        result = import_products(f, fmt, batch_size=args.batch_size, create_categories=args.create_categories)
+
+    summary = result.to_dict()
+    print(f"Inserted: {summary['inserted']}  Failed: {summary['failed']}")
+    for error in summary['errors']:
+        print(json.dumps(error))
+    if summary['errors_truncated']:
+        print(f"... only the first {len(summary['errors'])} errors are shown")
+    return 0 if summary['failed'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
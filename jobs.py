@@ -0,0 +1,210 @@
+"""Background jobs for heavy maintenance operations.
+
+Operations that can outlive a proxy timeout (deleting sales by filter,
+product imports, rollup rebuilds) run on a thread pool in the web process
+instead of inside the request. The ``job`` table is both the queue and the
+status board, so nothing beyond the database is needed:
+  - enqueue() inserts a 'queued' row, commits and hands the id to the pool;
+  - a worker claims the row with a guarded UPDATE (status 'queued' ->
+    'running'), so a job runs once even if several processes try;
+  - the job reports progress through JobContext.progress(), which also
+    raises JobCancelled once cancel() has been requested;
+  - the row ends as 'done' (with a JSON result), 'failed' or 'cancelled'.
+
+Job kinds are registered with @job_kind next to the code they wrap. Jobs
+commit their own work in chunks, so a cancelled or failed job keeps the
+chunks it finished. Threads rather than processes: the work is database
+bound, and pooled connections must not be shared with forked children.
+
+On the first request after start-up, a process picks up queued jobs (left
+by a process that stopped) and marks running jobs whose heartbeat is older
+than JOB_STALE_SECONDS as failed.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app, jsonify, url_for
+from sqlalchemy import update
+
+from models import db, Job
+
+STATUSES = ('queued', 'running', 'done', 'failed', 'cancelled')
+FINISHED = ('done', 'failed', 'cancelled')
+
+JOB_KINDS = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a job by JobContext.progress() after cancel()."""
+
+
+class JobKind:
+    def __init__(self, name, func, validate=None, public=True):
+        self.name = name
+        self.func = func
+        self.validate = validate
+        # public kinds may be enqueued with POST /api/jobs; the others only by
+        # the endpoint that prepares their parameters (e.g. a spooled upload)
+        self.public = public
+
+
+def job_kind(name, validate=None, public=True):
+    """Register ``func(ctx, **params)`` as a job kind.
+
+    ``validate(params)`` checks client parameters before the job is queued:
+    it returns the parameters to store or raises ValueError.
+    """
+    def decorator(func):
+        JOB_KINDS[name] = JobKind(name, func, validate, public)
+        return func
+    return decorator
+
+
+class JobContext:
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def progress(self, done, total=None):
+        """Record progress and honour cancellation.
+
+        Commits the session, so call it between units of work (after the
+        job's own commit). Raises JobCancelled if cancel() was requested.
+        """
+        values = {'progress': done, 'heartbeat_at': datetime.utcnow()}
+        if total is not None:
+            values['total'] = total
+        db.session.execute(update(Job.__table__).where(Job.id == self.job_id).values(**values))
+        db.session.commit()
+        if db.session.query(Job.cancel_requested).filter(Job.id == self.job_id).scalar():
+            raise JobCancelled()
+
+
+class JobRunner:
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._resumed = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOB_WORKERS', 2)
+        app.config.setdefault('JOB_STALE_SECONDS', 600)
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='job')
+        app.before_request(self._resume_once)
+        app.extensions['jobs'] = self
+
+    def submit(self, job_id):
+        self._executor.submit(self._run, job_id)
+
+    def _resume_once(self):
+        if self._resumed:
+            return
+        with self._lock:
+            if self._resumed:
+                return
+            self._resumed = True
+        self.resume()
+
+    def resume(self):
+        """Fail stale running jobs and submit every queued one."""
+        stale_before = datetime.utcnow() - timedelta(seconds=current_app.config['JOB_STALE_SECONDS'])
+        db.session.execute(
+            update(Job.__table__)
+            .where(Job.status == 'running', Job.heartbeat_at < stale_before)
+            .values(status='failed', error='Interrupted: the worker running this job stopped',
+                    finished_at=datetime.utcnow())
+        )
+        db.session.commit()
+        queued = [job_id for (job_id,) in db.session.query(Job.id).filter(Job.status == 'queued').order_by(Job.id)]
+        for job_id in queued:
+            self.submit(job_id)
+        return len(queued)
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            now = datetime.utcnow()
+            claimed = db.session.execute(
+                update(Job.__table__)
+                .where(Job.id == job_id, Job.status == 'queued')
+                .values(status='running', started_at=now, heartbeat_at=now)
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                return
+
+            name, params = db.session.query(Job.kind, Job.params).filter(Job.id == job_id).one()
+            try:
+                kind = JOB_KINDS.get(name)
+                if kind is None:
+                    raise ValueError(f'Unknown job kind: {name}')
+                result = kind.func(JobContext(job_id), **(params or {}))
+                db.session.commit()
+                _finish(job_id, 'done', result=result)
+            except JobCancelled:
+                db.session.rollback()
+                _finish(job_id, 'cancelled')
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.exception('Job %s (%s) failed', job_id, name)
+                _finish(job_id, 'failed', error=str(e))
+
+
+def _finish(job_id, status, result=None, error=None):
+    db.session.execute(
+        update(Job.__table__)
+        .where(Job.id == job_id)
+        .values(status=status, result=result, error=error, finished_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+def enqueue(name, params=None):
+    """Queue a job and start it as soon as a worker is free; returns the Job.
+
+    Raises ValueError for an unknown kind or invalid parameters. Commits.
+    """
+    kind = JOB_KINDS.get(name)
+    if kind is None:
+        raise ValueError(f'Unknown job kind: {name}')
+    params = params or {}
+    if kind.validate is not None:
+        params = kind.validate(params)
+    job = Job(kind=name, params=params)
+    db.session.add(job)
+    db.session.commit()
+    runner.submit(job.id)
+    return job
+
+
+def job_accepted(job):
+    """202 response for an endpoint that queued ``job``; poll the Location."""
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = url_for('jobs.get_job', id=job.id)
+    return response
+
+
+def cancel(job_id):
+    """Cancel a queued job at once, or ask a running one to stop at its next
+    progress report. Returns False if the job had already finished."""
+    now = datetime.utcnow()
+    cancelled = db.session.execute(
+        update(Job.__table__)
+        .where(Job.id == job_id, Job.status == 'queued')
+        .values(status='cancelled', cancel_requested=True, finished_at=now)
+    ).rowcount
+    if not cancelled:
+        cancelled = db.session.execute(
+            update(Job.__table__)
+            .where(Job.id == job_id, Job.status == 'running')
+            .values(cancel_requested=True)
+        ).rowcount
+    db.session.commit()
+    return bool(cancelled)
+
+
+runner = JobRunner()
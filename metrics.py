@@ -0,0 +1,231 @@
+"""Request-level performance instrumentation.
+
+Every request records its wall time, the number of SQL statements it ran
+and the time spent executing them (SQLAlchemy before/after_cursor_execute
+and handle_error events on all engines, so statements that fail count
+too). The time spent waiting for locks is part of the database time. The figures are reported in three places:
+  - a ``Server-Timing`` header on the response (db, app and total
+    durations, shown in the browser's network panel);
+  - per-endpoint histograms and counters, exposed in the Prometheus text
+    format at GET /metrics;
+  - optionally, a warning in the app log for each statement slower than
+    SLOW_QUERY_MS, with the endpoint that ran it.
+
+A request with many queries and little database time points to N+1 lazy
+loads; a high db time with few queries points to slow plans or lock waits;
+a high app time points to Python work (serialization, aggregation).
+
+The registry is per process, like the in-memory response cache: with
+several workers, Prometheus scrapes each worker separately. Durations of
+streamed responses (SSE, exports) cover the time up to the headers only.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Seconds; Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# SQL statements per request
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SLOW_QUERY_LOG_LENGTH = 500  # characters of the statement written to the log
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {self.count}')
+        lines.append(f'{name}_sum{_labels(labels)} {_number(self.sum)}')
+        lines.append(f'{name}_count{_labels(labels)} {self.count}')
+        return lines
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.enabled = True
+        self.slow_query_ms = None
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._queries = {}
+        self._db_seconds = {}
+        self._requests = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('SLOW_QUERY_MS', None)
+
+        self.enabled = app.config['METRICS_ENABLED']
+        self.slow_query_ms = app.config['SLOW_QUERY_MS']
+        if self.enabled:
+            app.before_request(_start_request)
+            app.after_request(self._finish_request)
+            app.teardown_request(self._record_unhandled)
+        app.extensions['metrics'] = self
+
+    def _finish_request(self, response):
+        stats = g.pop('_metrics', None)
+        if stats is None:
+            return response
+        total = time.perf_counter() - stats['start']
+        queries, db_seconds = stats['queries'], stats['db_seconds']
+        self.observe(request.method, request.endpoint or 'unmatched', response.status_code,
+                     total, queries, db_seconds)
+
+        response.headers['Server-Timing'] = (
+            f'db;dur={db_seconds * 1000:.1f};desc="{queries} queries", '
+            f'app;dur={max(total - db_seconds, 0) * 1000:.1f}, '
+            f'total;dur={total * 1000:.1f}'
+        )
+        response.headers['Timing-Allow-Origin'] = '*'
+        return response
+
+    def _record_unhandled(self, exc):
+        # after_request does not run when a view raises: count it as a 500
+        stats = g.pop('_metrics', None)
+        if stats is not None:
+            self.observe(request.method, request.endpoint or 'unmatched', 500,
+                         time.perf_counter() - stats['start'], stats['queries'], stats['db_seconds'])
+
+    def observe(self, method, endpoint, status, seconds, queries, db_seconds):
+        key = (method, endpoint)
+        with self._lock:
+            if key not in self._latency:
+                self._latency[key] = Histogram(LATENCY_BUCKETS)
+                self._queries[key] = Histogram(QUERY_BUCKETS)
+                self._db_seconds[key] = 0.0
+            self._latency[key].observe(seconds)
+            self._queries[key].observe(queries)
+            self._db_seconds[key] += db_seconds
+            status_key = (method, endpoint, status)
+            self._requests[status_key] = self._requests.get(status_key, 0) + 1
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        with self._lock:
+            latency = {k: _copy(h) for k, h in self._latency.items()}
+            queries = {k: _copy(h) for k, h in self._queries.items()}
+            db_seconds = dict(self._db_seconds)
+            requests = dict(self._requests)
+
+        lines = [
+            '# HELP http_requests_total Requests handled, by endpoint and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (method, endpoint, status), count in sorted(requests.items()):
+            labels = _labels([('method', method), ('endpoint', endpoint), ('status', status)])
+            lines.append(f'http_requests_total{labels} {count}')
+
+        lines += [
+            '# HELP http_request_duration_seconds Request latency up to the response headers.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (method, endpoint), histogram in sorted(latency.items()):
+            lines += histogram.render('http_request_duration_seconds', [('method', method), ('endpoint', endpoint)])
+
+        lines += [
+            '# HELP http_request_db_queries SQL statements executed per request.',
+            '# TYPE http_request_db_queries histogram',
+        ]
+        for (method, endpoint), histogram in sorted(queries.items()):
+            lines += histogram.render('http_request_db_queries', [('method', method), ('endpoint', endpoint)])
+
+        lines += [
+            '# HELP http_request_db_seconds_total Time spent executing SQL statements, including lock waits.',
+            '# TYPE http_request_db_seconds_total counter',
+        ]
+        for (method, endpoint), seconds in sorted(db_seconds.items()):
+            lines.append(f'http_request_db_seconds_total{_labels([("method", method), ("endpoint", endpoint)])} '
+                         f'{_number(seconds)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _copy(histogram):
+    clone = Histogram(histogram.buckets)
+    clone.counts = list(histogram.counts)
+    clone.sum = histogram.sum
+    clone.count = histogram.count
+    return clone
+
+
+def _start_request():
+    g._metrics = {'start': time.perf_counter(), 'queries': 0, 'db_seconds': 0.0}
+
+
+metrics = Metrics()
+
+
+# The start time lives on the statement's execution context, so a statement
+# that fails leaves nothing behind on the pooled connection
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record_query(context, statement)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    # Failed statements (lock timeouts, constraint violations) still spent database time
+    _record_query(exception_context.execution_context, exception_context.statement)
+
+
+def _record_query(context, statement):
+    start = getattr(context, '_metrics_query_start', None)
+    if start is None:
+        return
+    del context._metrics_query_start
+    elapsed = time.perf_counter() - start
+
+    in_request = has_request_context()
+    stats = g.get('_metrics') if in_request else None
+    if stats is not None:
+        stats['queries'] += 1
+        stats['db_seconds'] += elapsed
+
+    if metrics.slow_query_ms and elapsed * 1000 >= metrics.slow_query_ms and has_app_context():
+        current_app.logger.warning(
+            'Slow query (%.1f ms) in %s: %s', elapsed * 1000,
+            request.endpoint if in_request else 'background',
+            ' '.join((statement or '').split())[:SLOW_QUERY_LOG_LENGTH]
+        )
@@ -0,0 +1,89 @@
+"""
+Migration helper: turn debt_record into the running-balance ledger.
+
+This script will:
+ - add the debt_record.balance column (and the new indexes)
+ - drop ix_debt_record_customer_id_date, superseded by ix_debt_record_customer_id_id
+ - on PostgreSQL, convert debt_record.amount and customer.total_debt to NUMERIC(12, 2)
+ - for customers whose total_debt does not match the sum of their records,
+   append an 'adjustment' entry so the ledger ends at the stored total_debt
+ - backfill every record's running balance (debt_ledger.rebuild_balances)
+
+Safe to run repeatedly. Run from the backend folder with your venv activated:
+    python migrate_debt_ledger.py
+    python reconcile_debt.py check
+
+BACKUP your database before running in production.
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import func, text
+from sqlalchemy.schema import CreateIndex
+
+from app import app, db
+from debt_ledger import TOLERANCE, rebuild_balances, to_amount
+from models import Customer, DebtRecord
+
+# The ledger is read by (customer_id, id) now; see models.DebtRecord
+OBSOLETE_INDEXES = ['ix_debt_record_customer_id_date']
+
+
+def run():
+    with app.app_context():
+        engine = db.engine
+        dialect = engine.dialect.name
+        print('Detected dialect:', dialect)
+        inspector = db.inspect(engine)
+        if not inspector.has_table('debt_record'):
+            print('Table debt_record does not exist; run db.create_all() first. Aborting.')
+            return 1
+
+        with engine.connect() as conn:
+            columns = [c['name'] for c in inspector.get_columns('debt_record')]
+            if 'balance' not in columns:
+                print('Adding debt_record.balance...')
+                conn.execute(text('ALTER TABLE debt_record ADD COLUMN balance NUMERIC(12, 2)'))
+            if dialect == 'postgresql':
+                print('Converting debt_record.amount to NUMERIC(12, 2)...')
+                conn.execute(text('ALTER TABLE debt_record ALTER COLUMN amount TYPE NUMERIC(12, 2) '
+                                  'USING round(amount::numeric, 2)'))
+                # ix_customer_debt_id is rebuilt by PostgreSQL as part of the type change
+                print('Converting customer.total_debt to NUMERIC(12, 2)...')
+                conn.execute(text('ALTER TABLE customer ALTER COLUMN total_debt TYPE NUMERIC(12, 2) '
+                                  'USING round(total_debt::numeric, 2)'))
+            for index in DebtRecord.__table__.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+            for name in OBSOLETE_INDEXES:
+                print(f'Dropping obsolete index {name} (if present)...')
+                conn.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+            conn.commit()
+
+        # Carry over drift between total_debt and the records as an opening adjustment
+        ledger = db.session.query(DebtRecord.customer_id, func.sum(DebtRecord.amount).label('total')) \
+            .group_by(DebtRecord.customer_id).subquery()
+        drifted = db.session.query(Customer.id, Customer.total_debt, func.coalesce(ledger.c.total, 0)) \
+            .outerjoin(ledger, ledger.c.customer_id == Customer.id) \
+            .filter(func.abs(func.coalesce(Customer.total_debt, 0) - func.coalesce(ledger.c.total, 0)) >= TOLERANCE) \
+            .all()
+        now = datetime.utcnow()
+        adjustments = []
+        for customer_id, total_debt, ledger_total in drifted:
+            amount = to_amount(total_debt or 0) - to_amount(ledger_total)
+            print(f'Customer {customer_id}: total_debt {total_debt} vs records {ledger_total}; adjusting by {amount}')
+            adjustments.append({'customer_id': customer_id, 'amount': amount, 'type': 'adjustment',
+                                'description': 'Opening balance carried over from total_debt', 'date': now})
+        db.session.bulk_insert_mappings(DebtRecord, adjustments)
+
+        updated = rebuild_balances()
+        db.session.commit()
+        print(f'Backfilled {updated} running balance(s); {len(adjustments)} opening adjustment(s).')
+        return 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(run())
+    except Exception as exc:
+        print('Migration script failed:', exc)
+        sys.exit(1)
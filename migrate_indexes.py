@@ -0,0 +1,63 @@
+"""
+Migration helper: create the secondary indexes declared in models.py.
+
+db.create_all() only creates indexes together with new tables, so existing
+databases need this script after upgrading. Indexes that already exist are
+skipped (CREATE INDEX IF NOT EXISTS), so it is safe to run repeatedly. Works on PostgreSQL and SQLite.
+Indexes replaced by newer definitions (OBSOLETE_INDEXES) are dropped.
+
+Run from the backend folder with your venv activated:
+    python migrate_indexes.py
+
+On a large PostgreSQL database run it outside business hours: CREATE INDEX
+locks the table against writes while it builds.
+"""
+from app import app, db
+from sqlalchemy.schema import CreateIndex
+
+# Indexes no longer declared in models.py, superseded by the ones noted
+OBSOLETE_INDEXES = [
+    'ix_customer_lower_name',   # ix_customer_lower_name_c (byte-order prefix search)
+    'ix_customer_phone',        # ix_customer_phone_c
+    'ix_customer_lower_email',  # ix_customer_lower_email_c
+    'ix_product_lower_name',    # ix_product_lower_name_c
+    'ix_product_lower_sku',     # ix_product_lower_sku_c
+    'ix_debt_record_customer_id_date',     # ix_debt_record_customer_id_id (running-balance ledger)
+    'ix_transaction_item_transaction_id',  # ix_transaction_item_transaction_id_covering
+]
+
+
+def migrate():
+    with app.app_context():
+        engine = db.engine
+        print('Detected dialect:', engine.dialect.name)
+        inspector = db.inspect(engine)
+
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                print(f'Table {table.name} does not exist; run db.create_all() first. Skipping.')
+                continue
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                try:
+                    print(f'Creating index {index.name} on {table.name} (if missing)...')
+                    with engine.connect() as conn:
+                        conn.execute(CreateIndex(index, if_not_exists=True))
+                        conn.commit()
+                except Exception as e:
+                    print(f'Failed to create index {index.name}: {e}')
+
+        for name in OBSOLETE_INDEXES:
+            print(f'Dropping obsolete index {name} (if present)...')
+            with engine.connect() as conn:
+                conn.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+                conn.commit()
+
+        if engine.dialect.name == 'postgresql':
+            with engine.connect() as conn:
+                conn.exec_driver_sql('ANALYZE')
+                conn.commit()
+        print('Done.')
+
+
+if __name__ == '__main__':
+    migrate()
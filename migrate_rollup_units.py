@@ -0,0 +1,37 @@
+"""
+Migration helper: units in the daily sales rollup.
+
+Adds daily_sales_rollup.units, which /api/analytics/timeseries reads for
+whole days, then recomputes the rollup from the raw transactions so the
+new column is filled in for past days. Safe to run repeatedly.
+
+Run from the backend folder with your venv activated:
+    python migrate_rollup_units.py
+
+Then run python migrate_indexes.py for the covering transaction_item index.
+"""
+from sqlalchemy import text
+
+from app import app, db
+from rollups import rebuild_daily_sales
+
+
+def migrate():
+    with app.app_context():
+        engine = db.engine
+        columns = [c['name'] for c in db.inspect(engine).get_columns('daily_sales_rollup')]
+        with engine.connect() as conn:
+            if 'units' not in columns:
+                print('Adding daily_sales_rollup.units...')
+                conn.execute(text('ALTER TABLE daily_sales_rollup ADD COLUMN units INTEGER NOT NULL DEFAULT 0'))
+            else:
+                print('daily_sales_rollup.units already exists.')
+            conn.commit()
+        print('Rebuilding the daily sales rollup...')
+        rebuild_daily_sales()
+        db.session.commit()
+        print('Done.')
+
+
+if __name__ == '__main__':
+    migrate()
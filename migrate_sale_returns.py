@@ -0,0 +1,37 @@
+"""
+Migration helper: partial returns (POST /api/sales/<id>/returns).
+
+Adds transaction_item.returned_quantity (0 for existing rows) and creates
+the sale_return and sale_return_item tables with their indexes. Safe to
+run repeatedly.
+
+Run from the backend folder with your venv activated:
+    python migrate_sale_returns.py
+"""
+from sqlalchemy import text
+
+from app import app, db
+from models import SaleReturn, SaleReturnItem
+
+
+def migrate():
+    with app.app_context():
+        engine = db.engine
+        columns = [c['name'] for c in db.inspect(engine).get_columns('transaction_item')]
+        with engine.connect() as conn:
+            if 'returned_quantity' not in columns:
+                print('Adding transaction_item.returned_quantity...')
+                conn.execute(text(
+                    'ALTER TABLE transaction_item ADD COLUMN returned_quantity INTEGER NOT NULL DEFAULT 0'
+                ))
+            else:
+                print('transaction_item.returned_quantity already exists.')
+            conn.commit()
+        print('Creating sale_return tables (if missing)...')
+        SaleReturn.__table__.create(engine, checkfirst=True)
+        SaleReturnItem.__table__.create(engine, checkfirst=True)
+        print('Done.')
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,45 @@
+"""
+Migration helper: add stock_alert.seq, the commit-ordered feed position
+read by the low-stock long-poll and SSE feeds.
+
+When the column is added, the existing alerts are numbered in id order
+(they are all committed, so that is a valid feed order), in the same
+transaction. Feed clients holding an old alert id as their cursor resume
+from the same point, since seq = id for every existing alert. The unique
+and "unsequenced" indexes are then created.
+
+Safe to run repeatedly. Once the column exists, alerts without a seq are
+ones stock_alerts.sequence_alerts has not numbered yet, so later runs leave
+them to it. Numbering them by id here could collide with ux_stock_alert_seq
+or place them behind positions feed readers have already passed.
+
+Run from the backend folder with your venv activated:
+    python migrate_stock_alert_seq.py
+"""
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+from app import app, db
+from models import StockAlert
+
+
+def migrate():
+    with app.app_context():
+        engine = db.engine
+        columns = [c['name'] for c in db.inspect(engine).get_columns('stock_alert')]
+        with engine.connect() as conn:
+            if 'seq' not in columns:
+                print('Adding stock_alert.seq...')
+                conn.execute(text('ALTER TABLE stock_alert ADD COLUMN seq INTEGER'))
+                numbered = conn.execute(text('UPDATE stock_alert SET seq = id')).rowcount
+                print(f'Numbered {numbered} existing alert(s).')
+            else:
+                print('stock_alert.seq already exists.')
+            for index in StockAlert.__table__.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+            conn.commit()
+        print('Done.')
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,34 @@
+"""
+Migration helper: add transaction.client_id for POST /api/sales/batch.
+
+Adds the nullable column and its unique index (existing rows keep NULL,
+which the unique index allows any number of). Safe to run repeatedly.
+
+Run from the backend folder with your venv activated:
+    python migrate_transaction_client_id.py
+"""
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+from app import app, db
+from models import Transaction
+
+
+def migrate():
+    with app.app_context():
+        engine = db.engine
+        columns = [c['name'] for c in db.inspect(engine).get_columns('transaction')]
+        with engine.connect() as conn:
+            if 'client_id' not in columns:
+                print('Adding transaction.client_id...')
+                conn.execute(text('ALTER TABLE "transaction" ADD COLUMN client_id VARCHAR(64)'))
+            else:
+                print('transaction.client_id already exists.')
+            index = next(ix for ix in Transaction.__table__.indexes if ix.name == 'ux_transaction_client_id')
+            conn.execute(CreateIndex(index, if_not_exists=True))
+            conn.commit()
+        print('Done.')
+
+
+if __name__ == '__main__':
+    migrate()
@@ -1,8 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from replicas import RoutingSession
+from pagination import byte_order
 
-db = SQLAlchemy()
+# RoutingSession sends reads of @replica_reads views to the optional replica bind
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -24,7 +27,18 @@ class Customer(db.Model):
     phone = db.Column(db.String(20))
     points = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    total_debt = db.Column(db.Float, default=0.0)
+    total_debt = db.Column(db.Numeric(12, 2), default=0) # copy of the newest DebtRecord.balance (debt_ledger)
+
+    # customer listing: ordered by (name, id) or by debt/points, prefix search on name/phone/email
+    # (prefix searches compare in byte order, see pagination.prefix_filter)
+    __table_args__ = (
+        db.Index('ix_customer_name_id', 'name', 'id'),
+        db.Index('ix_customer_lower_name_c', byte_order(db.func.lower(name))),
+        db.Index('ix_customer_phone_c', byte_order(phone)),
+        db.Index('ix_customer_lower_email_c', byte_order(db.func.lower(email))),
+        db.Index('ix_customer_debt_id', db.func.coalesce(total_debt, 0.0), 'id'),
+        db.Index('ix_customer_points_id', db.func.coalesce(points, 0), 'id'),
+    )
 
     def to_dict(self):
         return {
@@ -33,24 +47,34 @@ class Customer(db.Model):
             'email': self.email,
             'phone': self.phone,
             'points': self.points,
-            'total_debt': self.total_debt
+            'total_debt': float(self.total_debt or 0)
         }
 
 class DebtRecord(db.Model):
+    # Append-only debt ledger, written through debt_ledger.post_entries
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column( db.Integer,db.ForeignKey('customer.id', ondelete='CASCADE'), nullable=False)
-    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=True)
-    amount = db.Column(db.Float, nullable=False) # Change in debt (positive = added debt, negative = paid)
-    type = db.Column(db.String(20), nullable=False) # 'credit' (add debt), 'payment' (pay debt)
+    # detached (set to NULL) when the transaction is deleted; a reversal entry is posted instead
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id', ondelete='SET NULL'), nullable=True)
+    amount = db.Column(db.Numeric(12, 2), nullable=False) # Change in debt (positive = added debt, negative = paid)
+    balance = db.Column(db.Numeric(12, 2)) # Customer's debt after this entry (running balance in id order)
+    type = db.Column(db.String(20), nullable=False) # 'debt', 'payment', 'adjustment', 'reversal'
     description = db.Column(db.String(255))
     date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # the ledger is read per customer newest first (the newest row holds the balance);
+    # deletes look records up by transaction
+    __table_args__ = (
+        db.Index('ix_debt_record_customer_id_id', 'customer_id', 'id'),
+        db.Index('ix_debt_record_transaction_id', 'transaction_id'),
+    )
 
     def to_dict(self):
         return {
             'id': self.id,
             'customer_id': self.customer_id,
-            'amount': self.amount,
+            'amount': float(self.amount),
+            'balance': float(self.balance) if self.balance is not None else None,
             'type': self.type,
             'description': self.description,
             'date': self.date.isoformat()
@@ -78,6 +102,21 @@ class Product(db.Model):
     # relationship to transaction items so deleting product cascades to items at DB level
     transaction_items = db.relationship('TransactionItem', backref='product', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
 
+    # catalogue listing: ordered by (name, id), prefix search on lower(name)/lower(sku)
+    # in byte order (see pagination.prefix_filter)
+    __table_args__ = (
+        db.Index('ix_product_name_id', 'name', 'id'),
+        db.Index('ix_product_category_id_name', 'category_id', 'name'),
+        db.Index('ix_product_lower_name_c', byte_order(db.func.lower(name))),
+        db.Index('ix_product_lower_sku_c', byte_order(db.func.lower(sku))),
+        # /api/products/low-stock: only products at or below their threshold, most urgent first
+        db.Index(
+            'ix_product_low_stock', 'stock_quantity', 'id',
+            postgresql_where=db.text('stock_quantity <= low_stock_threshold'),
+            sqlite_where=db.text('stock_quantity <= low_stock_threshold')
+        ),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -97,9 +136,18 @@ class Transaction(db.Model):
     paid_amount = db.Column(db.Float, default=0.0)
     payment_method = db.Column(db.String(50), default='cash') # cash, debt
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=True)
+    # id generated by the till for sales ingested through /api/sales/batch (deduplicates replays)
+    client_id = db.Column(db.String(64), nullable=True)
     # ensure deletion of a Transaction cascades to its items
     items = db.relationship('TransactionItem', backref='transaction', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
 
+    # keyset pagination of the sales list walks (date, id)
+    __table_args__ = (
+        db.Index('ix_transaction_date_id', 'date', 'id'),
+        db.Index('ix_transaction_customer_id_date', 'customer_id', 'date', 'id'),
+        db.Index('ux_transaction_client_id', 'client_id', unique=True),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -120,6 +168,17 @@ class TransactionItem(db.Model):
     # relationship to Product is available via backref from Product.transaction_items
     quantity = db.Column(db.Integer, nullable=False)
     price_at_sale = db.Column(db.Float, nullable=False)
+    # units taken back through POST /api/sales/<id>/returns (quantity stays as sold)
+    returned_quantity = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # items are eager-loaded by transaction_id; the sales product filter probes (product_id, transaction_id).
+    # The transaction_id index also carries the columns the analytics timeseries sums, so its
+    # per-product breakdown never reads the table itself
+    __table_args__ = (
+        db.Index('ix_transaction_item_transaction_id_covering', 'transaction_id', 'product_id', 'quantity',
+                 'returned_quantity', 'price_at_sale'),
+        db.Index('ix_transaction_item_product_id_transaction_id', 'product_id', 'transaction_id'),
+    )
     
 
     def to_dict(self):
@@ -127,7 +186,58 @@ class TransactionItem(db.Model):
             'product_id': self.product_id,
             'product_name': self.product.name if self.product else 'Unknown',
             'quantity': self.quantity,
-            'price_at_sale': self.price_at_sale
+            'price_at_sale': self.price_at_sale,
+            'returned_quantity': self.returned_quantity or 0
+        }
+
+class SaleReturn(db.Model):
+    # A return of some items of a sale, written by sales_service.return_items.
+    # The transaction is kept; its totals are reduced by refund_amount
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id', ondelete='CASCADE'), nullable=False)
+    date = db.Column(db.DateTime, default=datetime.utcnow)
+    refund_amount = db.Column(db.Float, nullable=False) # value of the returned units at their sale price
+    debt_credit = db.Column(db.Float, nullable=False, default=0.0) # part of it taken off the customer's debt
+    cash_refund = db.Column(db.Float, nullable=False, default=0.0) # part of it paid back
+    note = db.Column(db.String(255))
+    items = db.relationship('SaleReturnItem', backref='sale_return', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+
+    __table_args__ = (
+        db.Index('ix_sale_return_transaction_id', 'transaction_id', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'transaction_id': self.transaction_id,
+            'date': self.date.isoformat(),
+            'refund_amount': self.refund_amount,
+            'debt_credit': self.debt_credit,
+            'cash_refund': self.cash_refund,
+            'note': self.note,
+            'items': [item.to_dict() for item in self.items]
+        }
+
+class SaleReturnItem(db.Model):
+    # One returned line: units of a TransactionItem
+    id = db.Column(db.Integer, primary_key=True)
+    return_id = db.Column(db.Integer, db.ForeignKey('sale_return.id', ondelete='CASCADE'), nullable=False)
+    transaction_item_id = db.Column(db.Integer, db.ForeignKey('transaction_item.id', ondelete='CASCADE'), nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_sale_return_item_return_id', 'return_id'),
+        db.Index('ix_sale_return_item_transaction_item_id', 'transaction_item_id'),
+    )
+
+    def to_dict(self):
+        return {
+            'transaction_item_id': self.transaction_item_id,
+            'product_id': self.product_id,
+            'quantity': self.quantity,
+            'amount': self.amount
         }
 
 class StoreConfig(db.Model):
@@ -153,6 +263,18 @@ class StockHistory(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     note = db.Column(db.String(255))
 
+    # per-product history newest first, the restock feed (positive changes only)
+    # and date-ranged ledger exports
+    __table_args__ = (
+        db.Index('ix_stock_history_product_id_timestamp', 'product_id', 'timestamp', 'id'),
+        db.Index('ix_stock_history_timestamp_id', 'timestamp', 'id'),
+        db.Index(
+            'ix_stock_history_restocks', 'timestamp', 'id',
+            postgresql_where=db.text('change_amount > 0'),
+            sqlite_where=db.text('change_amount > 0')
+        ),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -163,3 +285,114 @@ class StockHistory(db.Model):
             'timestamp': self.timestamp.isoformat(),
             'note': self.note
         }
+
+class DailySalesRollup(db.Model):
+    # Pre-aggregated sales per day and payment method, kept in step with
+    # Transaction by rollups.record_sales (see rollup_daily_sales.py to rebuild)
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    payment_method = db.Column(db.String(50), nullable=False, default='cash')
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0, server_default='0') # items sold, net of returns
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'payment_method', name='uq_daily_sales_rollup_day_payment_method'),
+    )
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'payment_method': self.payment_method,
+            'total_amount': self.total_amount,
+            'transaction_count': self.transaction_count,
+            'units': self.units
+        }
+
+class StockAlert(db.Model):
+    # Low-stock threshold crossings, appended by stock_alerts in the same
+    # database transaction as the stock change; seq (not id) orders the event feed
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False) # 'low' (fell to/below threshold), 'recovered' (back above)
+    stock_quantity = db.Column(db.Integer, nullable=False)
+    low_stock_threshold = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Feed position in commit order, assigned by stock_alerts.sequence_alerts once the
+    # alert is visible (ids follow insert order, which on PostgreSQL is not commit order)
+    seq = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index('ux_stock_alert_seq', 'seq', unique=True),
+        db.Index(
+            'ix_stock_alert_unsequenced', 'id',
+            postgresql_where=db.text('seq IS NULL'),
+            sqlite_where=db.text('seq IS NULL')
+        ),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'seq': self.seq,
+            'product_id': self.product_id,
+            'kind': self.kind,
+            'stock_quantity': self.stock_quantity,
+            'low_stock_threshold': self.low_stock_threshold,
+            'created_at': self.created_at.isoformat()
+        }
+
+class IdempotencyKey(db.Model):
+    # Stored responses for requests sent with an Idempotency-Key header (see idempotency.py).
+    # The unique key serialises concurrent duplicates; expired rows are removed by
+    # purge_idempotency_keys.py
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), nullable=False, unique=True)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_idempotency_key_expires_at', 'expires_at'),
+    )
+
+class Job(db.Model):
+    # Background jobs run by jobs.py. The table is the queue and the status
+    # board, so no broker is needed; progress/total are in job-specific units
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued') # queued, running, done, failed, cancelled
+    params = db.Column(db.JSON)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime) # last progress report of a running job
+
+    # job list filtered by status newest first; queued jobs are picked up oldest first
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'params': self.params,
+            'progress': self.progress,
+            'total': self.total,
+            'result': self.result,
+            'error': self.error,
+            'cancel_requested': self.cancel_requested,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,152 @@
+"""Helpers shared by the list endpoints: limits, keyset cursors and date filters.
+
+List endpoints keep returning a plain JSON list. When more rows are
+available, the opaque cursor for the next page is sent in the
+``X-Next-Cursor`` response header; pass it back as ``?cursor=...``.
+"""
+import base64
+import json
+from datetime import date, datetime, timedelta
+
+from flask import request
+from sqlalchemy import and_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def get_limit(default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    """Read ``?limit=`` from the request, clamped to [1, maximum]."""
+    raw = request.args.get('limit')
+    if raw is None or raw == '':
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, maximum))
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page into an opaque cursor."""
+    payload = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, types):
+    """Decode a cursor produced by encode_cursor.
+
+    ``types`` lists the expected type of each value (datetime, int, str);
+    raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return [datetime.fromisoformat(v) if t is datetime else t(v) for v, t in zip(values, types)]
+    except (ValueError, TypeError, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def get_cursor(types):
+    """Decode ``?cursor=`` from the request, or return None if absent."""
+    raw = request.args.get('cursor')
+    if not raw:
+        return None
+    return decode_cursor(raw, types)
+
+
+def parse_datetime_arg(name, end_of_day=False):
+    """Parse an ISO date/datetime query parameter.
+
+    A bare date (YYYY-MM-DD) used as an upper bound is treated as the end of
+    that day, so ``until=2024-01-31`` includes the whole of 31 January. The
+    returned value is meant for ``<`` comparisons when ``end_of_day`` is set.
+    """
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    try:
+        value = datetime.fromisoformat(raw)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO date or datetime')
+    if end_of_day and len(raw) == 10:
+        value += timedelta(days=1)
+    return value
+
+
+def parse_date_arg(name):
+    """Parse an ISO date (YYYY-MM-DD) query parameter into a date."""
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    try:
+        return date.fromisoformat(raw[:10])
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO date (YYYY-MM-DD)')
+
+
+class ByteOrder(ColumnElement):
+    """``expr`` compared in code point order: ``expr COLLATE "C"`` on
+    PostgreSQL, unchanged on SQLite (whose default BINARY collation already
+    is). Use it both in the query and in the index definition, so the
+    planner can match them."""
+    inherit_cache = True
+    _traverse_internals = [('expr', InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, expr):
+        self.expr = expr
+        self.type = expr.type
+
+
+@compiles(ByteOrder)
+def _compile_byte_order(element, compiler, **kw):
+    return compiler.process(element.expr, **kw)
+
+
+@compiles(ByteOrder, 'postgresql')
+def _compile_byte_order_postgresql(element, compiler, **kw):
+    return f'{compiler.process(element.expr, **kw)} COLLATE "C"'
+
+
+def byte_order(expr):
+    return ByteOrder(expr)
+
+
+def prefix_filter(column, prefix):
+    """Prefix match written as a range so a plain (expression) index is used.
+
+    ``column >= 'abc' AND column < 'abd'`` matches the same rows as
+    ``LIKE 'abc%'`` only in code point order, so the comparison is made
+    under byte_order(): under a linguistic collation (en_US, ICU) spaces
+    and punctuation sort differently and rows would be missed or wrongly
+    matched. The column's index must be declared on byte_order(column).
+    Unlike LIKE, this needs no wildcard escaping.
+    """
+    column = byte_order(column)
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
+
+
+def split_page(rows, limit, key):
+    """Trim a ``limit + 1`` fetch down to one page and build the next cursor.
+
+    ``key`` maps the last row of the page to its sort-key values. Returns
+    (page, next_cursor) where next_cursor is None on the last page.
+    """
+    if len(rows) > limit:
+        page = rows[:limit]
+        return page, encode_cursor(key(page[-1]))
+    return rows, None
+
+
+def with_next_cursor(response, next_cursor):
+    """Attach the next-page cursor header to a response, if there is one."""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
@@ -0,0 +1,278 @@
+"""Streaming product import shared by POST /api/products/import and import_products.py.
+
+Rows are read one at a time from a CSV or NDJSON stream, validated, and
+inserted in batches: one multi-row INSERT for the products (using
+RETURNING where the backend supports it, executemany + one SELECT
+otherwise) and one executemany INSERT for their initial StockHistory rows.
+Bad rows are reported individually and never abort the rest of the import.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from cache import invalidate
+from models import db, Category, Product, StockHistory
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ('csv', 'ndjson')
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_number, sku, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'sku': sku, 'error': message})
+
+    def to_dict(self):
+        return {
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+def detect_format(content_type):
+    """Map a Content-Type header to an import format (None if unknown)."""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        return 'ndjson'
+    return None
+
+
+def iter_records(stream, fmt):
+    """Yield (row_number, record_or_error) from a binary stream.
+
+    Parse errors are yielded as ValueError instances so the caller can report
+    them per row; the stream is never read into memory as a whole.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            # Header is row 1, so data rows start at 2
+            yield reader.line_num, record
+    else:
+        for row_number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, ValueError(f'Invalid JSON: {e.msg}')
+                continue
+            if not isinstance(record, dict):
+                yield row_number, ValueError('Each line must be a JSON object')
+                continue
+            yield row_number, record
+
+
+def _text(record, *keys):
+    """The first non-empty of ``keys`` as a stripped string ('' if none).
+
+    Numbers are accepted and converted (NDJSON may carry a numeric SKU);
+    objects, lists and booleans are rejected with ValueError.
+    """
+    for key in keys:
+        value = record.get(key)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ValueError(f'{key} must be a string')
+        value = str(value).strip()
+        if value:
+            return value
+    return ''
+
+
+class CategoryResolver:
+    """Resolve category ids or names through an in-memory map loaded once."""
+
+    def __init__(self, create_missing=False):
+        self.create_missing = create_missing
+        self.by_name = {name.lower(): cid for cid, name in db.session.query(Category.id, Category.name)}
+        self.ids = set(self.by_name.values())
+
+    def resolve(self, record):
+        raw_id = record.get('category_id')
+        if raw_id not in (None, ''):
+            try:
+                category_id = int(raw_id)
+            except (TypeError, ValueError):
+                raise ValueError('category_id must be an integer')
+            if category_id not in self.ids:
+                raise ValueError(f'Category {category_id} not found')
+            return category_id
+
+        name = _text(record, 'category', 'category_name')
+        if not name:
+            raise ValueError('category_id or category is required')
+        category_id = self.by_name.get(name.lower())
+        if category_id is None:
+            if not self.create_missing:
+                raise ValueError(f'Category "{name}" not found')
+            category = Category(name=name)
+            db.session.add(category)
+            invalidate('categories')
+            # Commit right away so a later failed product batch cannot roll it back
+            db.session.commit()
+            category_id = category.id
+            self.by_name[name.lower()] = category_id
+            self.ids.add(category_id)
+        return category_id
+
+
+def validate_record(record, categories):
+    """Turn a raw CSV/NDJSON record into a Product column mapping."""
+    name = _text(record, 'name')
+    sku = _text(record, 'sku')
+    if not name:
+        raise ValueError('name is required')
+    if not sku:
+        raise ValueError('sku is required')
+    try:
+        price = float(record['price'])
+        stock_quantity = int(record.get('stock_quantity') or 0)
+        low_stock_threshold = int(record.get('low_stock_threshold') or 10)
+    except KeyError:
+        raise ValueError('price is required')
+    except (TypeError, ValueError):
+        raise ValueError('price, stock_quantity and low_stock_threshold must be numbers')
+    if price < 0 or stock_quantity < 0:
+        raise ValueError('price and stock_quantity must not be negative')
+    return {
+        'name': name,
+        'sku': sku,
+        'price': price,
+        'stock_quantity': stock_quantity,
+        'low_stock_threshold': low_stock_threshold,
+        'category_id': categories.resolve(record)
+    }
+
+
+def insert_products(rows, note='Bulk Import'):
+    """Insert product mappings plus their initial StockHistory rows.
+
+    Uses one multi-row INSERT ... RETURNING when the dialect supports it,
+    otherwise executemany followed by a single SELECT to map SKUs to ids.
+    Returns the new product ids in input order. Does not commit.
+    """
+    if not rows:
+        return []
+
+    table = Product.__table__
+    if db.engine.dialect.insert_executemany_returning:
+        result = db.session.execute(insert(table).returning(table.c.id, table.c.sku), rows)
+        id_by_sku = {sku: pid for pid, sku in result}
+    else:
+        db.session.execute(insert(table), rows)
+        skus = [row['sku'] for row in rows]
+        id_by_sku = dict(db.session.query(Product.sku, Product.id).filter(Product.sku.in_(skus)))
+
+    now = datetime.utcnow()
+    history = [
+        {
+            'product_id': id_by_sku[row['sku']],
+            'change_amount': row['stock_quantity'],
+            'change_type': 'initial',
+            'note': note,
+            'timestamp': now
+        }
+        for row in rows if row['stock_quantity'] > 0
+    ]
+    if history:
+        db.session.execute(insert(StockHistory.__table__), history)
+    invalidate('products')
+    return [id_by_sku[row['sku']] for row in rows]
+
+
+def _flush_batch(batch, result):
+    """Insert a validated batch and commit it.
+
+    SKUs already in the database are reported per row. If the batch insert
+    still fails (e.g. a concurrent import took a SKU), the batch is retried
+    row by row so only the offending rows are reported.
+    """
+    existing = {
+        sku for (sku,) in db.session.query(Product.sku).filter(Product.sku.in_([row['sku'] for _, row in batch]))
+    }
+    pending = []
+    for row_number, row in batch:
+        if row['sku'] in existing:
+            result.add_error(row_number, row['sku'], f'SKU {row["sku"]} already exists')
+        else:
+            pending.append((row_number, row))
+
+    try:
+        insert_products([row for _, row in pending])
+        db.session.commit()
+        result.inserted += len(pending)
+        return
+    except Exception:
+        db.session.rollback()
+
+    for row_number, row in pending:
+        try:
+            insert_products([row])
+            db.session.commit()
+            result.inserted += 1
+        except Exception as e:
+            db.session.rollback()
+            result.add_error(row_number, row['sku'], str(getattr(e, 'orig', e)))
+
+
+def import_products(stream, fmt, batch_size=DEFAULT_BATCH_SIZE, create_categories=False, on_batch=None):
+    """Import products from a CSV or NDJSON binary stream.
+
+    Commits after every batch, then calls ``on_batch(result)`` if given (job
+    progress). Returns an ImportResult with per-row errors.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'format must be one of: {", ".join(FORMATS)}')
+
+    result = ImportResult()
+    categories = CategoryResolver(create_missing=create_categories)
+    batch = []
+    seen_skus = set()
+
+    for row_number, record in iter_records(stream, fmt):
+        if isinstance(record, Exception):
+            result.add_error(row_number, None, str(record))
+            continue
+        try:
+            row = validate_record(record, categories)
+        except ValueError as e:
+            result.add_error(row_number, record.get('sku'), str(e))
+            continue
+        except Exception as e:
+            # Anything unexpected fails this row only; the batch is still in memory
+            db.session.rollback()
+            result.add_error(row_number, record.get('sku'), f'Invalid row: {e}')
+            continue
+        if row['sku'] in seen_skus:
+            result.add_error(row_number, row['sku'], f'Duplicate SKU {row["sku"]} in import')
+            continue
+        seen_skus.add(row['sku'])
+        batch.append((row_number, row))
+
+        if len(batch) >= batch_size:
+            _flush_batch(batch, result)
+            batch = []
+            if on_batch is not None:
+                on_batch(result)
+
+    if batch:
+        _flush_batch(batch, result)
+    return result
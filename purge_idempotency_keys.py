@@ -0,0 +1,28 @@
+"""
+Delete expired Idempotency-Key records (see idempotency.py).
+
+Keys expire IDEMPOTENCY_TTL_HOURS after first use (default 24). Expired keys
+are already ignored by the API, so this only reclaims space; schedule it,
+e.g. hourly from cron:
+    0 * * * *  cd /path/to/backend && venv/bin/python purge_idempotency_keys.py
+"""
+import argparse
+import sys
+
+from app import app
+from idempotency import purge_expired
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Delete expired idempotency keys.')
+    parser.add_argument('--batch-size', type=int, default=1000, help='rows deleted per commit')
+    args = parser.parse_args()
+
+    with app.app_context():
+        deleted = purge_expired(args.batch_size)
+    print(f'Purged {deleted} expired idempotency key(s).')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Verify or repair the customer debt ledger (see debt_ledger.py).
+
+Usage:
+    python reconcile_debt.py check     # exit 1 if any balance or total_debt is off
+    python reconcile_debt.py rebuild   # recompute balances from amounts, resync total_debt
+
+'check' makes one pass over debt_record (stored running balance against
+the running sum of amounts) and one over customer (total_debt against the
+newest balance). 'rebuild' is for repairs only: the ledger amounts are
+the source of truth and are never changed.
+"""
+import argparse
+import sys
+
+from app import app, db
+from debt_ledger import check_ledger, rebuild_balances
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify or rebuild the customer debt ledger.')
+    parser.add_argument('command', choices=['check', 'rebuild'])
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'rebuild':
+            try:
+                updated = rebuild_balances()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f'Rebuild failed: {e}')
+                return 1
+            print(f'Debt ledger rebuilt; {updated} balance(s) corrected.')
+            return 0
+
+        problems = check_ledger()
+        if not problems:
+            print('Debt ledger is consistent.')
+            return 0
+        print(f'{len(problems)} problem(s):')
+        for p in problems:
+            where = f"record {p['record_id']}" if p['record_id'] else 'total_debt'
+            print(f"  customer {p['customer_id']} {where}: stored {p['stored']}, expected {p['expected']}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Optional read-replica routing.
+
+Set DATABASE_REPLICA_URL to a streaming replica of the primary database. It
+becomes the 'replica' bind (SQLALCHEMY_BINDS), and views decorated with
+@replica_reads (analytics, exports, history and the list endpoints) send
+their SELECTs there. Everything else, and every write, uses the primary.
+
+Routing happens in RoutingSession.get_bind, per statement:
+  - a plain SELECT inside a @replica_reads view goes to the replica;
+  - once the request has written (flush or INSERT/UPDATE/DELETE), its later
+    reads stick to the primary so it reads its own writes;
+  - anything else (text(), explicit binds, dialect lookups) uses the primary.
+
+If the replica cannot be reached, the request is retried on the primary and
+the replica is skipped for REPLICA_RETRY_SECONDS before being tried again.
+Replicas lag behind the primary; only read-only views that tolerate data a
+moment old should use it. Without DATABASE_REPLICA_URL nothing changes.
+"""
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql import CompoundSelect, Select
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND = 'replica'
+
+_USE_REPLICA = 'use_replica'
+_WROTE = 'wrote_to_primary'
+
+_retry_seconds = 30
+_down_until = 0.0
+
+
+def replica_available():
+    return time.monotonic() >= _down_until
+
+
+def _mark_down():
+    global _down_until
+    _down_until = time.monotonic() + _retry_seconds
+
+
+class RoutingSession(Session):
+    """db.session class: sends reads of @replica_reads views to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get(_USE_REPLICA):
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.info[_WROTE] = True
+            elif isinstance(clause, (Select, CompoundSelect)) and not self.info.get(_WROTE) \
+                    and replica_available():
+                engine = self._db.engines.get(REPLICA_BIND)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_reads(view):
+    """Route the view's reads to the replica (GET/HEAD only), falling back to
+    the primary if the replica is unavailable."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        db = current_app.extensions['sqlalchemy']
+        if request.method not in ('GET', 'HEAD') or REPLICA_BIND not in db.engines or not replica_available():
+            return view(*args, **kwargs)
+
+        db.session.info[_USE_REPLICA] = True
+        try:
+            return view(*args, **kwargs)
+        except DBAPIError:
+            if not g.pop('_replica_failed', False):
+                raise
+            db.session.rollback()
+            db.session.info[_USE_REPLICA] = False
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def init_app(app):
+    """Install the replica failure detector; call after db.init_app(app)."""
+    global _retry_seconds
+    app.config.setdefault('REPLICA_RETRY_SECONDS', 30)
+    _retry_seconds = app.config['REPLICA_RETRY_SECONDS']
+
+    with app.app_context():
+        engine = app.extensions['sqlalchemy'].engines.get(REPLICA_BIND)
+    if engine is not None and not event.contains(engine, 'handle_error', _on_replica_error):
+        event.listen(engine, 'handle_error', _on_replica_error)
+
+
+def _on_replica_error(context):
+    # Connection failures and dropped connections take the replica out of
+    # rotation; ordinary statement errors do not
+    if context.is_disconnect or context.connection is None:
+        _mark_down()
+        if has_request_context():
+            g._replica_failed = True
@@ -0,0 +1,54 @@
+"""
+Maintain the daily_sales_rollup table behind /api/analytics/daily-sales.
+
+Usage:
+    python rollup_daily_sales.py rebuild                      # whole history
+    python rollup_daily_sales.py rebuild --start 2024-01-01   # catch up from a day
+    python rollup_daily_sales.py check [--start ...] [--end ...]
+
+'rebuild' creates the table if missing and recomputes the selected days
+from the raw transactions. 'check' compares the rollup with the raw
+transactions and exits non-zero on any mismatch.
+"""
+import argparse
+import sys
+from datetime import date
+
+from app import app, db
+from rollups import check_daily_sales, rebuild_daily_sales
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild or verify the daily sales rollup.')
+    parser.add_argument('command', choices=['rebuild', 'check'])
+    parser.add_argument('--start', type=date.fromisoformat, help='first day (YYYY-MM-DD)')
+    parser.add_argument('--end', type=date.fromisoformat, help='last day (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'rebuild':
+            db.create_all()
+            try:
+                rebuild_daily_sales(args.start, args.end)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f'Rebuild failed: {e}')
+                return 1
+            print('Daily sales rollup rebuilt.')
+            return 0
+
+        mismatches = check_daily_sales(args.start, args.end)
+        if not mismatches:
+            print('Daily sales rollup is consistent with transactions.')
+            return 0
+        print(f'{len(mismatches)} mismatching day(s):')
+        for m in mismatches:
+            print(f"  {m['day']} {m['payment_method']}: rollup {m['rollup_total']} / {m['rollup_count']} tx / "
+                  f"{m['rollup_units']} units, expected {m['expected_total']} / {m['expected_count']} tx / "
+                  f"{m['expected_units']} units")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Incremental maintenance of the daily_sales_rollup table.
+
+Every code path that creates or removes a Transaction calls record_sales in
+the same database transaction, so the rollup commits (or rolls back) with
+the sale itself. rebuild_daily_sales and check_daily_sales recompute the
+rollup from the raw transactions for catch-up and verification.
+"""
+from sqlalchemy import and_, delete, func, insert, select, true, update
+
+from models import db, DailySalesRollup, Transaction, TransactionItem
+
+# Legacy rows may have a NULL payment_method; the column default is 'cash'
+DEFAULT_PAYMENT_METHOD = 'cash'
+
+
+def _day_expr():
+    return func.date(Transaction.date)
+
+
+def _method_expr():
+    return func.coalesce(Transaction.payment_method, DEFAULT_PAYMENT_METHOD)
+
+
+def _units_expr():
+    """Items of the current Transaction, net of returns."""
+    return select(
+        func.coalesce(func.sum(TransactionItem.quantity - TransactionItem.returned_quantity), 0)
+    ).where(TransactionItem.transaction_id == Transaction.id).scalar_subquery()
+
+
+def _dialect_insert(session=None):
+    """Return the dialect's INSERT supporting ON CONFLICT, or None."""
+    name = (session or db.session).get_bind().dialect.name
+    if name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def record_sales(entries, session=None):
+    """Apply sale deltas to the rollup.
+
+    ``entries`` is an iterable of (datetime, payment_method, amount_delta,
+    count_delta, units_delta); use negative deltas when transactions are
+    removed. Deltas are summed per (day, payment_method) and applied with
+    one upsert.
+    Runs on ``session`` (default db.session); does not commit.
+    """
+    deltas = {}
+    for when, payment_method, amount, count, units in entries:
+        if when is None:
+            continue
+        key = (when.date(), payment_method or DEFAULT_PAYMENT_METHOD)
+        total, n, u = deltas.get(key, (0.0, 0, 0))
+        deltas[key] = (total + (amount or 0), n + count, u + units)
+    if not deltas:
+        return
+
+    rows = [
+        {'day': day, 'payment_method': method, 'total_amount': amount, 'transaction_count': count, 'units': units}
+        for (day, method), (amount, count, units) in deltas.items()
+    ]
+    session = session or db.session
+    table = DailySalesRollup.__table__
+    dialect_insert = _dialect_insert(session)
+    if dialect_insert is not None:
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'payment_method'],
+            set_={
+                'total_amount': table.c.total_amount + stmt.excluded.total_amount,
+                'transaction_count': table.c.transaction_count + stmt.excluded.transaction_count,
+                'units': table.c.units + stmt.excluded.units
+            }
+        )
+        session.execute(stmt, rows)
+        return
+
+    # Portable fallback: UPDATE, then INSERT the keys that had no row yet
+    for row in rows:
+        result = session.execute(
+            update(table)
+            .where(table.c.day == row['day'], table.c.payment_method == row['payment_method'])
+            .values(
+                total_amount=table.c.total_amount + row['total_amount'],
+                transaction_count=table.c.transaction_count + row['transaction_count'],
+                units=table.c.units + row['units']
+            )
+        )
+        if result.rowcount == 0:
+            session.execute(insert(table), [row])
+
+
+def _range_filter(column, start=None, end=None):
+    clauses = []
+    if start:
+        clauses.append(column >= start)
+    if end:
+        clauses.append(column <= end)
+    return and_(true(), *clauses)
+
+
+def rebuild_daily_sales(start=None, end=None):
+    """Recompute rollup rows for days in [start, end] (dates, inclusive).
+
+    With no bounds the whole table is rebuilt. Does not commit.
+    """
+    table = DailySalesRollup.__table__
+    db.session.execute(delete(table).where(_range_filter(table.c.day, start, end)))
+
+    day = _day_expr()
+    source = select(
+        day, _method_expr(), func.sum(Transaction.total_amount), func.count(Transaction.id), func.sum(_units_expr())
+    ).where(_range_filter(day, start and start.isoformat(), end and end.isoformat())).group_by(day, _method_expr())
+    db.session.execute(
+        insert(table).from_select(['day', 'payment_method', 'total_amount', 'transaction_count', 'units'], source)
+    )
+
+
+def check_daily_sales(start=None, end=None, tolerance=0.005):
+    """Compare the rollup with the raw transactions.
+
+    Returns a list of mismatches as dicts (empty when consistent).
+    """
+    day = _day_expr()
+    raw = {
+        (str(d), m): (total or 0.0, count, units or 0)
+        for d, m, total, count, units in db.session.query(
+            day, _method_expr(), func.sum(Transaction.total_amount), func.count(Transaction.id),
+            func.sum(_units_expr())
+        ).filter(_range_filter(day, start and start.isoformat(), end and end.isoformat())).group_by(day, _method_expr())
+    }
+    rolled = {
+        (r.day.isoformat(), r.payment_method): (r.total_amount, r.transaction_count, r.units)
+        for r in DailySalesRollup.query.filter(_range_filter(DailySalesRollup.day, start, end))
+        if r.transaction_count or r.total_amount
+    }
+
+    mismatches = []
+    for key in sorted(set(raw) | set(rolled)):
+        expected = raw.get(key, (0.0, 0, 0))
+        actual = rolled.get(key, (0.0, 0, 0))
+        if expected[1:] != actual[1:] or abs(expected[0] - actual[0]) > tolerance:
+            mismatches.append({
+                'day': key[0],
+                'payment_method': key[1],
+                'expected_total': expected[0],
+                'rollup_total': actual[0],
+                'expected_count': expected[1],
+                'rollup_count': actual[1],
+                'expected_units': expected[2],
+                'rollup_units': actual[2]
+            })
+    return mismatches
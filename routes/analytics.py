@@ -1,12 +1,20 @@
-from flask import Blueprint, jsonify
-from models import Transaction, TransactionItem, Product, Category
-import pandas as pd
-from sqlalchemy import func
+from flask import Blueprint, request, jsonify
+from models import Transaction, TransactionItem, Product, Category, Customer, DailySalesRollup
+from pagination import parse_date_arg, parse_datetime_arg
+from cache import cached_response, invalidate
+from jobs import job_kind
+from rollups import DEFAULT_PAYMENT_METHOD, rebuild_daily_sales
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func, null, select
 from models import db
+from replicas import replica_reads
+from serializers import json_response
 
 analytics_bp = Blueprint('analytics', __name__)
 
 @analytics_bp.route('/summary', methods=['GET'])
+@cached_response('sales', 'products')
+@replica_reads
 def get_summary():
     # Total Revenue
     total_revenue = db.session.query(func.sum(Transaction.total_amount)).scalar() or 0
@@ -24,31 +32,269 @@ def get_summary():
     })
 
 @analytics_bp.route('/daily-sales', methods=['GET'])
+@cached_response('sales')
+@replica_reads
 def get_daily_sales():
-    # Use pandas for easier time-series grouping if dataset gets large, 
-    # but for now running SQL query is efficient enough or we can load into DF
-    
-    query = db.session.query(Transaction.date, Transaction.total_amount).statement
-    df = pd.read_sql(query, db.session.bind)
-    
-    if df.empty:
-        return jsonify([])
+    """Daily sales totals read from the pre-aggregated daily_sales_rollup table.
 
-    df['date'] = pd.to_datetime(df['date']).dt.date
-    daily_sales = df.groupby('date')['total_amount'].sum().reset_index()
-    
-    return jsonify(daily_sales.to_dict(orient='records'))
+    Optional query parameters: start_date, end_date (inclusive ISO dates)
+    and payment_method.
+    """
+    try:
+        start_date = parse_date_arg('start_date')
+        end_date = parse_date_arg('end_date')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    payment_method = request.args.get('payment_method')
+
+    query = db.session.query(
+        DailySalesRollup.day,
+        func.sum(DailySalesRollup.total_amount).label('total_amount')
+    )
+    if start_date:
+        query = query.filter(DailySalesRollup.day >= start_date)
+    if end_date:
+        query = query.filter(DailySalesRollup.day <= end_date)
+    if payment_method:
+        query = query.filter(DailySalesRollup.payment_method == payment_method)
+
+    rows = query.group_by(DailySalesRollup.day) \
+        .having(func.sum(DailySalesRollup.transaction_count) > 0) \
+        .order_by(DailySalesRollup.day).all()
+    return jsonify([{'date': day, 'total_amount': total} for day, total in rows])
 
 @analytics_bp.route('/top-products', methods=['GET'])
+@cached_response('sales', 'products')
+@replica_reads
 def get_top_products():
-    query = db.session.query(
-        Product.name, 
-        func.sum(TransactionItem.quantity).label('total_sold')
-    ).join(TransactionItem).group_by(Product.id).order_by(func.sum(TransactionItem.quantity).desc()).limit(5).statement
-    
-    df = pd.read_sql(query, db.session.bind)
-    
-    if df.empty:
-        return jsonify([])
-        
-    return jsonify(df.to_dict(orient='records'))
+    total_sold = func.sum(TransactionItem.quantity - TransactionItem.returned_quantity).label('total_sold')
+    rows = db.session.query(Product.name, total_sold) \
+        .join(TransactionItem) \
+        .group_by(Product.id, Product.name) \
+        .order_by(total_sold.desc()) \
+        .limit(5).all()
+
+    return jsonify([{'name': name, 'total_sold': int(sold)} for name, sold in rows])
+
+GRANULARITIES = {
+    # name: (approximate bucket length, SQLite strftime format for the bucket start)
+    'hour': (timedelta(hours=1), '%Y-%m-%dT%H:00:00'),
+    'day': (timedelta(days=1), '%Y-%m-%dT00:00:00'),
+    'week': (timedelta(weeks=1), None),
+    'month': (timedelta(days=28), '%Y-%m-01T00:00:00'),
+}
+MAX_BUCKETS = 10000
+
+
+def _bucket_expr(granularity):
+    """Start of the time bucket containing Transaction.date, per dialect."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.date_trunc(granularity, Transaction.date)
+    if granularity == 'week':
+        # ISO weeks start on Monday, matching PostgreSQL's date_trunc('week')
+        return func.strftime('%Y-%m-%dT00:00:00', Transaction.date, 'weekday 0', '-6 days')
+    return func.strftime(GRANULARITIES[granularity][1], Transaction.date)
+
+
+def _dimension(group_by):
+    """(key column, joins, label model) for a breakdown dimension.
+
+    Labels are looked up by key after aggregating, so the grouped query
+    only touches the columns it sums.
+    """
+    if group_by == 'product':
+        return TransactionItem.product_id, [], Product
+    if group_by == 'category':
+        return Category.id, [Product, Category], Category
+    if group_by == 'customer':
+        return Transaction.customer_id, [], Customer
+    if group_by == 'payment_method':
+        return func.coalesce(Transaction.payment_method, DEFAULT_PAYMENT_METHOD), [], None
+    raise ValueError('group_by must be one of: category, product, customer, payment_method')
+
+
+def _day_bucket(day, granularity):
+    """Bucket start for a rollup day, formatted like _bucket_expr's values."""
+    if granularity == 'week':
+        day -= timedelta(days=day.weekday())
+    elif granularity == 'month':
+        day = day.replace(day=1)
+    return datetime.combine(day, time.min).isoformat()
+
+
+def _raw_totals(granularity, dimension, start, end):
+    """(bucket, key, revenue, units, transactions) summed from the items sold in
+    [start, end), ordered by bucket."""
+    bucket = _bucket_expr(granularity).label('bucket')
+    # Net of returns, like Transaction.total_amount
+    units = TransactionItem.quantity - TransactionItem.returned_quantity
+    key = dimension[0].label('key') if dimension else null().label('key')
+    stmt = select(
+        bucket,
+        key,
+        func.sum(units * TransactionItem.price_at_sale),
+        func.sum(units),
+        # Same count as Transaction.id through the join, read off the item index
+        func.count(func.distinct(TransactionItem.transaction_id)),
+    ).select_from(Transaction) \
+        .join(TransactionItem, TransactionItem.transaction_id == Transaction.id) \
+        .where(Transaction.date >= start, Transaction.date < end)
+    if dimension:
+        for model in dimension[1]:
+            if model is Product:
+                stmt = stmt.join(Product, Product.id == TransactionItem.product_id)
+            elif model is Category:
+                stmt = stmt.join(Category, Category.id == Product.category_id)
+
+    group = [bucket, dimension[0]] if dimension else [bucket]
+    rows = db.session.execute(stmt.group_by(*group).order_by(bucket)).all()
+    if rows and not isinstance(rows[0][0], str):
+        # PostgreSQL's date_trunc returns timestamps; SQLite's strftime is already ISO text
+        rows = [(row[0].isoformat(), *row[1:]) for row in rows]
+    return rows
+
+
+def _rollup_totals(granularity, by_method, first_day, last_day):
+    """(bucket, key, revenue, units, transactions) per rollup day in [first_day, last_day)."""
+    columns = [
+        DailySalesRollup.day,
+        DailySalesRollup.payment_method if by_method else null(),
+        func.sum(DailySalesRollup.total_amount),
+        func.sum(DailySalesRollup.units),
+        func.sum(DailySalesRollup.transaction_count),
+    ]
+    group = [DailySalesRollup.day, DailySalesRollup.payment_method] if by_method else [DailySalesRollup.day]
+    rows = db.session.query(*columns) \
+        .filter(DailySalesRollup.day >= first_day, DailySalesRollup.day < last_day) \
+        .group_by(*group) \
+        .having(func.sum(DailySalesRollup.transaction_count) > 0)
+    return [(_day_bucket(day, granularity), *rest) for day, *rest in rows]
+
+
+@analytics_bp.route('/timeseries', methods=['GET'])
+@replica_reads
+def get_timeseries():
+    """Revenue, units and basket size per time bucket.
+
+    Query parameters:
+      - start_date, end_date: ISO date/datetime range (default: last 30 days)
+      - granularity: hour, day (default), week or month
+      - group_by: optional breakdown by category, product, customer or payment_method
+    Whole days of day/week/month series without a breakdown or by
+    payment_method are read from daily_sales_rollup; partial days at the ends
+    of the range, hourly series and the other breakdowns are summed from the
+    transaction items (a range scan on Transaction.date joined through the
+    covering transaction_item index).
+    """
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'granularity must be one of: {", ".join(GRANULARITIES)}'}), 400
+    group_by = request.args.get('group_by')
+    try:
+        end_date = parse_datetime_arg('end_date', end_of_day=True) or datetime.utcnow()
+        start_date = parse_datetime_arg('start_date') or end_date - timedelta(days=30)
+        dimension = _dimension(group_by) if group_by else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start_date >= end_date:
+        return jsonify({'error': 'start_date must be before end_date'}), 400
+    if (end_date - start_date) / GRANULARITIES[granularity][0] > MAX_BUCKETS:
+        return jsonify({'error': 'Date range too large for this granularity'}), 400
+
+    first_day = start_date.date() if start_date.time() == time.min else start_date.date() + timedelta(days=1)
+    last_day = end_date.date()
+    if granularity != 'hour' and group_by in (None, 'payment_method') and first_day < last_day:
+        rows = _rollup_totals(granularity, group_by == 'payment_method', first_day, last_day)
+        for range_start, range_end in ((start_date, datetime.combine(first_day, time.min)),
+                                       (datetime.combine(last_day, time.min), end_date)):
+            if range_start < range_end:
+                rows += _raw_totals(granularity, dimension, range_start, range_end)
+        # Merge the partial days at the ends into the rollup's buckets
+        totals = {}
+        for bucket, key, revenue, units, transactions in rows:
+            point = totals.setdefault((bucket, key), [0, 0, 0])
+            point[0] += revenue or 0
+            point[1] += units or 0
+            point[2] += transactions
+        rows = sorted(((bucket, key, *point) for (bucket, key), point in totals.items()), key=lambda row: row[0])
+    else:
+        rows = _raw_totals(granularity, dimension, start_date, end_date)
+
+    labels = {}
+    if dimension and dimension[2] is not None:
+        model = dimension[2]
+        keys = {row[1] for row in rows if row[1] is not None}
+        if keys:
+            labels = dict(db.session.execute(select(model.id, model.name).where(model.id.in_(keys))).all())
+
+    series = []
+    for bucket, key, revenue, units, transactions in rows:
+        revenue = revenue or 0
+        units = int(units or 0)
+        point = {
+            'bucket': bucket,
+            'revenue': revenue,
+            'units': units,
+            'transactions': transactions,
+            'avg_basket_value': revenue / transactions if transactions else 0,
+            'avg_basket_units': units / transactions if transactions else 0,
+        }
+        if dimension:
+            point['key'] = key
+            point['label'] = labels.get(key) if dimension[2] is not None else key
+        series.append(point)
+
+    return json_response({
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'granularity': granularity,
+        'group_by': group_by,
+        'series': series
+    })
+
+
+# Days recomputed per commit by the analytics.rebuild_daily_sales job
+REBUILD_WINDOW_DAYS = 31
+
+
+def _rebuild_params(data):
+    params = {}
+    for name in ('start', 'end'):
+        raw = data.get(name)
+        try:
+            params[name] = date.fromisoformat(str(raw)[:10]).isoformat() if raw else None
+        except ValueError:
+            raise ValueError(f'{name} must be an ISO date (YYYY-MM-DD)')
+    if params['start'] and params['end'] and params['start'] > params['end']:
+        raise ValueError('start must not be after end')
+    return params
+
+
+@job_kind('analytics.rebuild_daily_sales', validate=_rebuild_params)
+def rebuild_daily_sales_job(ctx, start=None, end=None):
+    """Recompute the daily sales rollup for [start, end] (default: all days
+    with transactions or rollup rows), one REBUILD_WINDOW_DAYS window per commit."""
+    first = date.fromisoformat(start) if start else None
+    last = date.fromisoformat(end) if end else None
+    if first is None or last is None:
+        tx_first, tx_last = db.session.query(func.min(Transaction.date), func.max(Transaction.date)).one()
+        rollup_first, rollup_last = db.session.query(func.min(DailySalesRollup.day),
+                                                     func.max(DailySalesRollup.day)).one()
+        days = [d.date() if isinstance(d, datetime) else d for d in (tx_first, tx_last, rollup_first, rollup_last)]
+        days = [d for d in days if d is not None]
+        if not days:
+            return {'days': 0}
+        first = first or min(days)
+        last = last or max(days)
+
+    total_days = (last - first).days + 1
+    ctx.progress(0, total_days)
+    window_start = first
+    while window_start <= last:
+        window_end = min(window_start + timedelta(days=REBUILD_WINDOW_DAYS - 1), last)
+        rebuild_daily_sales(window_start, window_end)
+        invalidate('sales')
+        db.session.commit()
+        ctx.progress((window_end - first).days + 1)
+        window_start = window_end + timedelta(days=1)
+    return {'days': total_days, 'start': first.isoformat(), 'end': last.isoformat()}
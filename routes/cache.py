@@ -0,0 +1,8 @@
+from flask import Blueprint, jsonify
+from cache import cache
+
+cache_bp = Blueprint('cache', __name__)
+
+@cache_bp.route('/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(cache.stats())
@@ -1,12 +1,84 @@
 from flask import Blueprint, request, jsonify
-from models import db, Customer, DebtRecord
+from models import db, Customer, DebtRecord, Transaction
+from sqlalchemy import func, literal_column, or_, tuple_
+from pagination import get_limit, get_cursor, prefix_filter, split_page, with_next_cursor
+from debt_ledger import ZERO, current_balance, lock_customers, post_entry, to_amount
+from serializers import CUSTOMER_COLUMNS, customer_dict, json_response
+from replicas import replica_reads
+import sales_service
+from sales_service import ServiceError
 
 customers_bp = Blueprint('customers', __name__)
 
+# sort name -> (sort key expressions, descending, cursor value types, row -> cursor values);
+# each sort has a matching index in models.py. The coalesce defaults are SQL literals, not bound
+# parameters, so the expressions match ix_customer_debt_id/ix_customer_points_id exactly.
+CUSTOMER_SORTS = {
+    'name': ((Customer.name, Customer.id), False, [str, int], lambda c: [c.name, c.id]),
+    'debt': ((func.coalesce(Customer.total_debt, literal_column('0.0')), Customer.id), True, [to_amount, int],
+             lambda c: [str(c.total_debt or ZERO), c.id]),
+    'points': ((func.coalesce(Customer.points, literal_column('0')), Customer.id), True, [int, int],
+               lambda c: [c.points or 0, c.id]),
+}
+
+
+def _customer_stats(customer_ids):
+    """Last visit, lifetime spend and transaction count for each customer, in one grouped query."""
+    rows = db.session.query(
+        Transaction.customer_id,
+        func.max(Transaction.date),
+        func.sum(Transaction.total_amount),
+        func.count(Transaction.id)
+    ).filter(Transaction.customer_id.in_(customer_ids)).group_by(Transaction.customer_id)
+    return {customer_id: (last_visit, spend, count) for customer_id, last_visit, spend, count in rows}
+
+
 @customers_bp.route('/', methods=['GET'])
+@replica_reads
 def get_customers():
-    customers = Customer.query.all()
-    return jsonify([c.to_dict() for c in customers])
+    """List customers one keyset page at a time.
+
+    Query parameters (all optional):
+      - limit, cursor: page size and the X-Next-Cursor value of the previous page
+      - q: case-insensitive prefix match on name or email, or a prefix of the phone number
+      - sort: name (default, A-Z), debt or points (highest first)
+      - stats: when true, add last_visit, lifetime_spend and transaction_count to each customer
+    """
+    sort = request.args.get('sort', 'name')
+    if sort not in CUSTOMER_SORTS:
+        return jsonify({'error': f"sort must be one of: {', '.join(CUSTOMER_SORTS)}"}), 400
+    keys, descending, cursor_types, cursor_key = CUSTOMER_SORTS[sort]
+    try:
+        limit = get_limit()
+        cursor = get_cursor(cursor_types)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    search = (request.args.get('q') or '').strip()
+    with_stats = request.args.get('stats', '').lower() in ('1', 'true', 'yes')
+
+    query = db.session.query(*CUSTOMER_COLUMNS)
+    if search:
+        query = query.filter(or_(
+            prefix_filter(func.lower(Customer.name), search.lower()),
+            prefix_filter(Customer.phone, search),
+            prefix_filter(func.lower(Customer.email), search.lower())
+        ))
+    if cursor:
+        after = tuple_(*keys) < tuple_(*cursor) if descending else tuple_(*keys) > tuple_(*cursor)
+        query = query.filter(after)
+    query = query.order_by(*[k.desc() for k in keys] if descending else keys)
+
+    rows = query.limit(limit + 1).all()
+    page, next_cursor = split_page(rows, limit, cursor_key)
+    customers = [customer_dict(c) for c in page]
+    if with_stats and customers:
+        stats = _customer_stats([c['id'] for c in customers])
+        for customer in customers:
+            last_visit, spend, count = stats.get(customer['id'], (None, 0.0, 0))
+            customer['last_visit'] = last_visit.isoformat() if last_visit else None
+            customer['lifetime_spend'] = spend or 0.0
+            customer['transaction_count'] = count
+    return with_next_cursor(json_response(customers), next_cursor)
 
 @customers_bp.route('/', methods=['POST'])
 def add_customer():
@@ -31,62 +103,64 @@ def delete_customer(id):
     db.session.commit()
     return jsonify({'message': 'Customer deleted'})
 
+@customers_bp.route('/<int:id>/balance', methods=['GET'])
+def get_balance(id):
+    """Current debt from the ledger: one indexed lookup of the newest record."""
+    Customer.query.get_or_404(id)
+    return jsonify({'customer_id': id, 'balance': float(current_balance(id))})
+
 @customers_bp.route('/<int:id>/debt_history', methods=['GET'])
+@replica_reads
 def get_debt_history(id):
-    records = DebtRecord.query.filter_by(customer_id=id).order_by(DebtRecord.date.desc()).all()
-    return jsonify([r.to_dict() for r in records])
+    """The customer's debt ledger, newest first, one keyset page at a time.
+
+    Each record carries the running balance after it, so a page needs no
+    re-summing. Query parameters: limit, cursor (X-Next-Cursor of the previous page).
+    """
+    try:
+        limit = get_limit()
+        cursor = get_cursor([int])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = DebtRecord.query.filter(DebtRecord.customer_id == id)
+    if cursor:
+        query = query.filter(DebtRecord.id < cursor[0])
+    records = query.order_by(DebtRecord.id.desc()).limit(limit + 1).all()
+    page, next_cursor = split_page(records, limit, lambda r: [r.id])
+    return with_next_cursor(jsonify([r.to_dict() for r in page]), next_cursor)
 
 @customers_bp.route('/<int:id>/pay_debt', methods=['POST'])
 def pay_debt(id):
-    customer = Customer.query.get_or_404(id)
     data = request.json
-    amount = float(data.get('amount', 0))
-    
-    if amount <= 0:
-        return jsonify({'error': 'Invalid amount'}), 400
-        
-    if amount > customer.total_debt:
-        return jsonify({'error': 'Payment exceeds total debt'}), 400
-
-    customer.total_debt -= amount
-    
-    record = DebtRecord(
-        customer_id=id,
-        amount=-amount, # Negative for payment
-        type='payment',
-        description=data.get('description', 'Debt Payment')
-    )
-    
-    db.session.add(record)
+    try:
+        new_debt = sales_service.pay_debt(db.session, id, data.get('amount', 0),
+                                          data.get('description', 'Debt Payment'))
+    except ServiceError as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status
     db.session.commit()
-    
-    return jsonify({'message': 'Payment successful', 'new_debt': customer.total_debt})
+
+    return jsonify({'message': 'Payment successful', 'new_debt': float(new_debt)})
 
 @customers_bp.route('/<int:id>/adjust_debt', methods=['POST'])
 def adjust_debt(id):
-    customer = Customer.query.get_or_404(id)
+    Customer.query.get_or_404(id)
     data = request.json
     try:
-        new_debt = float(data.get('new_debt', 0))
-    except (ValueError, TypeError):
+        new_debt = to_amount(data.get('new_debt', 0))
+    except ValueError:
         return jsonify({'error': 'Invalid debt amount'}), 400
-        
-    current_debt = customer.total_debt
+
+    lock_customers([id])
+    current_debt = current_balance(id)
     diff = new_debt - current_debt
-    
+
     if diff == 0:
-         return jsonify({'message': 'No change in debt', 'new_debt': customer.total_debt})
-
-    customer.total_debt = new_debt
-    
-    record = DebtRecord(
-        customer_id=id,
-        amount=diff,
-        type='adjustment',
-        description=data.get('description', 'Manual Debt Adjustment')
-    )
-    
-    db.session.add(record)
+        db.session.rollback()
+        return jsonify({'message': 'No change in debt', 'new_debt': float(current_debt)})
+
+    new_debt = post_entry(id, diff, 'adjustment', data.get('description', 'Manual Debt Adjustment'))
     db.session.commit()
-    
-    return jsonify({'message': 'Debt adjusted successfully', 'new_debt': customer.total_debt})
+
+    return jsonify({'message': 'Debt adjusted successfully', 'new_debt': float(new_debt)})
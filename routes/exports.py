@@ -0,0 +1,84 @@
+from flask import Blueprint, request, jsonify
+from models import db, Transaction, TransactionItem, Product, StockHistory
+from sqlalchemy import select
+from pagination import parse_datetime_arg
+from streaming import EXPORT_FORMATS, STREAM_CHUNK_SIZE, export_response
+from replicas import replica_reads
+
+exports_bp = Blueprint('exports', __name__)
+
+
+def _export(stmt, date_column, filename):
+    """Apply the shared export parameters to ``stmt`` and stream the result.
+
+    Query parameters:
+      - format: csv (default) or ndjson
+      - start_date, end_date: ISO date/datetime range on ``date_column``
+      - gzip: true to download the file gzip-compressed (application/gzip, name ending in .gz)
+    Rows are fetched through a server-side cursor in chunks of STREAM_CHUNK_SIZE.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(EXPORT_FORMATS)}'}), 400
+    try:
+        start_date = parse_datetime_arg('start_date')
+        end_date = parse_datetime_arg('end_date', end_of_day=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+    if start_date:
+        stmt = stmt.where(date_column >= start_date)
+    if end_date:
+        stmt = stmt.where(date_column < end_date)
+
+    result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=STREAM_CHUNK_SIZE))
+    return export_response(result, list(result.keys()), fmt, filename, compress)
+
+
+@exports_bp.route('/transactions', methods=['GET'])
+@replica_reads
+def export_transactions():
+    stmt = select(
+        Transaction.id,
+        Transaction.date,
+        Transaction.total_amount,
+        Transaction.paid_amount,
+        Transaction.payment_method,
+        Transaction.customer_id
+    ).order_by(Transaction.date, Transaction.id)
+    return _export(stmt, Transaction.date, 'transactions')
+
+
+@exports_bp.route('/transaction-items', methods=['GET'])
+@replica_reads
+def export_transaction_items():
+    stmt = select(
+        TransactionItem.id,
+        TransactionItem.transaction_id,
+        Transaction.date,
+        TransactionItem.product_id,
+        Product.name.label('product_name'),
+        TransactionItem.quantity,
+        TransactionItem.price_at_sale,
+        TransactionItem.returned_quantity
+    ).join(Transaction, TransactionItem.transaction_id == Transaction.id) \
+        .outerjoin(Product, TransactionItem.product_id == Product.id) \
+        .order_by(Transaction.date, Transaction.id)
+    return _export(stmt, Transaction.date, 'transaction_items')
+
+
+@exports_bp.route('/stock-ledger', methods=['GET'])
+@replica_reads
+def export_stock_ledger():
+    stmt = select(
+        StockHistory.id,
+        StockHistory.timestamp,
+        StockHistory.product_id,
+        Product.name.label('product_name'),
+        StockHistory.change_amount,
+        StockHistory.change_type,
+        StockHistory.note
+    ).outerjoin(Product, StockHistory.product_id == Product.id) \
+        .order_by(StockHistory.timestamp, StockHistory.id)
+    return _export(stmt, StockHistory.timestamp, 'stock_ledger')
@@ -1,15 +1,62 @@
-from flask import Blueprint, jsonify
-from models import StockHistory
+from flask import Blueprint, request, jsonify
+from models import db, StockHistory, Product
+from sqlalchemy import tuple_
+from datetime import datetime
+from pagination import get_limit, get_cursor, parse_datetime_arg, split_page, with_next_cursor
+from streaming import STREAM_CHUNK_SIZE, ndjson_response
+from serializers import STOCK_HISTORY_COLUMNS, json_response, stock_history_dict
+from replicas import replica_reads
 
 history_bp = Blueprint('history', __name__)
 
+
+def _history_listing(criterion):
+    """Filter, paginate and serialize StockHistory rows matching ``criterion``, newest first.
+
+    Query parameters (all optional):
+      - limit, cursor: page size and the X-Next-Cursor value of the previous page
+      - since, until: ISO date/datetime range on the timestamp
+      - change_type: one type or a comma-separated list (e.g. sale,restock)
+      - format=ndjson: stream every matching row as NDJSON instead of one page
+    Rows are selected as column tuples with the product name joined in.
+    """
+    try:
+        limit = get_limit()
+        cursor = get_cursor([datetime, int])
+        since = parse_datetime_arg('since')
+        until = parse_datetime_arg('until', end_of_day=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    change_types = [t.strip() for t in request.args.get('change_type', '').split(',') if t.strip()]
+
+    query = db.session.query(*STOCK_HISTORY_COLUMNS) \
+        .outerjoin(Product, Product.id == StockHistory.product_id) \
+        .filter(criterion)
+    if since:
+        query = query.filter(StockHistory.timestamp >= since)
+    if until:
+        query = query.filter(StockHistory.timestamp < until)
+    if change_types:
+        query = query.filter(StockHistory.change_type.in_(change_types))
+    if cursor:
+        query = query.filter(tuple_(StockHistory.timestamp, StockHistory.id) < tuple_(*cursor))
+    query = query.order_by(StockHistory.timestamp.desc(), StockHistory.id.desc())
+
+    if request.args.get('format') == 'ndjson':
+        return ndjson_response(query.yield_per(STREAM_CHUNK_SIZE), stock_history_dict)
+
+    rows = query.limit(limit + 1).all()
+    page, next_cursor = split_page(rows, limit, lambda h: [h.timestamp, h.id])
+    return with_next_cursor(json_response([stock_history_dict(h) for h in page]), next_cursor)
+
+
 @history_bp.route('/product/<int:id>', methods=['GET'])
+@replica_reads
 def get_product_history(id):
-    history = StockHistory.query.filter_by(product_id=id).order_by(StockHistory.timestamp.desc()).all()
-    return jsonify([h.to_dict() for h in history])
+    return _history_listing(StockHistory.product_id == id)
 
 @history_bp.route('/restocks', methods=['GET'])
+@replica_reads
 def get_restock_history():
-    # Fetch all positive stock changes (Restocks, Corrections, Initial)
-    history = StockHistory.query.filter(StockHistory.change_amount > 0).order_by(StockHistory.timestamp.desc()).all()
-    return jsonify([h.to_dict() for h in history])
+    # Positive stock changes (Restocks, Corrections, Initial); served by the partial restocks index
+    return _history_listing(StockHistory.change_amount > 0)
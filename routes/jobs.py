@@ -0,0 +1,70 @@
+from flask import Blueprint, request, jsonify
+from models import db, Job
+from jobs import JOB_KINDS, STATUSES, cancel, enqueue, job_accepted
+from pagination import get_limit, get_cursor, split_page, with_next_cursor
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.route('/', methods=['POST'])
+def create_job():
+    """Queue a background job. JSON body: kind and params (kind-specific).
+    Returns 202 with the job; poll GET /api/jobs/<id> for progress."""
+    data = request.json or {}
+    kind = JOB_KINDS.get(data.get('kind'))
+    if kind is None or not kind.public:
+        kinds = sorted(name for name, k in JOB_KINDS.items() if k.public)
+        return jsonify({'error': f'kind must be one of: {", ".join(kinds)}'}), 400
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({'error': 'params must be an object'}), 400
+    try:
+        job = enqueue(kind.name, params)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    return job_accepted(job)
+
+
+@jobs_bp.route('/', methods=['GET'])
+def get_jobs():
+    """Jobs newest first. Optional status and kind filters; keyset paginated."""
+    status = request.args.get('status')
+    if status and status not in STATUSES:
+        return jsonify({'error': f'status must be one of: {", ".join(STATUSES)}'}), 400
+    try:
+        limit = get_limit()
+        cursor = get_cursor([int])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = Job.query
+    if status:
+        query = query.filter(Job.status == status)
+    if request.args.get('kind'):
+        query = query.filter(Job.kind == request.args['kind'])
+    if cursor:
+        query = query.filter(Job.id < cursor[0])
+    rows = query.order_by(Job.id.desc()).limit(limit + 1).all()
+    page, next_cursor = split_page(rows, limit, lambda j: [j.id])
+    return with_next_cursor(jsonify([job.to_dict() for job in page]), next_cursor)
+
+
+@jobs_bp.route('/<int:id>', methods=['GET'])
+def get_job(id):
+    job = Job.query.get(id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@jobs_bp.route('/<int:id>/cancel', methods=['POST'])
+def cancel_job(id):
+    """Cancel a queued job, or ask a running one to stop after its current chunk."""
+    job = Job.query.get(id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if not cancel(id):
+        return jsonify({'error': f'Job already {job.status}'}), 409
+    db.session.refresh(job)
+    return jsonify(job.to_dict())
@@ -0,0 +1,8 @@
+from flask import Blueprint, current_app
+from metrics import CONTENT_TYPE, metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return current_app.response_class(metrics.render(), mimetype=None, content_type=CONTENT_TYPE)
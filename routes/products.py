@@ -1,12 +1,140 @@
-from flask import Blueprint, request, jsonify
+import os
+import shutil
+import tempfile
+
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from models import db, Product, Category, StockHistory, TransactionItem
+from sqlalchemy import func, or_, tuple_
+from sqlalchemy.orm import joinedload
+from product_import import DEFAULT_BATCH_SIZE, FORMATS, detect_format, import_products, insert_products
+from cache import cached_response, invalidate
+from jobs import enqueue, job_accepted, job_kind
+from pagination import get_limit, get_cursor, prefix_filter, split_page, with_next_cursor
+from serializers import PRODUCT_COLUMNS, dumps, json_response, product_dict
+from stock_alerts import (KEEPALIVE_INTERVAL, MAX_WAIT, is_low, latest_alert_id, record_transition,
+                          wait_for_alerts)
+from replicas import replica_reads
 
 products_bp = Blueprint('products', __name__)
 
 @products_bp.route('/', methods=['GET'])
+@replica_reads
 def get_products():
-    products = Product.query.all()
-    return jsonify([p.to_dict() for p in products])
+    """List the catalogue ordered by name, one keyset page at a time.
+
+    Query parameters (all optional):
+      - limit, cursor: page size and the X-Next-Cursor value of the previous page
+      - q: case-insensitive prefix match on product name or SKU
+      - category_id: only products in this category
+      - low_stock: when true, only products at or below their low_stock_threshold
+    """
+    try:
+        limit = get_limit()
+        cursor = get_cursor([str, int])
+        category_id = request.args.get('category_id', type=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    search = (request.args.get('q') or '').strip()
+    low_stock = request.args.get('low_stock', '').lower() in ('1', 'true', 'yes')
+
+    query = db.session.query(*PRODUCT_COLUMNS).outerjoin(Category, Category.id == Product.category_id)
+    if search:
+        query = query.filter(or_(
+            prefix_filter(func.lower(Product.name), search.lower()),
+            prefix_filter(func.lower(Product.sku), search.lower())
+        ))
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    if low_stock:
+        query = query.filter(Product.stock_quantity <= Product.low_stock_threshold)
+    if cursor:
+        query = query.filter(tuple_(Product.name, Product.id) > tuple_(*cursor))
+
+    rows = query.order_by(Product.name, Product.id).limit(limit + 1).all()
+    page, next_cursor = split_page(rows, limit, lambda p: [p.name, p.id])
+    return with_next_cursor(json_response([product_dict(p) for p in page]), next_cursor)
+
+@products_bp.route('/low-stock', methods=['GET'])
+@replica_reads
+def get_low_stock():
+    """Products at or below their low_stock_threshold, lowest stock first.
+
+    Served by the partial index ix_product_low_stock, so the cost depends on
+    the number of low-stock products, not the catalogue size.
+    Query parameters: limit, cursor (X-Next-Cursor of the previous page).
+    """
+    try:
+        limit = get_limit()
+        cursor = get_cursor([int, int])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = db.session.query(*PRODUCT_COLUMNS) \
+        .outerjoin(Category, Category.id == Product.category_id) \
+        .filter(Product.stock_quantity <= Product.low_stock_threshold)
+    if cursor:
+        query = query.filter(tuple_(Product.stock_quantity, Product.id) > tuple_(*cursor))
+    rows = query.order_by(Product.stock_quantity, Product.id).limit(limit + 1).all()
+    page, next_cursor = split_page(rows, limit, lambda p: [p.stock_quantity, p.id])
+    return with_next_cursor(json_response([product_dict(p) for p in page]), next_cursor)
+
+def _alert_cursor():
+    """The feed position (alert seq) a reader has already seen: ?after=, else
+    the SSE Last-Event-ID header, else the newest alert (only new alerts are sent)."""
+    raw = request.args.get('after', request.headers.get('Last-Event-ID'))
+    if raw is None or raw == '':
+        return latest_alert_id()
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        raise ValueError('after must be an alert seq')
+
+@products_bp.route('/low-stock/events', methods=['GET'])
+def poll_low_stock_events():
+    """Long-poll for threshold crossings ('low' / 'recovered' alerts).
+
+    Returns {'events': [...], 'last_id': n} as soon as there are alerts after
+    ?after=<seq>, or an empty list after ?timeout= seconds (default and
+    maximum 30). last_id is the seq of the last event (feed position, in
+    commit order); pass it back as ?after= on the next call.
+    """
+    try:
+        after = _alert_cursor()
+        timeout = min(max(request.args.get('timeout', MAX_WAIT, type=float), 0), MAX_WAIT)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    events = wait_for_alerts(after, timeout)
+    return jsonify({'events': events, 'last_id': events[-1]['seq'] if events else after})
+
+@products_bp.route('/low-stock/stream', methods=['GET'])
+def stream_low_stock_events():
+    """Server-sent events for threshold crossings.
+
+    Each alert is sent as ``event: low`` or ``event: recovered`` with the
+    alert seq as the SSE id, so EventSource reconnects resume from
+    Last-Event-ID. A comment line is sent every KEEPALIVE_INTERVAL seconds.
+    Each open stream holds one worker thread.
+    """
+    try:
+        after = _alert_cursor()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate(last_id):
+        yield 'retry: 5000\n\n'
+        while True:
+            events = wait_for_alerts(last_id, KEEPALIVE_INTERVAL)
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            for alert in events:
+                yield f"id: {alert['seq']}\nevent: {alert['kind']}\ndata: {dumps(alert).decode()}\n\n"
+            last_id = events[-1]['seq']
+
+    response = Response(stream_with_context(generate(after)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @products_bp.route('/bulk', methods=['POST'])
 def add_products_bulk():
@@ -14,38 +142,69 @@ def add_products_bulk():
     if not isinstance(data, list):
         return jsonify({'error': 'Input must be a list of products'}), 400
     
-    added_products = []
     try:
-        for item in data:
-            new_product = Product(
-                name=item['name'],
-                sku=item['sku'],
-                price=item['price'],
-                stock_quantity=item['stock_quantity'],
-                low_stock_threshold=int(item.get('low_stock_threshold', 10)),
-                category_id=item['category_id']
-            )
-            db.session.add(new_product)
-            db.session.flush() # Get ID for history
-            
-            # Initial Stock History
-            if new_product.stock_quantity > 0:
-                history = StockHistory(
-                    product_id=new_product.id,
-                    change_amount=new_product.stock_quantity,
-                    change_type='initial',
-                    note='Bulk Import'
-                )
-                db.session.add(history)
-            
-            added_products.append(new_product)
-
+        rows = [{
+            'name': item['name'],
+            'sku': item['sku'],
+            'price': item['price'],
+            'stock_quantity': item['stock_quantity'],
+            'low_stock_threshold': int(item.get('low_stock_threshold', 10)),
+            'category_id': item['category_id']
+        } for item in data]
+        # One multi-row insert for products and one for their initial history
+        product_ids = insert_products(rows)
         db.session.commit()
-        return jsonify([p.to_dict() for p in added_products]), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+    products = {
+        p.id: p for p in Product.query.options(joinedload(Product.category)).filter(Product.id.in_(product_ids))
+    }
+    return jsonify([products[pid].to_dict() for pid in product_ids]), 201
+
+@products_bp.route('/import', methods=['POST'])
+def import_products_stream():
+    """Stream-import products from a CSV or NDJSON request body.
+
+    The format comes from ?format=csv|ndjson or the Content-Type header.
+    Rows may give category_id or a category name. Optional parameters:
+    batch_size (rows per commit), create_categories=true to create
+    unknown category names and async=true to import in a background job
+    (202 with the job to poll). Returns counts plus per-row errors.
+    """
+    fmt = request.args.get('format') or detect_format(request.content_type)
+    if fmt not in FORMATS:
+        return jsonify({'error': 'Use ?format=csv|ndjson or a text/csv or application/x-ndjson body'}), 400
+    batch_size = request.args.get('batch_size', DEFAULT_BATCH_SIZE, type=int)
+    if batch_size < 1:
+        return jsonify({'error': 'batch_size must be positive'}), 400
+    create_categories = request.args.get('create_categories', '').lower() in ('1', 'true', 'yes')
+
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        # The upload is spooled to disk so the job can read it after the request ends
+        fd, path = tempfile.mkstemp(prefix='import-', suffix=f'.{fmt}', dir=current_app.config.get('JOB_SPOOL_DIR'))
+        with os.fdopen(fd, 'wb') as spool:
+            shutil.copyfileobj(request.stream, spool)
+        job = enqueue('products.import', {'path': path, 'format': fmt, 'batch_size': batch_size,
+                                          'create_categories': create_categories})
+        return job_accepted(job)
+
+    result = import_products(request.stream, fmt, batch_size=batch_size, create_categories=create_categories)
+    return jsonify(result.to_dict()), 200
+
+
+@job_kind('products.import', public=False)
+def import_products_job(ctx, path, format, batch_size, create_categories):
+    try:
+        with open(path, 'rb') as f:
+            result = import_products(f, format, batch_size=batch_size, create_categories=create_categories,
+                                     on_batch=lambda r: ctx.progress(r.inserted + r.failed))
+    finally:
+        os.remove(path)
+    ctx.progress(result.inserted + result.failed)
+    return result.to_dict()
+
 @products_bp.route('/', methods=['POST'])
 def add_product():
     data = request.json
@@ -71,6 +230,7 @@ def add_product():
             )
             db.session.add(history)
 
+        invalidate('products')
         db.session.commit()
         return jsonify(new_product.to_dict()), 201
     except Exception as e:
@@ -91,6 +251,7 @@ def delete_product(id):
     StockHistory.query.filter_by(product_id=id).delete()
     
     db.session.delete(product)
+    invalidate('products')
     db.session.commit()
     return jsonify({'message': 'Product deleted'})
 
@@ -98,6 +259,7 @@ def delete_product(id):
 def update_product(id):
     product = Product.query.get_or_404(id)
     data = request.json
+    was_low = is_low(product.stock_quantity, product.low_stock_threshold)
     
     if 'name' in data: product.name = data['name']
     if 'sku' in data: product.sku = data['sku']
@@ -129,14 +291,18 @@ def update_product(id):
 
     if 'low_stock_threshold' in data: product.low_stock_threshold = int(data['low_stock_threshold'])
     if 'category_id' in data: product.category_id = data['category_id']
+    record_transition(product, was_low)
     
+    invalidate('products')
     db.session.commit()
     return jsonify(product.to_dict())
 
 @products_bp.route('/categories', methods=['GET'])
+@cached_response('categories')
+@replica_reads
 def get_categories():
-    categories = Category.query.all()
-    return jsonify([c.to_dict() for c in categories])
+    categories = db.session.query(Category.id, Category.name).all()
+    return json_response([{'id': c.id, 'name': c.name} for c in categories])
 
 @products_bp.route('/categories', methods=['POST'])
 def add_category():
@@ -144,6 +310,7 @@ def add_category():
     try:
         new_category = Category(name=data['name'])
         db.session.add(new_category)
+        invalidate('categories')
         db.session.commit()
         return jsonify(new_category.to_dict()), 201
     except Exception as e:
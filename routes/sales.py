@@ -1,199 +1,573 @@
-from flask import Blueprint, request, jsonify
-from models import db, Transaction, TransactionItem, Product, Customer, DebtRecord, StockHistory
+from flask import Blueprint, current_app, request, jsonify
+from models import db, Transaction, TransactionItem, Product, Customer, StockHistory, SaleReturn
 from datetime import datetime
+from sqlalchemy import case, cast, delete, func, insert, literal, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from rollups import record_sales
+from debt_ledger import post_entries, reverse_transactions, to_amount
+from stock_alerts import record_crossings
+from idempotency import idempotent, remember_response
+from jobs import enqueue, job_accepted, job_kind
+from cache import invalidate
+from pagination import get_limit, get_cursor, parse_datetime_arg, split_page, with_next_cursor
+from serializers import TRANSACTION_COLUMNS, json_response, transaction_dicts
+from replicas import replica_reads
+from sales_service import ServiceError, checkout, deduct_stock, delete_returns, refund_sale, return_items
 
 sales_bp = Blueprint('sales', __name__)
 
+# Largest number of sales accepted by one POST /api/sales/batch
+MAX_BATCH_SALES = 5000
+# Attempts per chunk when a concurrent checkout takes stock between the check and the UPDATE
+BATCH_STOCK_RETRIES = 3
 
-def _remove_transaction(transaction):
-    """Helper to safely remove a transaction:
-    - revert product stock quantities
-    - add stock history entries describing the revert
-    - adjust customer points and total_debt
-    - delete associated DebtRecord entries
-    - delete the transaction
+
+def _remove_transactions(ids):
+    """Set-based counterpart of sales_service.refund_sale for many transactions.
+
+    Produces the same end state as calling refund_sale on each id,
+    but with a fixed number of aggregate statements:
+      - one UPDATE restoring product stock (summed per product)
+      - one INSERT ... SELECT writing a 'revert_delete' history row per item
+      - one UPDATE adjusting customer points (summed per customer)
+      - ledger reversals for the debt (debt_ledger.reverse_transactions)
+      - DELETEs for items and transactions
+    Returns the list of ids that existed and were removed. Does not commit.
     """
+    transactions = db.session.query(
+        Transaction.id, Transaction.customer_id, Transaction.total_amount,
+        Transaction.date, Transaction.payment_method
+    ).filter(Transaction.id.in_(ids)).all()
+    found_ids = [t.id for t in transactions]
+    if not found_ids:
+        return []
+
+    # Restore stock, summed per product (returned units were restocked already)
+    restock = dict(
+        db.session.query(TransactionItem.product_id,
+                         func.sum(TransactionItem.quantity - TransactionItem.returned_quantity))
+        .filter(TransactionItem.transaction_id.in_(found_ids))
+        .group_by(TransactionItem.product_id)
+        .having(func.sum(TransactionItem.quantity - TransactionItem.returned_quantity) != 0)
+        .all()
+    )
+    if restock:
+        restore = case(restock, value=Product.id)
+        db.session.execute(
+            update(Product.__table__)
+            .where(Product.id.in_(list(restock)))
+            .values(stock_quantity=func.coalesce(Product.stock_quantity, 0) + restore)
+        )
+        record_crossings(restock)
+
+    # One revert history row per item, as the per-row path writes
+    db.session.execute(
+        insert(StockHistory.__table__).from_select(
+            ['product_id', 'change_amount', 'change_type', 'note', 'timestamp'],
+            select(
+                TransactionItem.product_id,
+                TransactionItem.quantity - TransactionItem.returned_quantity,
+                literal('revert_delete'),
+                literal('Reverted by deletion of Transaction #') + cast(TransactionItem.transaction_id, db.String),
+                literal(datetime.utcnow())
+            ).where(TransactionItem.transaction_id.in_(found_ids),
+                    TransactionItem.quantity > TransactionItem.returned_quantity)
+        )
+    )
+
+    # Points earned, summed per customer
+    points = {}
+    for t in transactions:
+        if t.customer_id:
+            points[t.customer_id] = points.get(t.customer_id, 0) + int((t.total_amount or 0) / 10)
+    if points:
+        remaining_points = func.coalesce(Customer.points, 0) - case(points, value=Customer.id, else_=0)
+        db.session.execute(
+            update(Customer.__table__)
+            .where(Customer.id.in_(list(points)))
+            .values(points=case((remaining_points < 0, 0), else_=remaining_points))
+        )
+
+    # Cancel the debt with reversal entries; the ledger records are kept
+    reverse_transactions(found_ids)
+
+    units = dict(
+        db.session.query(TransactionItem.transaction_id,
+                         func.sum(TransactionItem.quantity - TransactionItem.returned_quantity))
+        .filter(TransactionItem.transaction_id.in_(found_ids))
+        .group_by(TransactionItem.transaction_id)
+        .all()
+    )
+    record_sales((t.date, t.payment_method, -(t.total_amount or 0), -1, -(units.get(t.id) or 0))
+                 for t in transactions)
+    invalidate('sales')
+
+    # Delete children explicitly rather than relying on FK cascades (off by default on SQLite)
+    delete_returns(db.session, found_ids)
+    db.session.execute(delete(TransactionItem.__table__).where(TransactionItem.transaction_id.in_(found_ids)))
+    db.session.execute(delete(Transaction.__table__).where(Transaction.id.in_(found_ids)))
+    return found_ids
+
+
+def _remove_transactions_chunked(ids, chunk_size, on_chunk=None):
+    """Run _remove_transactions over ids in chunks, committing after each chunk.
+
+    A failing chunk is rolled back and reported without stopping the rest.
+    ``on_chunk(processed)`` is called after each chunk (job progress).
+    Returns (deleted_ids, failed) where failed maps str(id) -> reason.
+    """
+    deleted = []
+    failed = {}
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        try:
+            removed = _remove_transactions(chunk)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for tid in chunk:
+                failed[str(tid)] = str(e)
+            removed = []
+        deleted.extend(removed)
+        removed_set = set(removed)
+        for tid in chunk:
+            if tid not in removed_set and str(tid) not in failed:
+                failed[str(tid)] = 'not found'
+        if on_chunk is not None:
+            on_chunk(start + len(chunk))
+    return deleted, failed
+
+
+def _chunk_size(data, config_key='DELETE_CHUNK_SIZE'):
     try:
-        # Revert stock and add history
-        for item in list(transaction.items):
-            product = Product.query.get(item.product_id)
-            if product:
-                product.stock_quantity = (product.stock_quantity or 0) + (item.quantity or 0)
-                history = StockHistory(
-                    product_id=product.id,
-                    change_amount=item.quantity,
-                    change_type='revert_delete',
-                    note=f'Reverted by deletion of Transaction #{transaction.id}'
-                )
-                db.session.add(history)
-
-        # Adjust customer points and debt
-        if transaction.customer_id:
-            customer = Customer.query.get(transaction.customer_id)
-            if customer:
-                # Remove points earned from this transaction (best-effort)
-                try:
-                    points = int(transaction.total_amount / 10)
-                    customer.points = max(0, (customer.points or 0) - points)
-                except Exception:
-                    pass
-
-                # Remove debt records linked to this transaction
-                debt_records = DebtRecord.query.filter_by(transaction_id=transaction.id).all()
-                for dr in debt_records:
-                    try:
-                        customer.total_debt = (customer.total_debt or 0) - (dr.amount or 0)
-                    except Exception:
-                        pass
-                    db.session.delete(dr)
-
-        # Finally delete transaction (TransactionItem rows have cascade delete)
-        db.session.delete(transaction)
-        db.session.flush()
-        return True, None
-    except Exception as e:
-        return False, str(e)
+        size = int(data.get('chunk_size') or current_app.config.get(config_key, 500))
+    except (TypeError, ValueError):
+        raise ValueError('chunk_size must be an integer')
+    if size < 1:
+        raise ValueError('chunk_size must be positive')
+    return size
+
+
+def _parse_batch_sale(raw):
+    """Validate one sale of a batch; returns a normalised dict or raises ValueError."""
+    if not isinstance(raw, dict):
+        raise ValueError('Each sale must be an object')
+    client_id = str(raw.get('client_id') or '').strip()
+    if not client_id:
+        raise ValueError('client_id is required')
+    if len(client_id) > 64:
+        raise ValueError('client_id must be at most 64 characters')
+
+    items = raw.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError('No items in transaction')
+    quantities = {}
+    for item in items:
+        try:
+            product_id = int(item['product_id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each item needs an integer product_id and quantity')
+        if quantity <= 0:
+            raise ValueError('quantity must be positive')
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
 
-@sales_bp.route('/', methods=['POST'])
-def create_sale():
-    data = request.json
-    items_data = data.get('items', [])
-    customer_id = data.get('customer_id')
-    payment_method = data.get('payment_method', 'cash')
-    paid_amount = float(data.get('paid_amount', 0)) if data.get('paid_amount') is not None else None
-    
-    if not items_data:
-        return jsonify({'error': 'No items in transaction'}), 400
-
-    total_amount = 0
-    transaction_items = []
-
-    # Calculate total and verify stock
-    for item in items_data:
-        product = Product.query.get(item['product_id'])
-        if not product:
-            return jsonify({'error': f'Product {item["product_id"]} not found'}), 404
-        
-        if product.stock_quantity < item['quantity']:
-            return jsonify({'error': f'Insufficient stock for {product.name}'}), 400
-        
-        item_total = product.price * item['quantity']
-        total_amount += item_total
-        
-        # Deduct stock
-        product.stock_quantity -= item['quantity']
-        
-        # Log Stock History
-        history = StockHistory(
-            product_id=product.id,
-            change_amount=-item['quantity'],
-            change_type='sale',
-            note=f'Sold in Transaction'
+    try:
+        paid_amount = float(raw['paid_amount']) if raw.get('paid_amount') is not None else None
+        customer_id = int(raw['customer_id']) if raw.get('customer_id') else None
+    except (TypeError, ValueError):
+        raise ValueError('paid_amount and customer_id must be numbers')
+    try:
+        date = datetime.fromisoformat(raw['date']) if raw.get('date') else None
+    except (TypeError, ValueError):
+        raise ValueError('date must be an ISO datetime')
+
+    return {
+        'client_id': client_id,
+        'quantities': quantities,
+        'customer_id': customer_id,
+        'payment_method': raw.get('payment_method') or 'cash',
+        'paid_amount': paid_amount,
+        'date': date
+    }
+
+
+def _ingest_sales(sales):
+    """Set-based counterpart of create_sale for a chunk of parsed sales.
+
+    Sales whose client_id was already ingested are reported as duplicates.
+    Stock is checked for the chunk in aggregate, in order: a sale that would
+    exceed the stock left by the sales before it is rejected, like a single
+    checkout would be. The accepted sales are then applied with a fixed
+    number of statements: one guarded stock UPDATE, one INSERT each for
+    transactions, items and history, one customer points UPDATE, the debt
+    ledger postings and the rollup upsert.
+
+    Returns (results by client_id, ok). ok is False when a concurrent
+    checkout took stock after the check; the caller must roll back and
+    retry. Does not commit.
+    """
+    client_ids = [sale['client_id'] for sale in sales]
+    existing = dict(
+        db.session.query(Transaction.client_id, Transaction.id).filter(Transaction.client_id.in_(client_ids))
+    )
+    product_ids = {pid for sale in sales for pid in sale['quantities']}
+    products = {
+        p.id: p for p in db.session.query(Product.id, Product.name, Product.price, Product.stock_quantity)
+        .filter(Product.id.in_(list(product_ids)))
+    }
+    customer_ids = {sale['customer_id'] for sale in sales if sale['customer_id']}
+    customers = {
+        cid for (cid,) in db.session.query(Customer.id).filter(Customer.id.in_(list(customer_ids)))
+    } if customer_ids else set()
+
+    results = {}
+    accepted = []
+    available = {pid: p.stock_quantity or 0 for pid, p in products.items()}
+    for sale in sales:
+        client_id = sale['client_id']
+        if client_id in existing:
+            results[client_id] = {'client_id': client_id, 'status': 'duplicate', 'transaction_id': existing[client_id]}
+            continue
+        error = None
+        missing = [pid for pid in sale['quantities'] if pid not in products]
+        if missing:
+            error = f'Product {missing[0]} not found'
+        elif sale['customer_id'] and sale['customer_id'] not in customers:
+            error = f"Customer {sale['customer_id']} not found"
+        else:
+            short = [pid for pid, qty in sale['quantities'].items() if available[pid] < qty]
+            if short:
+                error = f'Insufficient stock for {products[short[0]].name}'
+        if error:
+            results[client_id] = {'client_id': client_id, 'status': 'rejected', 'error': error}
+            continue
+        for pid, qty in sale['quantities'].items():
+            available[pid] -= qty
+        total = sum(products[pid].price * qty for pid, qty in sale['quantities'].items())
+        accepted.append((sale, total))
+    if not accepted:
+        return results, True
+
+    quantities = {}
+    for sale, _ in accepted:
+        for pid, qty in sale['quantities'].items():
+            quantities[pid] = quantities.get(pid, 0) + qty
+    ok, _ = deduct_stock(db.session, quantities)
+    if not ok:
+        return results, False
+    record_crossings({pid: -qty for pid, qty in quantities.items()})
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            'client_id': sale['client_id'],
+            'date': sale['date'] or now,
+            'total_amount': total,
+            'paid_amount': sale['paid_amount'] if sale['paid_amount'] is not None else total,
+            'payment_method': sale['payment_method'],
+            'customer_id': sale['customer_id']
+        }
+        for sale, total in accepted
+    ]
+    table = Transaction.__table__
+    if db.engine.dialect.insert_executemany_returning:
+        result = db.session.execute(insert(table).returning(table.c.id, table.c.client_id), rows)
+        id_by_client = {client_id: tid for tid, client_id in result}
+    else:
+        db.session.execute(insert(table), rows)
+        id_by_client = dict(
+            db.session.query(Transaction.client_id, Transaction.id)
+            .filter(Transaction.client_id.in_([row['client_id'] for row in rows]))
         )
-        db.session.add(history)
-        
-        # Create transaction item
-        t_item = TransactionItem(
-            product_id=product.id,
-            quantity=item['quantity'],
-            price_at_sale=product.price
+
+    item_rows, history_rows, points, debts = [], [], {}, []
+    for (sale, total), row in zip(accepted, rows):
+        transaction_id = id_by_client[sale['client_id']]
+        for pid, qty in sale['quantities'].items():
+            item_rows.append({'transaction_id': transaction_id, 'product_id': pid, 'quantity': qty,
+                              'price_at_sale': products[pid].price})
+            history_rows.append({'product_id': pid, 'change_amount': -qty, 'change_type': 'sale',
+                                 'note': 'Sold in Transaction', 'timestamp': now})
+        customer_id = sale['customer_id']
+        if customer_id:
+            points[customer_id] = points.get(customer_id, 0) + int(total / 10)
+            if sale['payment_method'] == 'debt':
+                debt_amount = to_amount(total - row['paid_amount'])
+                if debt_amount > 0:
+                    debts.append((customer_id, debt_amount, 'debt', f'Debt from Transaction #{transaction_id}',
+                                  transaction_id))
+        results[sale['client_id']] = {'client_id': sale['client_id'], 'status': 'created',
+                                      'transaction_id': transaction_id, 'total_amount': total}
+    db.session.execute(insert(TransactionItem.__table__), item_rows)
+    db.session.execute(insert(StockHistory.__table__), history_rows)
+    if points:
+        db.session.execute(
+            update(Customer.__table__)
+            .where(Customer.id.in_(list(points)))
+            .values(points=func.coalesce(Customer.points, 0) + case(points, value=Customer.id))
         )
-        transaction_items.append(t_item)
+    post_entries(debts)
+    record_sales((row['date'], row['payment_method'], row['total_amount'], 1, sum(sale['quantities'].values()))
+                 for (sale, _), row in zip(accepted, rows))
+    invalidate('sales')
+    return results, True
 
-    # If paid_amount is not specified (e.g. simple cash sale), assume full payment unless logic dictates otherwise
-    # But for debt, we need explicit logic.
-    if paid_amount is None:
-        paid_amount = total_amount
 
-    # Handle Customer
-    if customer_id:
-        customer = Customer.query.get(customer_id)
-        if customer:
-            points_earned = int(total_amount / 10)
-            customer.points += points_earned
-            
-            # Handle Debt
-            if payment_method == 'debt':
-                debt_amount = total_amount - paid_amount
-                if debt_amount > 0:
-                    customer.total_debt += debt_amount
-
-    # Create Transaction
-    new_transaction = Transaction(
-        total_amount=total_amount,
-        paid_amount=paid_amount,
-        payment_method=payment_method,
-        items=transaction_items,
-        customer_id=customer_id
-    )
-    
-    db.session.add(new_transaction)
-    db.session.flush() # Generate ID
-
-    # Create Debt Record if needed
-    if customer_id and payment_method == 'debt':
-        debt_amount = total_amount - paid_amount
-        if debt_amount > 0:
-            debt_record = DebtRecord(
-                customer_id=customer_id,
-                transaction_id=new_transaction.id,
-                amount=debt_amount,
-                type='debt',
-                description=f'Debt from Transaction #{new_transaction.id}'
-            )
-            db.session.add(debt_record)
+def _ingest_sales_chunked(sales, chunk_size):
+    """Run _ingest_sales over sales in chunks, committing after each chunk.
 
+    A chunk that loses a stock race, or whose client_ids are inserted by a
+    concurrent replay of the same batch, is rolled back and re-checked from
+    fresh data. Returns results by client_id.
+    """
+    results = {}
+    for start in range(0, len(sales), chunk_size):
+        chunk = sales[start:start + chunk_size]
+        chunk_results, error = None, 'Stock changed during ingestion; resend this sale'
+        for _ in range(BATCH_STOCK_RETRIES):
+            try:
+                chunk_results, ok = _ingest_sales(chunk)
+            except IntegrityError:
+                ok = False  # a concurrent replay inserted one of these client_ids first
+            except Exception as e:
+                db.session.rollback()
+                chunk_results, error = None, str(e)
+                break
+            if ok:
+                db.session.commit()
+                break
+            db.session.rollback()
+            chunk_results = None
+        if chunk_results is None:
+            chunk_results = {
+                sale['client_id']: {'client_id': sale['client_id'], 'status': 'failed', 'error': error}
+                for sale in chunk
+            }
+        results.update(chunk_results)
+    return results
+
+
+@sales_bp.route('/', methods=['POST'])
+@idempotent
+def create_sale():
+    data = request.json
+    try:
+        result = checkout(
+            db.session, data.get('items', []),
+            customer_id=data.get('customer_id'),
+            payment_method=data.get('payment_method', 'cash'),
+            paid_amount=data.get('paid_amount')
+        )
+    except ServiceError as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status
+
+    remember_response(result, 201)
     db.session.commit()
-    
-    return jsonify(new_transaction.to_dict()), 201
+    return jsonify(result), 201
+
+@sales_bp.route('/batch', methods=['POST'])
+def create_sales_batch():
+    """Ingest many sales at once, e.g. the queue of a till coming back online.
+
+    Body: {"sales": [{"client_id": "...", "items": [...], "customer_id": ...,
+    "payment_method": ..., "paid_amount": ..., "date": "<ISO datetime>"}, ...],
+    "chunk_size": n} (a bare list of sales is accepted too). client_id is
+    generated by the till and makes the batch safe to resend: sales already
+    ingested come back as 'duplicate' with their transaction_id. date is
+    when the sale happened (defaults to now).
+
+    Sales are applied in chunked transactions (SALES_BATCH_CHUNK_SIZE). The
+    response lists one result per sale, in input order, with status
+    created, duplicate, rejected (e.g. insufficient stock), invalid or failed.
+    """
+    data = request.json
+    if isinstance(data, list):
+        data = {'sales': data}
+    raw_sales = (data or {}).get('sales')
+    if not isinstance(raw_sales, list) or not raw_sales:
+        return jsonify({'error': 'Provide a non-empty "sales" list in JSON body'}), 400
+    if len(raw_sales) > MAX_BATCH_SALES:
+        return jsonify({'error': f'At most {MAX_BATCH_SALES} sales per batch'}), 400
+    try:
+        chunk_size = _chunk_size(data, 'SALES_BATCH_CHUNK_SIZE')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = []
+    sales = []
+    seen = set()
+    for raw in raw_sales:
+        client_id = raw.get('client_id') if isinstance(raw, dict) else None
+        try:
+            sale = _parse_batch_sale(raw)
+            if sale['client_id'] in seen:
+                raise ValueError('client_id appears more than once in this batch')
+        except ValueError as e:
+            results.append({'client_id': client_id, 'status': 'invalid', 'error': str(e)})
+            continue
+        seen.add(sale['client_id'])
+        sales.append(sale)
+        results.append(sale['client_id'])
+
+    ingested = _ingest_sales_chunked(sales, chunk_size) if sales else {}
+    results = [ingested[r] if isinstance(r, str) else r for r in results]
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return jsonify({'results': results, 'summary': summary}), 200
 
 @sales_bp.route('/', methods=['GET'])
+@replica_reads
 def get_sales():
-    sales = Transaction.query.order_by(Transaction.date.desc()).all()
-    return jsonify([s.to_dict() for s in sales])
+    """List transactions, newest first, one keyset page at a time.
+
+    Query parameters (all optional):
+      - limit, cursor: page size and the X-Next-Cursor value of the previous page
+      - start_date, end_date: ISO date/datetime range on the transaction date
+      - customer_id, payment_method, product_id: exact-match filters
+    """
+    try:
+        limit = get_limit()
+        cursor = get_cursor([datetime, int])
+        start_date = parse_datetime_arg('start_date')
+        end_date = parse_datetime_arg('end_date', end_of_day=True)
+        customer_id = request.args.get('customer_id', type=int)
+        product_id = request.args.get('product_id', type=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    payment_method = request.args.get('payment_method')
+
+    query = db.session.query(*TRANSACTION_COLUMNS)
+    if start_date:
+        query = query.filter(Transaction.date >= start_date)
+    if end_date:
+        query = query.filter(Transaction.date < end_date)
+    if customer_id:
+        query = query.filter(Transaction.customer_id == customer_id)
+    if payment_method:
+        query = query.filter(Transaction.payment_method == payment_method)
+    if product_id:
+        query = query.filter(
+            TransactionItem.query
+            .filter(TransactionItem.transaction_id == Transaction.id,
+                    TransactionItem.product_id == product_id)
+            .exists()
+        )
+    if cursor:
+        query = query.filter(tuple_(Transaction.date, Transaction.id) < tuple_(*cursor))
+
+    rows = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit + 1).all()
+    page, next_cursor = split_page(rows, limit, lambda s: [s.date, s.id])
+    return with_next_cursor(json_response(transaction_dicts(db.session, page)), next_cursor)
 
 
 @sales_bp.route('/<int:transaction_id>', methods=['DELETE'])
 def delete_sale(transaction_id):
-    transaction = Transaction.query.get(transaction_id)
-    if not transaction:
-        return jsonify({'error': 'Transaction not found'}), 404
-
-    ok, err = _remove_transaction(transaction)
-    if not ok:
+    try:
+        refund_sale(db.session, transaction_id)
+    except ServiceError as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status
+    except Exception as e:
         db.session.rollback()
-        return jsonify({'error': f'Failed to delete transaction: {err}'}), 500
+        return jsonify({'error': f'Failed to delete transaction: {e}'}), 500
 
     db.session.commit()
     return jsonify({'status': 'deleted', 'transaction_id': transaction_id}), 200
 
 
-@sales_bp.route('/bulk-delete', methods=['POST'])
-def bulk_delete_sales():
+@sales_bp.route('/<int:transaction_id>/returns', methods=['POST'])
+@idempotent
+def create_return(transaction_id):
+    """Return some items of a sale; the transaction is kept.
+
+    Body: {"items": [{"product_id": 3, "quantity": 1}, ...], "note": "..."}
+    (transaction_item_id instead of product_id picks a line directly).
+    Returns 201 with the return record and the updated transaction.
+    """
     data = request.json or {}
+    try:
+        result = return_items(db.session, transaction_id, data.get('items', []), note=data.get('note'))
+    except ServiceError as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status
+
+    remember_response(result, 201)
+    db.session.commit()
+    return jsonify(result), 201
+
+
+@sales_bp.route('/<int:transaction_id>/returns', methods=['GET'])
+def get_returns(transaction_id):
+    """Returns recorded against a sale, oldest first."""
+    returns = SaleReturn.query.filter_by(transaction_id=transaction_id).order_by(SaleReturn.id).all()
+    return jsonify([r.to_dict() for r in returns])
+
+
+def _bulk_delete_params(data):
     ids = data.get('ids', [])
     if not isinstance(ids, list) or not ids:
-        return jsonify({'error': 'Provide a non-empty "ids" list in JSON body'}), 400
+        raise ValueError('Provide a non-empty "ids" list in JSON body')
+    try:
+        ids = list(dict.fromkeys(int(tid) for tid in ids))
+    except (TypeError, ValueError):
+        raise ValueError('ids must be integers')
+    return {'ids': ids, 'chunk_size': _chunk_size(data)}
 
-    results = {'deleted': [], 'failed': {}}
-    for tid in ids:
-        transaction = Transaction.query.get(tid)
-        if not transaction:
-            results['failed'][str(tid)] = 'not found'
-            continue
-        ok, err = _remove_transaction(transaction)
-        if ok:
-            results['deleted'].append(tid)
-        else:
-            results['failed'][str(tid)] = err
 
+def _delete_filter_params(data):
+    product_id = data.get('product_id')
+    category_id = data.get('category_id')
+    if not product_id and not category_id:
+        raise ValueError('Provide product_id or category_id in JSON body')
     try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': f'Commit failed: {e}'}), 500
+        product_id = int(product_id) if product_id else None
+        category_id = int(category_id) if category_id else None
+    except (TypeError, ValueError):
+        raise ValueError('product_id and category_id must be integers')
+    return {'product_id': product_id, 'category_id': category_id, 'chunk_size': _chunk_size(data)}
+
+
+def _matching_transaction_ids(product_id=None, category_id=None):
+    query = db.session.query(TransactionItem.transaction_id)
+    if product_id:
+        query = query.filter(TransactionItem.product_id == product_id)
+    elif category_id:
+        query = query.join(Product).filter(Product.category_id == category_id)
+    return [tid for (tid,) in query.distinct().order_by(TransactionItem.transaction_id)]
 
-    return jsonify(results), 200
+
+@job_kind('sales.bulk_delete', validate=_bulk_delete_params)
+def bulk_delete_job(ctx, ids, chunk_size):
+    ctx.progress(0, len(ids))
+    deleted, failed = _remove_transactions_chunked(ids, chunk_size, lambda done: ctx.progress(done))
+    return {'deleted': deleted, 'failed': failed}
+
+
+@job_kind('sales.delete_by_filter', validate=_delete_filter_params)
+def delete_by_filter_job(ctx, product_id=None, category_id=None, chunk_size=500):
+    ids = _matching_transaction_ids(product_id, category_id)
+    ctx.progress(0, len(ids))
+    deleted, failed = _remove_transactions_chunked(ids, chunk_size, lambda done: ctx.progress(done))
+    return {'deleted_count': len(deleted), 'deleted': deleted, 'failed': failed}
+
+
+@sales_bp.route('/bulk-delete', methods=['POST'])
+def bulk_delete_sales():
+    """Delete transactions by id. JSON body: ids, optional chunk_size, and
+    async=true to run as a background job (202 with the job to poll)."""
+    data = request.json or {}
+    try:
+        params = _bulk_delete_params(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if data.get('async'):
+        return job_accepted(enqueue('sales.bulk_delete', params))
+
+    deleted, failed = _remove_transactions_chunked(params['ids'], params['chunk_size'])
+    return jsonify({'deleted': deleted, 'failed': failed}), 200
 
 
 @sales_bp.route('/delete-by-filter', methods=['POST'])
@@ -202,37 +576,20 @@ def delete_sales_by_filter():
     Accepts JSON body with one of:
       - product_id: delete transactions that contain this product
       - category_id: delete transactions that contain any product in this category
+    and optionally chunk_size (transactions per commit, default DELETE_CHUNK_SIZE)
+    and async=true to run as a background job (202 with the job to poll).
     """
     data = request.json or {}
-    product_id = data.get('product_id')
-    category_id = data.get('category_id')
-
-    if not product_id and not category_id:
-        return jsonify({'error': 'Provide product_id or category_id in JSON body'}), 400
-
-    query = Transaction.query.join(TransactionItem)
-    if product_id:
-        query = query.filter(TransactionItem.product_id == int(product_id))
-    elif category_id:
-        query = query.join(Product).filter(Product.category_id == int(category_id))
-
-    transactions = query.distinct().all()
-    if not transactions:
-        return jsonify({'deleted_count': 0, 'message': 'No matching transactions found'}), 200
-
-    deleted = []
-    failed = {}
-    for t in transactions:
-        ok, err = _remove_transaction(t)
-        if ok:
-            deleted.append(t.id)
-        else:
-            failed[str(t.id)] = err
-
     try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': f'Commit failed: {e}'}), 500
+        params = _delete_filter_params(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if data.get('async'):
+        return job_accepted(enqueue('sales.delete_by_filter', params))
+
+    ids = _matching_transaction_ids(params['product_id'], params['category_id'])
+    if not ids:
+        return jsonify({'deleted_count': 0, 'message': 'No matching transactions found'}), 200
 
+    deleted, failed = _remove_transactions_chunked(ids, params['chunk_size'])
     return jsonify({'deleted_count': len(deleted), 'deleted': deleted, 'failed': failed}), 200
@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify
 from models import db, StoreConfig
+from cache import cached_response, invalidate
 
 settings_bp = Blueprint('settings', __name__)
 
 @settings_bp.route('/', methods=['GET'])
+@cached_response('settings')
 def get_settings():
     config = StoreConfig.query.first()
     if not config:
@@ -29,5 +31,6 @@ def update_settings():
     if 'pic_name' in data:
         config.pic_name = data['pic_name']
         
+    invalidate('settings')
     db.session.commit()
     return jsonify(config.to_dict())
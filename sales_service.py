@@ -0,0 +1,393 @@
+"""Checkout, returns, refund and debt payment, independent of the HTTP layer.
+
+Each operation takes the SQLAlchemy Session to work on as its first
+argument, applies the business rules and leaves the transaction open: the
+caller commits (or rolls back) and turns the result into a response. The
+Flask views in routes/ pass db.session; asgi.py serves the same operations
+from an async stack.
+
+The async variants run the sync implementation on the Session behind an
+AsyncSession (``AsyncSession.run_sync``), so both stacks share one set of
+rules and the same helpers (debt ledger, stock alerts, rollups, cache
+invalidation). Inside run_sync the statements are awaited on the async
+driver (asyncpg, aiosqlite) without blocking the event loop.
+
+Rule violations raise ServiceError with the HTTP status the views return.
+"""
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, select, update
+
+from cache import invalidate
+from debt_ledger import ZERO, current_balance, lock_customers, post_entry, reverse_transactions, to_amount
+from models import (Customer, DebtRecord, Product, SaleReturn, SaleReturnItem, StockHistory, Transaction,
+                    TransactionItem)
+from rollups import record_sales
+from stock_alerts import record_crossings
+
+
+class ServiceError(Exception):
+    """A request the business rules reject; ``status`` is the HTTP status to report."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def deduct_stock(session, quantities):
+    """Atomically deduct stock for {product_id: quantity}.
+
+    Runs a single ``UPDATE product SET stock_quantity = stock_quantity - q
+    WHERE id IN (...) AND stock_quantity >= q`` and checks the rowcount.
+    Returns (True, None) on success, or (False, product) where product is one
+    of the products that no longer has enough stock (None if it vanished).
+    The caller is responsible for rolling back on failure.
+    """
+    deduct = case(quantities, value=Product.id)
+    result = session.execute(
+        update(Product.__table__)
+        .where(Product.id.in_(list(quantities)))
+        .where(Product.stock_quantity >= deduct)
+        .values(stock_quantity=Product.stock_quantity - deduct)
+    )
+    if result.rowcount == len(quantities):
+        return True, None
+
+    short_product = session.query(Product).filter(
+        Product.id.in_(list(quantities)),
+        Product.stock_quantity < deduct
+    ).first()
+    return False, short_product
+
+
+def checkout(session, items, customer_id=None, payment_method='cash', paid_amount=None):
+    """Record a sale of ``items`` (dicts with product_id and quantity).
+
+    Returns the new transaction as a dict. Does not commit; on ServiceError
+    the caller must roll back.
+    """
+    if not items:
+        raise ServiceError('No items in transaction')
+
+    # Merge duplicate product lines so every product is locked and updated once
+    quantities = {}
+    try:
+        for item in items:
+            product_id = int(item['product_id'])
+            quantity = int(item['quantity'])
+            if quantity <= 0:
+                raise ServiceError('quantity must be positive')
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        paid_amount = float(paid_amount) if paid_amount is not None else None
+    except (KeyError, TypeError, ValueError):
+        raise ServiceError('Each item needs an integer product_id and quantity')
+
+    # Fetch every product in the cart with a single query (prices and names)
+    products = {
+        p.id: p for p in session.query(Product).filter(Product.id.in_(list(quantities))).all()
+    }
+
+    total_amount = 0
+    history_rows = []
+    item_rows = []
+
+    # Calculate total and verify stock
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if not product:
+            raise ServiceError(f'Product {product_id} not found', 404)
+
+        if product.stock_quantity < quantity:
+            raise ServiceError(f'Insufficient stock for {product.name}')
+
+        total_amount += product.price * quantity
+
+        history_rows.append({
+            'product_id': product.id,
+            'change_amount': -quantity,
+            'change_type': 'sale',
+            'note': 'Sold in Transaction'
+        })
+        item_rows.append({
+            'product_id': product.id,
+            'quantity': quantity,
+            'price_at_sale': product.price
+        })
+
+    # Deduct stock with one guarded UPDATE. The WHERE clause only matches rows
+    # that still have enough stock, so concurrent checkouts cannot oversell:
+    # if any product lost the race the rowcount comes back short.
+    ok, short_product = deduct_stock(session, quantities)
+    if not ok:
+        name = short_product.name if short_product else 'one or more products'
+        raise ServiceError(f'Insufficient stock for {name}')
+    record_crossings({pid: -qty for pid, qty in quantities.items()}, session)
+
+    # Without an explicit paid_amount (e.g. a simple cash sale) assume full payment
+    if paid_amount is None:
+        paid_amount = total_amount
+
+    if customer_id:
+        customer = session.get(Customer, customer_id)
+        if customer:
+            customer.points += int(total_amount / 10)
+
+    transaction = Transaction(
+        total_amount=total_amount,
+        paid_amount=paid_amount,
+        payment_method=payment_method,
+        customer_id=customer_id
+    )
+    session.add(transaction)
+    session.flush()  # Generate ID
+
+    # Write stock history and transaction items with one bulk insert each
+    for row in item_rows:
+        row['transaction_id'] = transaction.id
+    session.bulk_insert_mappings(StockHistory, history_rows)
+    session.bulk_insert_mappings(TransactionItem, item_rows)
+    record_sales([(transaction.date, payment_method, total_amount, 1, sum(quantities.values()))], session)
+    invalidate('sales', session=session)
+
+    # Post the unpaid part to the customer's debt ledger
+    if customer_id and payment_method == 'debt':
+        debt_amount = to_amount(total_amount - paid_amount)
+        if debt_amount > 0:
+            post_entry(customer_id, debt_amount, 'debt', f'Debt from Transaction #{transaction.id}',
+                       transaction_id=transaction.id, session=session)
+
+    # Serialize before commit: the products are still loaded, so the item
+    # product names come from the identity map instead of extra queries.
+    return transaction.to_dict()
+
+
+def refund_sale(session, transaction_id):
+    """Undo a whole sale and delete its transaction:
+    - revert product stock quantities
+    - add stock history entries describing the revert
+    - adjust customer points
+    - post ledger reversals for its debt records
+    Does not commit.
+    """
+    transaction = session.get(Transaction, transaction_id)
+    if not transaction:
+        raise ServiceError('Transaction not found', 404)
+
+    restored = {}
+    units = 0
+    for item in list(transaction.items):
+        # Units already returned were restocked by return_items
+        quantity = (item.quantity or 0) - (item.returned_quantity or 0)
+        units += quantity
+        product = session.get(Product, item.product_id)
+        if product and quantity:
+            product.stock_quantity = (product.stock_quantity or 0) + quantity
+            restored[product.id] = restored.get(product.id, 0) + quantity
+            session.add(StockHistory(
+                product_id=product.id,
+                change_amount=quantity,
+                change_type='revert_delete',
+                note=f'Reverted by deletion of Transaction #{transaction.id}'
+            ))
+
+    if transaction.customer_id:
+        customer = session.get(Customer, transaction.customer_id)
+        if customer:
+            # Remove points earned from this transaction
+            customer.points = max(0, (customer.points or 0) - int((transaction.total_amount or 0) / 10))
+
+    # Cancel the debt from this transaction; the ledger records are kept
+    reverse_transactions([transaction.id], session)
+    record_crossings(restored, session)
+
+    record_sales([(transaction.date, transaction.payment_method, -(transaction.total_amount or 0), -1, -units)],
+                 session)
+    invalidate('sales', session=session)
+
+    # TransactionItem rows go with it (cascade)
+    delete_returns(session, [transaction.id])
+    session.delete(transaction)
+    session.flush()
+
+
+def return_items(session, transaction_id, items, note=None):
+    """Take back some units of a sale without deleting it.
+
+    ``items`` is a list of dicts with quantity and either transaction_item_id
+    or product_id. In one go:
+      - one guarded UPDATE adds to TransactionItem.returned_quantity, only
+        where the units are still returnable, so concurrent returns of the
+        same line cannot exceed what was sold
+      - one UPDATE restocks the products, with a 'return' StockHistory row
+        per line
+      - the refund (units x price_at_sale) comes off the transaction's
+        total_amount; up to the debt still recorded for the sale, and never
+        more than the customer currently owes, is credited to the customer's
+        ledger, the rest is paid back (paid_amount)
+      - points are recomputed from the new total
+      - the daily rollup of the sale's day is reduced by the refund
+    Returns the SaleReturn as a dict, with the updated transaction. Does not
+    commit; on ServiceError the caller must roll back.
+    """
+    transaction = session.get(Transaction, transaction_id)
+    if not transaction:
+        raise ServiceError('Transaction not found', 404)
+    if not items:
+        raise ServiceError('No items to return')
+
+    lines = session.query(TransactionItem).filter(TransactionItem.transaction_id == transaction_id).all()
+    by_id = {line.id: line for line in lines}
+    by_product = {}
+    for line in lines:
+        by_product.setdefault(line.product_id, []).append(line)
+
+    # Merge the requested units per transaction item
+    quantities = {}
+    for item in items:
+        try:
+            quantity = int(item['quantity'])
+            if item.get('transaction_item_id') is not None:
+                line = by_id.get(int(item['transaction_item_id']))
+            else:
+                matches = by_product.get(int(item['product_id']), [])
+                if len(matches) > 1:
+                    raise ServiceError(f"Product {item['product_id']} is on several lines; give transaction_item_id")
+                line = matches[0] if matches else None
+        except (KeyError, TypeError, ValueError):
+            raise ServiceError('Each item needs a quantity and an integer transaction_item_id or product_id')
+        if line is None:
+            raise ServiceError('Item not found in this transaction', 404)
+        if quantity <= 0:
+            raise ServiceError('quantity must be positive')
+        quantities[line.id] = quantities.get(line.id, 0) + quantity
+
+    for line_id, quantity in quantities.items():
+        line = by_id[line_id]
+        returnable = line.quantity - (line.returned_quantity or 0)
+        if quantity > returnable:
+            raise ServiceError(f'Only {returnable} unit(s) of product {line.product_id} can be returned')
+
+    returned = case(quantities, value=TransactionItem.id)
+    result = session.execute(
+        update(TransactionItem)
+        .where(TransactionItem.id.in_(list(quantities)))
+        .where(TransactionItem.quantity - TransactionItem.returned_quantity >= returned)
+        .values(returned_quantity=TransactionItem.returned_quantity + returned)
+        .execution_options(synchronize_session='fetch')
+    )
+    if result.rowcount != len(quantities):
+        # A concurrent return took some of these units first
+        raise ServiceError('Items were returned concurrently; retry', 409)
+
+    restock = {}
+    history_rows = []
+    now = datetime.utcnow()
+    for line_id, quantity in quantities.items():
+        product_id = by_id[line_id].product_id
+        restock[product_id] = restock.get(product_id, 0) + quantity
+        history_rows.append({
+            'product_id': product_id,
+            'change_amount': quantity,
+            'change_type': 'return',
+            'note': f'Returned from Transaction #{transaction_id}',
+            'timestamp': now
+        })
+    session.execute(
+        update(Product.__table__)
+        .where(Product.id.in_(list(restock)))
+        .values(stock_quantity=func.coalesce(Product.stock_quantity, 0) + case(restock, value=Product.id))
+    )
+    session.bulk_insert_mappings(StockHistory, history_rows)
+    record_crossings(restock, session)
+
+    refund = sum(by_id[line_id].price_at_sale * quantity for line_id, quantity in quantities.items())
+    old_total = transaction.total_amount or 0
+    new_total = old_total - refund
+
+    debt_credit = ZERO
+    if transaction.customer_id:
+        customer = session.get(Customer, transaction.customer_id)
+        if customer:
+            customer.points = max(0, (customer.points or 0) - (int(old_total / 10) - int(new_total / 10)))
+        # Debt still recorded against this sale (its debt, less earlier return credits),
+        # capped at the current balance: debt already paid off is refunded in cash
+        lock_customers([transaction.customer_id], session)
+        owed = session.query(func.sum(DebtRecord.amount)) \
+            .filter(DebtRecord.transaction_id == transaction_id).scalar() or ZERO
+        balance = current_balance(transaction.customer_id, session)
+        debt_credit = max(min(to_amount(refund), to_amount(owed), to_amount(balance)), ZERO)
+        if debt_credit:
+            post_entry(transaction.customer_id, -debt_credit, 'return', f'Return on Transaction #{transaction_id}',
+                       transaction_id=transaction_id, session=session)
+    cash_refund = refund - float(debt_credit)
+
+    transaction.total_amount = new_total
+    transaction.paid_amount = (transaction.paid_amount or 0) - cash_refund
+
+    # The sale keeps its day and its place in the transaction count
+    record_sales([(transaction.date, transaction.payment_method, -refund, 0, -sum(quantities.values()))], session)
+    invalidate('sales', session=session)
+
+    sale_return = SaleReturn(
+        transaction_id=transaction_id,
+        refund_amount=refund,
+        debt_credit=float(debt_credit),
+        cash_refund=cash_refund,
+        note=note,
+        items=[
+            SaleReturnItem(transaction_item_id=line_id, product_id=by_id[line_id].product_id, quantity=quantity,
+                           amount=by_id[line_id].price_at_sale * quantity)
+            for line_id, quantity in quantities.items()
+        ]
+    )
+    session.add(sale_return)
+    session.flush()
+
+    data = sale_return.to_dict()
+    data['transaction'] = transaction.to_dict()
+    return data
+
+
+def delete_returns(session, transaction_ids):
+    """Delete the return records of transactions about to be deleted. Does not commit."""
+    return_ids = select(SaleReturn.id).where(SaleReturn.transaction_id.in_(transaction_ids))
+    session.execute(delete(SaleReturnItem.__table__).where(SaleReturnItem.return_id.in_(return_ids)))
+    session.execute(delete(SaleReturn.__table__).where(SaleReturn.transaction_id.in_(transaction_ids)))
+
+
+def pay_debt(session, customer_id, amount, description='Debt Payment'):
+    """Record a debt payment; returns the customer's new balance. Does not commit."""
+    if session.get(Customer, customer_id) is None:
+        raise ServiceError('Customer not found', 404)
+    try:
+        amount = to_amount(amount)
+    except ValueError:
+        raise ServiceError('Invalid amount')
+    if amount <= 0:
+        raise ServiceError('Invalid amount')
+
+    lock_customers([customer_id], session)
+    if amount > current_balance(customer_id, session):
+        raise ServiceError('Payment exceeds total debt')
+    return post_entry(customer_id, -amount, 'payment', description, session=session)  # Negative for payment
+
+
+async def checkout_async(session, *args, **kwargs):
+    """checkout() on an AsyncSession."""
+    return await session.run_sync(checkout, *args, **kwargs)
+
+
+async def refund_sale_async(session, transaction_id):
+    """refund_sale() on an AsyncSession."""
+    return await session.run_sync(refund_sale, transaction_id)
+
+
+async def return_items_async(session, *args, **kwargs):
+    """return_items() on an AsyncSession."""
+    return await session.run_sync(return_items, *args, **kwargs)
+
+
+async def pay_debt_async(session, *args, **kwargs):
+    """pay_debt() on an AsyncSession."""
+    return await session.run_sync(pay_debt, *args, **kwargs)
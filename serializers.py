@@ -0,0 +1,143 @@
+"""Fast serialization path for list endpoints.
+
+List endpoints select only the columns they return, as plain row tuples,
+and turn each row into the same dict shape as the matching ``to_dict`` in
+models.py. This skips ORM object hydration and lazy loads. Responses are
+encoded with orjson when it is installed (optional dependency), falling back
+to the stdlib json module with Flask's default settings (sorted keys,
+compact separators).
+
+Keep the *_COLUMNS tuples and *_dict functions in step with the to_dict
+methods: clients must not be able to tell which path produced a response.
+"""
+import json
+
+from flask import current_app
+
+from models import Category, Customer, Product, StockHistory, Transaction, TransactionItem
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def dumps(data):
+    """Encode ``data`` to JSON bytes (keys sorted, like Flask's jsonify)."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=True).encode('utf-8')
+
+
+def json_response(data, status=200):
+    """Drop-in for ``jsonify(data)`` using the fastest available encoder."""
+    return current_app.response_class(dumps(data), status=status, mimetype='application/json')
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+# Product.to_dict. Category.name is labelled so that row.name stays the product's
+# name: the catalogue's keyset cursor is built from it
+PRODUCT_COLUMNS = (
+    Product.id, Product.name, Product.sku, Product.price, Product.stock_quantity,
+    Product.low_stock_threshold, Category.name.label('category_name'), Product.category_id
+)
+
+
+def product_dict(row):
+    return {
+        'id': row[0],
+        'name': row[1],
+        'sku': row[2],
+        'price': row[3],
+        'stock_quantity': row[4],
+        'low_stock_threshold': row[5],
+        'category_name': row[6],
+        'category_id': row[7]
+    }
+
+
+# Transaction.to_dict without items (see transaction_dicts)
+TRANSACTION_COLUMNS = (
+    Transaction.id, Transaction.date, Transaction.total_amount, Transaction.paid_amount,
+    Transaction.payment_method, Transaction.customer_id
+)
+
+# TransactionItem.to_dict, prefixed with the transaction id for grouping
+TRANSACTION_ITEM_COLUMNS = (
+    TransactionItem.transaction_id, TransactionItem.product_id, Product.name,
+    TransactionItem.quantity, TransactionItem.price_at_sale, TransactionItem.returned_quantity
+)
+
+
+def transaction_dicts(session, rows):
+    """Build Transaction.to_dict shapes for ``rows`` (TRANSACTION_COLUMNS tuples)
+    with one extra query for all of their items."""
+    result = []
+    by_id = {}
+    for row in rows:
+        data = {
+            'id': row[0],
+            'date': _iso(row[1]),
+            'total_amount': row[2],
+            'paid_amount': row[3],
+            'payment_method': row[4],
+            'customer_id': row[5],
+            'items': []
+        }
+        by_id[row[0]] = data
+        result.append(data)
+    if not by_id:
+        return result
+
+    items = session.query(*TRANSACTION_ITEM_COLUMNS) \
+        .outerjoin(Product, Product.id == TransactionItem.product_id) \
+        .filter(TransactionItem.transaction_id.in_(list(by_id))) \
+        .order_by(TransactionItem.id)
+    for transaction_id, product_id, product_name, quantity, price_at_sale, returned_quantity in items:
+        by_id[transaction_id]['items'].append({
+            'product_id': product_id,
+            'product_name': product_name if product_name is not None else 'Unknown',
+            'quantity': quantity,
+            'price_at_sale': price_at_sale,
+            'returned_quantity': returned_quantity or 0
+        })
+    return result
+
+
+# StockHistory.to_dict
+STOCK_HISTORY_COLUMNS = (
+    StockHistory.id, StockHistory.product_id, Product.name, StockHistory.change_amount,
+    StockHistory.change_type, StockHistory.timestamp, StockHistory.note
+)
+
+
+def stock_history_dict(row):
+    return {
+        'id': row[0],
+        'product_id': row[1],
+        'product_name': row[2] if row[2] is not None else 'Unknown',
+        'change_amount': row[3],
+        'change_type': row[4],
+        'timestamp': _iso(row[5]),
+        'note': row[6]
+    }
+
+
+# Customer.to_dict
+CUSTOMER_COLUMNS = (
+    Customer.id, Customer.name, Customer.email, Customer.phone, Customer.points, Customer.total_debt
+)
+
+
+def customer_dict(row):
+    return {
+        'id': row[0],
+        'name': row[1],
+        'email': row[2],
+        'phone': row[3],
+        'points': row[4],
+        'total_debt': float(row[5] or 0)
+    }
@@ -0,0 +1,185 @@
+"""Low-stock threshold crossings and the event feed behind /api/products/low-stock.
+
+A product is low on stock when ``stock_quantity <= low_stock_threshold``.
+Code paths that change stock record a StockAlert row whenever a product
+crosses its threshold, in either direction, in the same database
+transaction as the change. Alerts therefore commit or roll back with the
+sale or update itself:
+  - record_crossings(deltas): set-based, after a bulk stock UPDATE
+  - record_transition(product, was_low): one ORM-loaded product
+
+Feed readers (SSE and long-poll) read alerts after a given feed position
+(``seq``), not after an id: ids are taken when the row is inserted, so on
+PostgreSQL a transaction holding a lower id can commit after a reader has
+already passed a higher one. sequence_alerts numbers alerts once they are
+visible, one reader at a time, so anything committed later always gets a
+higher seq and no alert is skipped.
+
+Commits in this process wake readers immediately via an after_commit hook.
+Alerts committed by other workers are picked up by polling every
+POLL_INTERVAL seconds, so no shared broker is needed.
+"""
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, case, event, func, insert, literal, or_, select, text, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from models import db, Product, StockAlert
+
+POLL_INTERVAL = 2        # seconds between database checks while a reader waits
+MAX_WAIT = 30            # longest long-poll wait, in seconds
+KEEPALIVE_INTERVAL = 15  # seconds between SSE keep-alive comments
+FEED_BATCH = 500         # most alerts returned per read
+
+_PENDING_KEY = 'stock_alerts_pending'
+# pg_advisory_xact_lock key serialising sequence_alerts across workers
+_SEQUENCE_LOCK = 0x53544b41
+_new_alerts = threading.Condition()
+
+
+def is_low(stock_quantity, threshold):
+    return threshold is not None and stock_quantity is not None and stock_quantity <= threshold
+
+
+def _mark_pending(session=None):
+    (session or db.session).info[_PENDING_KEY] = True
+
+
+def record_crossings(deltas, session=None):
+    """Record alerts for products whose stock change crossed the threshold.
+
+    ``deltas`` maps product_id to the change just applied to stock_quantity
+    (negative for sales). The previous stock is derived as stock - delta
+    inside one INSERT ... SELECT, so the check sees the committed-to values
+    even under concurrent sales. Call after the stock UPDATE; does not commit.
+    """
+    deltas = {pid: delta for pid, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    session = session or db.session
+    session.flush()
+    stock = Product.stock_quantity
+    threshold = Product.low_stock_threshold
+    previous = stock - case(deltas, value=Product.id)
+    result = session.execute(
+        insert(StockAlert.__table__).from_select(
+            ['product_id', 'kind', 'stock_quantity', 'low_stock_threshold', 'created_at'],
+            select(
+                Product.id,
+                case((stock <= threshold, literal('low')), else_=literal('recovered')),
+                stock,
+                threshold,
+                literal(datetime.utcnow())
+            ).where(
+                Product.id.in_(list(deltas)),
+                or_(and_(stock <= threshold, previous > threshold),
+                    and_(stock > threshold, previous <= threshold))
+            )
+        )
+    )
+    if result.rowcount:
+        _mark_pending(session)
+    return result.rowcount
+
+
+def record_transition(product, was_low):
+    """Record an alert if ``product`` (already modified in the session) is now
+    on the other side of its threshold than ``was_low``. Does not commit."""
+    now_low = is_low(product.stock_quantity, product.low_stock_threshold)
+    if now_low == was_low:
+        return False
+    db.session.add(StockAlert(
+        product_id=product.id,
+        kind='low' if now_low else 'recovered',
+        stock_quantity=product.stock_quantity,
+        low_stock_threshold=product.low_stock_threshold
+    ))
+    _mark_pending()
+    return True
+
+
+def sequence_alerts():
+    """Give committed alerts without a feed position the next seq numbers.
+
+    Only committed rows are visible here, so an alert whose transaction
+    commits later is numbered by a later call, after everything already
+    delivered. Runs in its own short transaction; on PostgreSQL an advisory
+    lock keeps concurrent readers from numbering at the same time (on SQLite
+    the write lock does, and the losing reader just skips this round).
+    """
+    session = db.session
+    pending = [alert_id for (alert_id,) in session.query(StockAlert.id)
+               .filter(StockAlert.seq.is_(None)).order_by(StockAlert.id).limit(FEED_BATCH)]
+    if not pending:
+        return
+    try:
+        if session.get_bind().dialect.name == 'postgresql':
+            session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': _SEQUENCE_LOCK})
+            # Another reader may have numbered them while we waited for the lock
+            pending = [alert_id for (alert_id,) in session.query(StockAlert.id)
+                       .filter(StockAlert.seq.is_(None)).order_by(StockAlert.id).limit(FEED_BATCH)]
+        if pending:
+            last = session.query(func.max(StockAlert.seq)).scalar() or 0
+            positions = {alert_id: last + i for i, alert_id in enumerate(pending, start=1)}
+            session.execute(
+                update(StockAlert.__table__)
+                .where(StockAlert.id.in_(pending), StockAlert.seq.is_(None))
+                .values(seq=case(positions, value=StockAlert.id))
+            )
+        session.commit()
+    except DBAPIError:
+        # Lost the race to a concurrent reader, which numbers them instead
+        session.rollback()
+
+
+def latest_alert_id():
+    """The newest feed position (seq); readers start after it."""
+    sequence_alerts()
+    return db.session.query(func.max(StockAlert.seq)).scalar() or 0
+
+
+def fetch_alerts(after_seq, limit=FEED_BATCH):
+    """Alerts with seq > after_seq in feed order, with the product name joined in."""
+    sequence_alerts()
+    rows = db.session.query(StockAlert, Product.name) \
+        .outerjoin(Product, Product.id == StockAlert.product_id) \
+        .filter(StockAlert.seq > after_seq) \
+        .order_by(StockAlert.seq) \
+        .limit(limit) \
+        .all()
+    alerts = []
+    for alert, product_name in rows:
+        data = alert.to_dict()
+        data['product_name'] = product_name if product_name is not None else 'Unknown'
+        alerts.append(data)
+    # End the read transaction so an idle reader does not hold a connection
+    db.session.close()
+    return alerts
+
+
+def wait_for_alerts(after_seq, timeout):
+    """Return alerts after ``after_seq``, waiting up to ``timeout`` seconds for
+    the first one. Returns an empty list on timeout."""
+    deadline = time.monotonic() + timeout
+    while True:
+        alerts = fetch_alerts(after_seq)
+        time_left = deadline - time.monotonic()
+        if alerts or time_left <= 0:
+            return alerts
+        with _new_alerts:
+            _new_alerts.wait(min(POLL_INTERVAL, time_left))
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_after_commit(session):
+    if session.info.pop(_PENDING_KEY, None):
+        with _new_alerts:
+            _new_alerts.notify_all()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,129 @@
+"""
+Stress harness: concurrent checkouts must never oversell.
+
+Spawns several threads that all try to buy the same product through
+POST /api/sales/ and then checks that:
+ - the final stock is never negative
+ - units sold (successful sales) == initial stock - final stock
+ - the StockHistory ledger agrees with the product row
+
+With STRESS_RETRIES=N every checkout carries an Idempotency-Key and is
+sent N extra times, the way a till resends after a timeout; retries must
+replay the original sale instead of selling again.
+
+By default it runs against a throw-away SQLite file. Point it at a local
+PostgreSQL database to exercise real row-level concurrency:
+    DATABASE_URL=postgresql://postgres:pw@localhost:5432/store_stress python stress_checkout.py
+
+Never run it against a database that holds real data: it creates its own
+tables and rows.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'stress.db')
+
+from app import app
+from models import db, Category, Product, StockHistory
+from sqlalchemy import func
+
+THREADS = int(os.getenv('STRESS_THREADS', 8))
+ATTEMPTS_PER_THREAD = int(os.getenv('STRESS_ATTEMPTS', 50))
+INITIAL_STOCK = int(os.getenv('STRESS_STOCK', 200))
+RETRIES = int(os.getenv('STRESS_RETRIES', 0))
+
+
+def setup():
+    with app.app_context():
+        db.create_all()
+        category = Category.query.filter_by(name='Stress').first()
+        if not category:
+            category = Category(name='Stress')
+            db.session.add(category)
+            db.session.flush()
+        product = Product(
+            name='Stress Item',
+            sku=f'STRESS-{int(time.time() * 1000)}',
+            price=1000,
+            stock_quantity=INITIAL_STOCK,
+            category_id=category.id
+        )
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+
+
+def worker(product_id, counters, sales, lock):
+    client = app.test_client()
+    for attempt in range(ATTEMPTS_PER_THREAD):
+        headers = {'Idempotency-Key': f'stress-{threading.get_ident()}-{attempt}'} if RETRIES else {}
+        for _ in range(1 + RETRIES):
+            resp = client.post('/api/sales/', json={'items': [{'product_id': product_id, 'quantity': 1}]},
+                               headers=headers)
+            with lock:
+                if resp.status_code == 201 and resp.headers.get('Idempotent-Replayed'):
+                    counters['replayed'] += 1
+                    if resp.json['id'] not in sales:
+                        counters['errors'] += 1
+                elif resp.status_code == 201:
+                    counters['sold'] += 1
+                    sales.add(resp.json['id'])
+                elif resp.status_code == 400:
+                    counters['rejected'] += 1
+                else:
+                    counters['errors'] += 1
+
+
+def run():
+    product_id = setup()
+    counters = {'sold': 0, 'replayed': 0, 'rejected': 0, 'errors': 0}
+    sales = set()
+    lock = threading.Lock()
+    threads = [threading.Thread(target=worker, args=(product_id, counters, sales, lock)) for _ in range(THREADS)]
+
+    print(f"Database: {os.environ['DATABASE_URL']}")
+    print(f"{THREADS} threads x {ATTEMPTS_PER_THREAD} attempts against stock of {INITIAL_STOCK}"
+          + (f", each resent {RETRIES}x with an Idempotency-Key" if RETRIES else ''))
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        final_stock = db.session.get(Product, product_id).stock_quantity
+        ledger = db.session.query(func.sum(StockHistory.change_amount)).filter(
+            StockHistory.product_id == product_id,
+            StockHistory.change_type == 'sale'
+        ).scalar() or 0
+
+    print(f"Sold: {counters['sold']}  Replayed: {counters['replayed']}  "
+          f"Rejected (insufficient stock): {counters['rejected']}  Errors: {counters['errors']}")
+    print(f"Final stock: {final_stock}  Ledger sales: {-ledger}")
+    print(f"Elapsed: {elapsed:.2f}s  Throughput: {counters['sold'] / elapsed:.1f} sales/s")
+
+    failures = []
+    if final_stock < 0:
+        failures.append('stock went negative')
+    if counters['sold'] != INITIAL_STOCK - final_stock:
+        failures.append('units sold does not match stock decrease')
+    if -ledger != counters['sold']:
+        failures.append('stock history does not match units sold')
+    if counters['errors']:
+        failures.append('unexpected responses (or a replay of an unknown sale)')
+
+    if failures:
+        print('FAILED: ' + '; '.join(failures))
+        return 1
+    print('SUCCESS: no oversell.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -17,7 +17,7 @@ def upgrade_db():
 
     if 'total_debt' not in columns:
         try:
-            cursor.execute("ALTER TABLE customer ADD COLUMN total_debt FLOAT DEFAULT 0.0")
+            cursor.execute("ALTER TABLE customer ADD COLUMN total_debt NUMERIC(12, 2) DEFAULT 0")
             print("Added total_debt to customer")
         except Exception as e:
             print(f"Error adding total_debt: {e}")
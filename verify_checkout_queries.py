@@ -0,0 +1,88 @@
+"""
+Regression check: checkout must run a constant number of SQL statements.
+
+POST /api/sales/ loads the cart's products with one query and writes the
+stock, history and item rows with one statement each, so the statement
+count must not grow with the number of lines in the cart. This script
+checks out carts of 1, 10 and 60 lines, for a cash sale and for a debt
+sale with a customer, while counting every statement with a
+before_cursor_execute listener. It exits with status 1 if the counts for
+one kind of sale differ between cart sizes.
+
+By default it uses a temporary SQLite file. To check PostgreSQL, point it
+at an EMPTY scratch database (it creates and fills its own tables):
+    DATABASE_URL=postgresql://postgres:pw@localhost:5432/store_queries python verify_checkout_queries.py
+"""
+import os
+import sys
+import tempfile
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'queries.db')
+
+from sqlalchemy import event
+
+from app import app
+from models import db, Category, Customer, Product
+
+CART_SIZES = (1, 10, 60)
+
+
+def seed():
+    db.create_all()
+    category = Category(name='Queries')
+    db.session.add(category)
+    db.session.flush()
+    db.session.execute(Product.__table__.insert(), [
+        {'name': f'Product {i}', 'sku': f'QRY-{i}', 'price': 10.0, 'stock_quantity': 1000,
+         'low_stock_threshold': 10, 'category_id': category.id}
+        for i in range(1, max(CART_SIZES) + 1)
+    ])
+    customer = Customer(name='Queries', phone='0800000000', email='queries@example.com')
+    db.session.add(customer)
+    db.session.commit()
+    return customer.id
+
+
+def run():
+    with app.app_context():
+        customer_id = seed()
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        client = app.test_client()
+        # Once-per-process start-up work (e.g. resuming queued jobs) is not part of checkout
+        client.get('/api/settings/')
+        event.listen(db.engine, 'before_cursor_execute', count)
+        failures = []
+        sales = {
+            'cash sale': {'payment_method': 'cash'},
+            'debt sale with customer': {'payment_method': 'debt', 'customer_id': customer_id, 'paid_amount': 0},
+        }
+        for description, extra in sales.items():
+            counts = []
+            for size in CART_SIZES:
+                items = [{'product_id': pid, 'quantity': 1} for pid in range(1, size + 1)]
+                statements.clear()
+                resp = client.post('/api/sales/', json=dict(extra, items=items))
+                if resp.status_code != 201:
+                    print(f'{description:<25} {size:3d} lines  HTTP {resp.status_code}: {resp.json}')
+                    failures.append(description)
+                    break
+                counts.append(len(statements))
+                print(f'{description:<25} {size:3d} lines  {len(statements):3d} statements')
+            if len(set(counts)) > 1:
+                failures.append(description)
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    if failures:
+        print('FAILED: statement count depends on cart size for: ' + '; '.join(failures))
+        return 1
+    print('SUCCESS: checkout runs a constant number of statements.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,153 @@
+"""
+Regression check: hot endpoints must not fall back to full table scans.
+
+Seeds a throw-away database with a realistically large dataset, calls each
+hot endpoint through the Flask test client while recording the SELECT
+statements it runs, then EXPLAINs every statement. The script exits with
+status 1 if any plan contains a full scan of one of the large tables
+(SQLite: "SCAN <table>" without an index; PostgreSQL: "Seq Scan on <table>").
+
+By default it uses a temporary SQLite file. To check PostgreSQL plans, point
+it at an EMPTY scratch database (it creates and fills its own tables):
+    DATABASE_URL=postgresql://postgres:pw@localhost:5432/store_explain python verify_indexes.py
+"""
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'explain.db')
+
+from sqlalchemy import event
+
+from app import app
+from models import db, Category, Product, Customer, Transaction, TransactionItem, StockHistory, DebtRecord
+
+LARGE_TABLES = {'customer', 'product', 'stock_alert', 'transaction', 'transaction_item', 'stock_history', 'debt_record',
+                'sale_return', 'sale_return_item'}
+PRODUCTS = 200
+CUSTOMERS = 5000
+TRANSACTIONS = 20000
+
+
+def seed():
+    db.create_all()
+    category = Category(name='Explain')
+    db.session.add(category)
+    db.session.flush()
+    db.session.execute(Product.__table__.insert(), [
+        {'name': f'Product {i}', 'sku': f'EXP-{i}', 'price': 1000.0, 'stock_quantity': 100,
+         'low_stock_threshold': 10, 'category_id': category.id}
+        for i in range(1, PRODUCTS + 1)
+    ])
+    db.session.execute(Customer.__table__.insert(), [
+        {'name': f'Customer {i}', 'phone': f'08{i:06d}', 'email': f'customer{i}@example.com',
+         'points': i % 97, 'total_debt': i % 13} for i in range(1, CUSTOMERS + 1)
+    ])
+
+    start = datetime.utcnow() - timedelta(days=365)
+    transactions, items, history, debts = [], [], [], []
+    for tid in range(1, TRANSACTIONS + 1):
+        date = start + timedelta(minutes=26 * tid)
+        customer_id = tid % CUSTOMERS + 1 if tid % 3 == 0 else None
+        transactions.append({'id': tid, 'date': date, 'total_amount': 2000.0, 'paid_amount': 2000.0,
+                             'payment_method': 'debt' if customer_id else 'cash', 'customer_id': customer_id})
+        for pid in (tid % PRODUCTS + 1, (tid * 7) % PRODUCTS + 1):
+            items.append({'transaction_id': tid, 'product_id': pid, 'quantity': 1, 'price_at_sale': 1000.0})
+            history.append({'product_id': pid, 'change_amount': -1, 'change_type': 'sale',
+                            'note': 'Sold in Transaction', 'timestamp': date})
+        if tid % 50 == 0:
+            history.append({'product_id': tid % PRODUCTS + 1, 'change_amount': 20, 'change_type': 'restock',
+                            'note': 'Restock', 'timestamp': date})
+        if customer_id:
+            debts.append({'customer_id': customer_id, 'transaction_id': tid, 'amount': 500.0,
+                          'type': 'debt', 'description': f'Debt from Transaction #{tid}', 'date': date})
+
+    db.session.execute(Transaction.__table__.insert(), transactions)
+    db.session.execute(TransactionItem.__table__.insert(), items)
+    db.session.execute(StockHistory.__table__.insert(), history)
+    db.session.execute(DebtRecord.__table__.insert(), debts)
+    db.session.commit()
+
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('ANALYZE')
+            conn.commit()
+
+
+def full_scans(statement, parameters):
+    """Return the large tables that this SELECT reads with a full scan."""
+    dialect = db.engine.dialect.name
+    with db.engine.connect() as conn:
+        if dialect == 'sqlite':
+            plan = [row[3] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+            pattern = re.compile(r'^SCAN (\w+)(?!.*USING)')
+        else:
+            plan = [row[0] for row in conn.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+            pattern = re.compile(r'Seq Scan on "?(\w+)"?')
+    scans = set()
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match and match.group(1) in LARGE_TABLES:
+            scans.add(match.group(1))
+    return scans
+
+
+def run():
+    # (description, method, url) for every hot path that touches a large table
+    checks = [
+        ('sales list', 'get', '/api/sales/'),
+        ('sales by customer', 'get', '/api/sales/?customer_id=3'),
+        ('sales by product', 'get', '/api/sales/?product_id=5'),
+        ('sales by date range', 'get', f'/api/sales/?start_date={(datetime.utcnow() - timedelta(days=7)).date()}'),
+        ('product stock history', 'get', '/api/history/product/5'),
+        ('restock feed', 'get', '/api/history/restocks'),
+        ('low stock list', 'get', '/api/products/low-stock'),
+        ('low stock alert feed', 'get', '/api/products/low-stock/events?after=0&timeout=0'),
+        ('customer debt history', 'get', '/api/customers/3/debt_history'),
+        ('customer debt balance', 'get', '/api/customers/3/balance'),
+        ('customer list', 'get', '/api/customers/'),
+        ('customer search', 'get', '/api/customers/?q=customer12'),
+        ('customer search by phone', 'get', '/api/customers/?q=080012'),
+        ('customers by debt', 'get', '/api/customers/?sort=debt'),
+        ('customers by points with stats', 'get', '/api/customers/?sort=points&stats=true'),
+        ('delete product with sales (item lookup)', 'delete', '/api/products/5'),
+        ('returns of a sale', 'get', f'/api/sales/{TRANSACTIONS - 5}/returns'),
+        ('delete sale (debt record lookup)', 'delete', f'/api/sales/{TRANSACTIONS - 3}'),
+    ]
+
+    with app.app_context():
+        seed()
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                captured.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        client = app.test_client()
+        failures = []
+        for description, method, url in checks:
+            captured.clear()
+            resp = getattr(client, method)(url)
+            statements = list(captured)
+            scanned = set()
+            for statement, parameters in statements:
+                scanned |= full_scans(statement, parameters)
+            status = 'FULL SCAN of ' + ', '.join(sorted(scanned)) if scanned else 'ok'
+            print(f'{description:<45} HTTP {resp.status_code}  {len(statements):3d} selects  {status}')
+            if scanned:
+                failures.append(description)
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    if failures:
+        print('FAILED: full table scans in: ' + '; '.join(failures))
+        return 1
+    print('SUCCESS: all hot paths use indexes.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
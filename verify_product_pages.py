@@ -0,0 +1,90 @@
+"""
+Regression check: paging through GET /api/products/ returns every product
+exactly once.
+
+The catalogue is ordered by (name, id) and paged with X-Next-Cursor. The
+script creates products whose names interleave with their categories'
+names (and some duplicate names), then follows the cursor with a small
+limit over the whole catalogue, a name search and the low-stock list. It
+exits with status 1 if a product is missing or repeated, or if the cursor
+never runs out.
+
+By default it uses a temporary SQLite file. To check PostgreSQL, point it
+at an EMPTY scratch database (it creates and fills its own tables):
+    DATABASE_URL=postgresql://postgres:pw@localhost:5432/store_pages python verify_product_pages.py
+"""
+import os
+import sys
+import tempfile
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'pages.db')
+os.environ['CACHE_ENABLED'] = 'false'
+
+from app import app
+from models import db, Category, Product
+
+PAGE_SIZE = 3
+NAMES = ['Apple', 'Bread', 'Cheese', 'Dates', 'Eggs', 'Flour', 'Grapes', 'Apple', 'Milk', 'Zucchini']
+
+
+def seed():
+    db.create_all()
+    # Category names sort between the product names, so a cursor built from the
+    # wrong column jumps around the catalogue
+    categories = [Category(name=name) for name in ('Bakery', 'Food', 'Produce')]
+    db.session.add_all(categories)
+    db.session.flush()
+    for i, name in enumerate(NAMES):
+        db.session.add(Product(name=name, sku=f'PAGE-{i}', price=1.0, stock_quantity=i,
+                               low_stock_threshold=5, category_id=categories[i % len(categories)].id))
+    db.session.commit()
+    return {
+        'catalogue': [p.id for p in Product.query],
+        'search "a"': [p.id for p in Product.query.filter(Product.name.like('A%'))],
+        'low stock': [p.id for p in Product.query.filter(Product.stock_quantity <= Product.low_stock_threshold)],
+    }
+
+
+def walk(client, url):
+    """Follow X-Next-Cursor from ``url``; returns the ids seen, in order."""
+    seen = []
+    cursor = None
+    for _ in range(len(NAMES) + 2):
+        separator = '&' if '?' in url else '?'
+        resp = client.get(f'{url}{separator}limit={PAGE_SIZE}' + (f'&cursor={cursor}' if cursor else ''))
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+        seen += [p['id'] for p in resp.json]
+        cursor = resp.headers.get('X-Next-Cursor')
+        if not cursor:
+            return seen
+    return None
+
+
+def run():
+    with app.app_context():
+        expected = seed()
+    client = app.test_client()
+    urls = {'catalogue': '/api/products/', 'search "a"': '/api/products/?q=a', 'low stock': '/api/products/low-stock'}
+    failures = []
+    for label, url in urls.items():
+        seen = walk(client, url)
+        if seen is None:
+            print(f'{label:<12} cursor never ran out')
+            failures.append(label)
+            continue
+        ok = sorted(seen) == sorted(expected[label])
+        print(f'{label:<12} {len(seen):3d} rows in pages of {PAGE_SIZE}, expected {len(expected[label]):3d}  '
+              f'{"ok" if ok else "MISMATCH " + str(seen)}')
+        if not ok:
+            failures.append(label)
+
+    if failures:
+        print('FAILED: paging lost or repeated products for: ' + '; '.join(failures))
+        return 1
+    print('SUCCESS: every product appears exactly once.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,130 @@
+"""
+Check read-replica routing (see replicas.py) against two local databases.
+
+The "primary" and "replica" are two independent databases with the same
+schema and different marker rows, so every response shows where its reads
+went. The script exits with status 1 if any check fails:
+  - @replica_reads list/analytics endpoints read from the replica;
+  - writes and undecorated endpoints use the primary;
+  - a request that has written reads its own writes from the primary;
+  - an unreachable replica falls back to the primary and is skipped until
+    REPLICA_RETRY_SECONDS have passed.
+
+By default it uses two temporary SQLite files. To run it on PostgreSQL, point
+it at two EMPTY scratch databases (it creates and fills its own tables):
+    DATABASE_URL=postgresql://postgres:pw@localhost:5432/store_primary \\
+    DATABASE_REPLICA_URL=postgresql://postgres:pw@localhost:5432/store_replica python verify_replica.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+PRIMARY_URL = os.getenv('DATABASE_URL') or 'sqlite:///' + os.path.join(_tmp, 'primary.db')
+REPLICA_URL = os.getenv('DATABASE_REPLICA_URL') or 'sqlite:///' + os.path.join(_tmp, 'replica.db')
+UNREACHABLE_URL = 'sqlite:///' + os.path.join(_tmp, 'missing-dir', 'replica.db')
+
+from sqlalchemy import event
+
+import replicas
+from app import create_app
+from models import db, Category, Product, StoreConfig
+from replicas import REPLICA_BIND, replica_reads
+
+
+def make_app(replica_url, retry_seconds=30):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': PRIMARY_URL,
+        'SQLALCHEMY_BINDS': {REPLICA_BIND: replica_url},
+        'REPLICA_RETRY_SECONDS': retry_seconds,
+        'AUTO_CREATE_TABLES': False,
+        'CACHE_ENABLED': False,
+    })
+
+
+def seed(engine, marker, products):
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        category_id = conn.execute(Category.__table__.insert().values(name=f'{marker} category')) \
+            .inserted_primary_key[0]
+        conn.execute(Product.__table__.insert(), [
+            {'name': f'{marker} product {i}', 'sku': f'{marker}-{i}', 'price': 10.0, 'stock_quantity': 5,
+             'low_stock_threshold': 10, 'category_id': category_id}
+            for i in range(products)
+        ])
+        conn.execute(StoreConfig.__table__.insert().values(store_name=f'{marker} store'))
+
+
+def count_statements(engines):
+    counts = {name: 0 for name in engines}
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args, name=name: counts.__setitem__(name, counts[name] + 1))
+    return counts
+
+
+def run():
+    failures = []
+
+    def check(description, ok, detail=''):
+        print(f'{description:<60} {"ok" if ok else "FAILED"}  {detail}')
+        if not ok:
+            failures.append(description)
+
+    app = make_app(REPLICA_URL)
+    with app.app_context():
+        engines = {'primary': db.engines[None], 'replica': db.engines[REPLICA_BIND]}
+        seed(engines['primary'], 'Primary', 1)
+        seed(engines['replica'], 'Replica', 2)
+        counts = count_statements(engines)
+    client = app.test_client()
+
+    names = [p['name'] for p in client.get('/api/products/').json]
+    check('GET /api/products/ reads the replica', names and all(n.startswith('Replica') for n in names), names)
+    summary = client.get('/api/analytics/summary').json
+    check('GET /api/analytics/summary reads the replica', summary['total_products'] == 2, summary)
+    check('GET /api/settings/ (undecorated) reads the primary',
+          client.get('/api/settings/').json['store_name'] == 'Primary store')
+
+    before = dict(counts)
+    resp = client.post('/api/products/categories', json={'name': 'New'})
+    check('POST /api/products/categories writes to the primary',
+          resp.status_code == 201 and counts['replica'] == before['replica'], resp.status_code)
+
+    @replica_reads
+    def write_then_read():
+        db.session.add(Category(name='Sticky'))
+        db.session.flush()
+        return [name for (name,) in db.session.query(Product.name)]
+
+    with app.test_request_context('/', method='GET'):
+        names = write_then_read()
+        db.session.rollback()
+    check('reads after a write in the same request use the primary', names == ['Primary product 0'], names)
+
+    # Replica that cannot be reached: fall back, then skip it until the retry interval passes
+    replicas._down_until = 0.0
+    app = make_app(UNREACHABLE_URL, retry_seconds=1)
+    client = app.test_client()
+    resp = client.get('/api/products/')
+    names = [p['name'] for p in resp.json] if resp.status_code == 200 else resp.status_code
+    check('unreachable replica falls back to the primary', names == ['Primary product 0'], names)
+    check('unreachable replica is taken out of rotation', not replicas.replica_available())
+    attempts = []
+    with app.app_context():
+        event.listen(db.engines[REPLICA_BIND], 'handle_error', attempts.append)
+    client.get('/api/products/')
+    check('while out of rotation the replica is not tried', not attempts, f'{len(attempts)} failed attempt(s)')
+    time.sleep(1.1)
+    check('replica is retried after REPLICA_RETRY_SECONDS', replicas.replica_available())
+
+    if failures:
+        print(f'FAILED: {len(failures)} check(s)')
+        return 1
+    print('SUCCESS: reads are routed to the replica with primary fallback.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,99 @@
+"""
+Regression check: returns on debt sales never credit more than the
+customer owes.
+
+A return on a debt sale is credited to the customer's ledger up to the
+debt still recorded for that sale, and never more than the customer's
+current balance; the rest is refunded in cash. The script runs three
+returns through POST /api/sales/<id>/returns:
+  - on an unpaid debt sale (all credited to the ledger),
+  - after the customer paid the debt off (all refunded in cash),
+  - after a partial payment (credit capped at the remaining balance),
+and checks the SaleReturn split, the customer's balance and total_debt,
+and that the ledger still reconciles. Exits with status 1 on a mismatch.
+
+By default it uses a temporary SQLite file. To check PostgreSQL, point it
+at an EMPTY scratch database (it creates and fills its own tables):
+    DATABASE_URL=postgresql://postgres:pw@localhost:5432/store_returns python verify_returns.py
+"""
+import os
+import sys
+import tempfile
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'returns.db')
+os.environ['CACHE_ENABLED'] = 'false'
+
+from app import app
+from debt_ledger import check_ledger, current_balance
+from models import db, Category, Customer, Product
+
+
+def seed():
+    db.create_all()
+    category = Category(name='Returns')
+    db.session.add(category)
+    db.session.flush()
+    product = Product(name='Returnable', sku='RET-1', price=10.0, stock_quantity=100, category_id=category.id)
+    db.session.add(product)
+    db.session.flush()
+    product_id = product.id
+    customers = {}
+    for name in ('unpaid', 'paid off', 'part paid'):
+        customer = Customer(name=name, phone=f'080{len(customers)}')
+        db.session.add(customer)
+        db.session.flush()
+        customers[name] = customer.id
+    db.session.commit()
+    return product_id, customers
+
+
+def run():
+    with app.app_context():
+        product_id, customers = seed()
+    client = app.test_client()
+    # (customer, payment before the return, expected debt credit, expected cash refund, expected balance after)
+    cases = [
+        ('unpaid', 0, 20.0, 0.0, 30.0),
+        ('paid off', 50, 0.0, 20.0, 0.0),
+        ('part paid', 40, 10.0, 10.0, 0.0),
+    ]
+    failures = []
+    for name, payment, expected_credit, expected_cash, expected_balance in cases:
+        customer_id = customers[name]
+        sale = client.post('/api/sales/', json={
+            'items': [{'product_id': product_id, 'quantity': 5}],
+            'customer_id': customer_id, 'payment_method': 'debt', 'paid_amount': 0
+        }).json
+        if payment:
+            client.post(f'/api/customers/{customer_id}/pay_debt', json={'amount': payment})
+        resp = client.post(f"/api/sales/{sale['id']}/returns", json={'items': [{'product_id': product_id, 'quantity': 2}]})
+        if resp.status_code != 201:
+            print(f'{name:<10} HTTP {resp.status_code}: {resp.json}')
+            failures.append(name)
+            continue
+        with app.app_context():
+            balance = float(current_balance(customer_id))
+            total_debt = float(db.session.get(Customer, customer_id).total_debt or 0)
+        got = (resp.json['debt_credit'], resp.json['cash_refund'], balance, total_debt)
+        ok = got == (expected_credit, expected_cash, expected_balance, expected_balance)
+        print(f'{name:<10} credit {got[0]:6.2f}  cash {got[1]:6.2f}  balance {got[2]:6.2f}  '
+              f'total_debt {got[3]:6.2f}  {"ok" if ok else "MISMATCH"}')
+        if not ok:
+            failures.append(name)
+
+    with app.app_context():
+        problems = check_ledger()
+    if problems:
+        print(f'Ledger does not reconcile: {problems}')
+        failures.append('ledger')
+
+    if failures:
+        print('FAILED: ' + '; '.join(failures))
+        return 1
+    print('SUCCESS: return credits never exceed what the customer owes.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())